@@ -0,0 +1,153 @@
+# archive.py
+# Archiwum nieaktywnych czatów: skompresowane segmenty i mały indeks metadanych
+
+import gzip
+import json
+import lzma
+import os
+import re
+import threading
+
+from messages import json_default, json_object_hook
+from storage import atomic_write_json
+
+ARCHIVE_VERSION = 1
+SEGMENT_BYTES = 64 * 1024 * 1024  # Po przekroczeniu tego rozmiaru czaty trafiają do nowego segmentu
+SEGMENT_RE = re.compile(r'segment-(\d+)\.seg$')
+
+CODECS = {
+    'gzip': (lambda data: gzip.compress(data, 6), gzip.decompress),
+    'lzma': (lambda data: lzma.compress(data, preset=6), lzma.decompress),
+}
+
+
+class ChatArchive:
+    """Czaty przeniesione z głównego magazynu jako skompresowane ramki w plikach segmentów
+
+    - każdy czat to osobna ramka (JSON skompresowany gzip/lzma) dopisana na końcu
+      bieżącego segmentu, więc odczyt jednego czatu rozpakowuje tylko jego treść,
+    - index.json trzyma metadane potrzebne bez rozpakowywania (nazwa, daty, liczba
+      wiadomości i tokenów) oraz położenie ramki: segment, offset, długość, kodek,
+    - przywrócenie lub usunięcie czatu usuwa tylko wpis z indeksu; segment, w którym
+      ponad połowa bajtów nie jest już używana, jest przepisywany (kopiowane są
+      skompresowane ramki, bez ponownej kompresji).
+
+    Ramki są utrwalane (fsync) przed zapisem indeksu, a bajty spoza indeksu (np. po
+    awarii w trakcie dopisywania) są pomijane i usuwane przy przepisywaniu segmentu.
+    """
+
+    def __init__(self, directory='chats_archive', codec='gzip', segment_bytes=SEGMENT_BYTES):
+        if codec not in CODECS:
+            raise ValueError(f"Nieznany kodek archiwum: {codec}")
+        self.directory = directory
+        self.index_file = os.path.join(directory, 'index.json')
+        self.codec = codec
+        self.segment_bytes = segment_bytes
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f).get('chats', {})
+            except Exception as e:
+                print(f"Błąd wczytywania indeksu archiwum: {e}")
+
+    def entries(self):
+        """Metadane zarchiwizowanych czatów: chat_id -> wpis indeksu (bez treści)"""
+        with self._lock:
+            return dict(self._entries)
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"segment-{number:06d}.seg")
+
+    def _segments(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(int(match.group(1)) for match in map(SEGMENT_RE.match, os.listdir(self.directory)) if match)
+
+    def _save_index(self):
+        atomic_write_json(self.index_file, {'version': ARCHIVE_VERSION, 'chats': self._entries})
+
+    def _append(self, frames):
+        """Dopisz ramki do bieżącego segmentu (lub nowego); zwraca listę (segment, offset, długość)"""
+        os.makedirs(self.directory, exist_ok=True)
+        segments = self._segments()
+        number = segments[-1] if segments else 1
+        path = self._segment_path(number)
+        if os.path.exists(path) and os.path.getsize(path) >= self.segment_bytes:
+            number += 1
+            path = self._segment_path(number)
+
+        locations = []
+        with open(path, 'ab') as f:
+            for frame in frames:
+                offset = f.tell()
+                f.write(frame)
+                locations.append((number, offset, len(frame)))
+            f.flush()
+            os.fsync(f.fileno())
+        return locations
+
+    def add(self, chats, metadata):
+        """Zarchiwizuj czaty (słowniki z wiadomościami); metadata(chat) - pola wpisu indeksu
+
+        Zwraca wpisy indeksu dodanych czatów.
+        """
+        compress = CODECS[self.codec][0]
+        frames = [
+            compress(json.dumps(chat, ensure_ascii=False, default=json_default).encode('utf-8'))
+            for chat in chats
+        ]
+        with self._lock:
+            locations = self._append(frames)
+            added = {}
+            for chat, (segment, offset, length) in zip(chats, locations):
+                added[chat['id']] = dict(
+                    metadata(chat), segment=segment, offset=offset, length=length, codec=self.codec
+                )
+            self._entries.update(added)
+            self._save_index()
+        return added
+
+    def load(self, chat_id):
+        """Rozpakuj czat z archiwum (słownik z wiadomościami jako Message)"""
+        with self._lock:
+            entry = self._entries[chat_id]
+            with open(self._segment_path(entry['segment']), 'rb') as f:
+                f.seek(entry['offset'])
+                frame = f.read(entry['length'])
+        data = CODECS[entry['codec']][1](frame)
+        return json.loads(data, object_hook=json_object_hook)
+
+    def remove(self, chat_ids):
+        """Usuń czaty z indeksu (po przywróceniu do głównego magazynu lub usunięciu)"""
+        with self._lock:
+            removed = [self._entries.pop(chat_id) for chat_id in chat_ids if chat_id in self._entries]
+            if not removed:
+                return
+            self._save_index()
+            for segment in {entry['segment'] for entry in removed}:
+                self._compact_segment(segment)
+
+    def _compact_segment(self, number):
+        """Przepisz żywe ramki segmentu, jeśli zajmują mniej niż połowę pliku (wywoływane pod blokadą)"""
+        path = self._segment_path(number)
+        if not os.path.exists(path):
+            return
+        live = [(chat_id, entry) for chat_id, entry in self._entries.items() if entry['segment'] == number]
+        if sum(entry['length'] for _, entry in live) * 2 >= os.path.getsize(path):
+            return
+        if live:
+            with open(path, 'rb') as f:
+                frames = []
+                for _, entry in live:
+                    f.seek(entry['offset'])
+                    frames.append(f.read(entry['length']))
+            # Ramki trafiają na koniec najnowszego segmentu, ale nie do przepisywanego
+            segments = self._segments()
+            if segments[-1] == number:
+                open(self._segment_path(number + 1), 'ab').close()
+            for (chat_id, entry), (segment, offset, length) in zip(live, self._append(frames)):
+                entry.update(segment=segment, offset=offset, length=length)
+            self._save_index()
+        os.remove(path)
@@ -0,0 +1,287 @@
+# attachment_index.py
+# Podział dużych załączników tekstowych na fragmenty i wyszukiwanie fragmentów (BM25)
+
+import codecs
+import math
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from array import array
+from collections import Counter
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+COMBINING_RE = re.compile('[\u0300-\u036f]')
+BM25_K1 = 1.2
+BM25_B = 0.75
+CHUNK_CHARS = 2000  # Docelowa długość fragmentu (ok. 500 tokenów), dzielona na granicach linii
+SAMPLE_BYTES = 1024 * 1024  # Początek pliku sprawdzany przy wykrywaniu kodowania
+READ_CHARS = 256 * 1024  # Porcja odczytu przy dzieleniu pliku
+
+BOMS = (
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+
+def detect_encoding(path):
+    """Kodowanie pliku tekstowego (na podstawie początku pliku)"""
+    with open(path, 'rb') as f:
+        return sample_encoding(f.read(SAMPLE_BYTES))
+
+
+def sample_encoding(sample):
+    """Kodowanie tekstu: BOM, UTF-8 albo (np. starsze pliki z Windows) cp1250 / latin-1"""
+    for bom, encoding in BOMS:
+        if sample.startswith(bom):
+            return encoding
+    try:
+        # final=False - próbka mogła uciąć znak wielobajtowy na końcu
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    try:
+        sample.decode('cp1250')
+        return 'cp1250'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+
+def decode_text(data):
+    """Bajty pliku tekstowego jako tekst w wykrytym kodowaniu (nieprawidłowe bajty zamieniane na �)"""
+    return data.decode(sample_encoding(data[:SAMPLE_BYTES]), errors='replace')
+
+
+def normalize(text):
+    """Małe litery bez znaków diakrytycznych (jak tokenizer FTS5 w search_index)"""
+    text = text.lower()
+    if text.isascii():
+        return text
+    return COMBINING_RE.sub('', unicodedata.normalize('NFKD', text))
+
+
+def terms(text):
+    return WORD_RE.findall(normalize(text))
+
+
+def iter_chunks(path, encoding, chunk_chars=CHUNK_CHARS):
+    """Fragmenty pliku czytanego strumieniowo: (pierwsza linia, ostatnia linia, tekst)
+
+    Fragment kończy się na granicy linii; dłuższe linie (np. zminifikowany kod)
+    są dzielone co chunk_chars znaków.
+    """
+    parts = []
+    size = 0
+    first_line = line_no = 1
+    with open(path, 'r', encoding=encoding, errors='replace', newline='') as f:
+        while True:
+            lines = f.readlines(READ_CHARS)
+            if not lines:
+                break
+            for line in lines:
+                if parts and size + len(line) > chunk_chars:
+                    yield first_line, line_no - 1, ''.join(parts)
+                    parts, size, first_line = [], 0, line_no
+                if len(line) > chunk_chars:
+                    for i in range(0, len(line), chunk_chars):
+                        yield line_no, line_no, line[i:i + chunk_chars]
+                    line_no += 1
+                    first_line = line_no
+                    continue
+                parts.append(line)
+                size += len(line)
+                line_no += 1
+    if parts:
+        yield first_line, line_no - 1, ''.join(parts)
+
+
+class AttachmentIndex:
+    """Trwały indeks odwrócony fragmentów załączników tekstowych, wg skrótu SHA-256 pliku
+
+    Plik z BlobStore dzielony jest na fragmenty raz - ten sam plik dołączony
+    ponownie (także w innym czacie) korzysta z gotowego indeksu. Listy wystąpień
+    słowa w pliku zapisane są jako jeden BLOB par (fragment, liczba wystąpień),
+    więc zapytanie czyta po jednym wierszu na słowo i plik.
+    """
+
+    def __init__(self, blob_store, db_file='attachments.db', chunk_chars=CHUNK_CHARS, metrics=None):
+        self.blob_store = blob_store
+        self.db_file = db_file
+        self.chunk_chars = chunk_chars
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript('''
+                CREATE TABLE IF NOT EXISTS files (
+                    id INTEGER PRIMARY KEY,
+                    sha256 TEXT NOT NULL UNIQUE,
+                    encoding TEXT NOT NULL,
+                    chunk_count INTEGER NOT NULL,
+                    term_count INTEGER NOT NULL,
+                    lengths BLOB NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS chunks (
+                    file_id INTEGER NOT NULL,
+                    seq INTEGER NOT NULL,
+                    first_line INTEGER NOT NULL,
+                    last_line INTEGER NOT NULL,
+                    text BLOB NOT NULL
+                );
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_chunks_file ON chunks (file_id, seq);
+                CREATE TABLE IF NOT EXISTS postings (
+                    file_id INTEGER NOT NULL,
+                    term TEXT NOT NULL,
+                    data BLOB NOT NULL
+                );
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_postings_term ON postings (file_id, term);
+            ''')
+        return self._conn
+
+    def _file_row(self, conn, sha256):
+        return conn.execute(
+            'SELECT id, chunk_count, term_count FROM files WHERE sha256 = ?', (sha256,)
+        ).fetchone()
+
+    def ensure(self, ref):
+        """Zaindeksuj plik, jeśli nie ma go jeszcze w indeksie; zwraca liczbę fragmentów"""
+        with self._lock:
+            conn = self._connect()
+            row = self._file_row(conn, ref['sha256'])
+            if row is not None:
+                return row[1]
+            start = time.perf_counter()
+            count = self._build(conn, ref)
+            if self.metrics is not None:
+                self.metrics.observe('attachment_index_build', time.perf_counter() - start)
+            return count
+
+    def _build(self, conn, ref):
+        path = self.blob_store.blob_path(ref['sha256'])
+        encoding = detect_encoding(path)
+        postings = {}
+        chunk_rows = []
+        lengths = array('I')  # Liczba słów w każdym fragmencie (normalizacja BM25)
+        for seq, (first_line, last_line, text) in enumerate(iter_chunks(path, encoding, self.chunk_chars)):
+            counts = Counter(terms(text))
+            lengths.append(sum(counts.values()))
+            # Tekst kompresowany - fragment ok. 2 KB zajmowałby w SQLite całą stronę
+            chunk_rows.append((seq, first_line, last_line, zlib.compress(text.encode('utf-8'))))
+            for term, tf in counts.items():
+                entry = postings.get(term)
+                if entry is None:
+                    entry = postings[term] = array('I')
+                entry.append(seq)
+                entry.append(tf)
+
+        with conn:
+            cursor = conn.execute(
+                'INSERT INTO files (sha256, encoding, chunk_count, term_count, lengths) VALUES (?, ?, ?, ?, ?)',
+                (ref['sha256'], encoding, len(chunk_rows), sum(lengths), lengths.tobytes())
+            )
+            file_id = cursor.lastrowid
+            conn.executemany(
+                'INSERT INTO chunks (file_id, seq, first_line, last_line, text) VALUES (?, ?, ?, ?, ?)',
+                ((file_id, *row) for row in chunk_rows)
+            )
+            conn.executemany(
+                'INSERT INTO postings (file_id, term, data) VALUES (?, ?, ?)',
+                ((file_id, term, entry.tobytes()) for term, entry in postings.items())
+            )
+        return len(chunk_rows)
+
+    def search(self, refs, query, top_k=8):
+        """Najlepiej dopasowane fragmenty plików (ranking BM25 w obrębie podanych plików)
+
+        Zwraca listę {'name', 'first_line', 'last_line', 'text', 'score'} w kolejności
+        pozycji w plikach. Bez słów w zapytaniu zwracane są początkowe fragmenty.
+        """
+        available = []
+        for ref in refs:
+            try:
+                self.ensure(ref)
+            except FileNotFoundError:
+                # Plik usunięty z magazynu załączników - przeszukiwane są pozostałe
+                print(f"Brak pliku {ref['name']} w magazynie załączników")
+                continue
+            available.append(ref)
+        refs = available
+        words = list(dict.fromkeys(terms(query)))
+        with self._lock:
+            conn = self._connect()
+            files = {}
+            for ref in refs:
+                row = self._file_row(conn, ref['sha256'])
+                if row is not None and row[0] not in files:
+                    files[row[0]] = (ref['name'], row[1], row[2])
+            if not files:
+                return []
+
+            total_chunks = sum(count for _, count, _ in files.values())
+            avg_length = sum(terms_ for _, _, terms_ in files.values()) / max(total_chunks, 1) or 1
+            postings = {}
+            for word in words:
+                for file_id in files:
+                    row = conn.execute(
+                        'SELECT data FROM postings WHERE file_id = ? AND term = ?', (file_id, word)
+                    ).fetchone()
+                    if row is not None:
+                        entry = array('I')
+                        entry.frombytes(row[0])
+                        postings.setdefault(word, []).append((file_id, entry))
+
+            scores = Counter()
+            tfs = {}
+            for word, lists in postings.items():
+                df = sum(len(entry) // 2 for _, entry in lists)
+                idf = math.log(1 + (total_chunks - df + 0.5) / (df + 0.5))
+                for file_id, entry in lists:
+                    for i in range(0, len(entry), 2):
+                        tfs.setdefault((file_id, entry[i]), []).append((idf, entry[i + 1]))
+
+            if tfs:
+                lengths = {file_id: self._lengths(conn, file_id) for file_id in files}
+                for (file_id, seq), weights in tfs.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[file_id][seq] / avg_length)
+                    scores[(file_id, seq)] = sum(idf * tf * (BM25_K1 + 1) / (tf + norm) for idf, tf in weights)
+                best = scores.most_common(top_k)
+            else:
+                # Zapytanie bez pasujących słów - początek pierwszych plików
+                best = [((file_id, seq), 0.0) for file_id in files for seq in range(files[file_id][1])][:top_k]
+
+            hits = []
+            for (file_id, seq), score in sorted(best, key=lambda item: item[0]):
+                first_line, last_line, text = conn.execute(
+                    'SELECT first_line, last_line, text FROM chunks WHERE file_id = ? AND seq = ?', (file_id, seq)
+                ).fetchone()
+                hits.append({
+                    'name': files[file_id][0],
+                    'first_line': first_line,
+                    'last_line': last_line,
+                    'text': zlib.decompress(text).decode('utf-8'),
+                    'score': score,
+                })
+            return hits
+
+    @staticmethod
+    def _lengths(conn, file_id):
+        lengths = array('I')
+        lengths.frombytes(conn.execute('SELECT lengths FROM files WHERE id = ?', (file_id,)).fetchone()[0])
+        return lengths
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,266 @@
+# batch.py
+# Tryb wsadowy bez GUI: wiele promptów równolegle, wyniki zapisywane na bieżąco do JSONL
+#
+# Użycie: python main.py --batch prompts.jsonl [--output wyniki.jsonl] [--concurrency 8] [--save-chats] [--mock]
+#
+# Każda linia wejścia to obiekt {"id": ..., "prompt": ...} (lub sam tekst w cudzysłowie).
+# Każda linia wyjścia to {"id", "prompt", "response", "tokens", "elapsed"} albo {"id", "prompt", "error"}.
+# Ponowne uruchomienie z tym samym plikiem wyjściowym pomija zadania zakończone powodzeniem.
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from archive import ChatArchive
+from chat_manager import ChatManager
+from config import Config
+from generation import build_generate_config
+from metrics import Metrics, MetricsExporter, record_usage
+from resilience import RateLimiter, RequestExecutor
+from response_cache import ResponseCache, cache_enabled, request_key
+from storage import create_storage
+from tokens import estimate_tokens
+
+
+def read_prompts(input_file):
+    """Zadania z pliku JSONL; zadanie bez id dostaje numer linii"""
+    with open(input_file, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                print(f"Błąd w linii {line_no} pliku {input_file}: {e}")
+                continue
+            if isinstance(item, str):
+                item = {'prompt': item}
+            elif not isinstance(item, dict):
+                item = {}  # Odrzucane przez item_error jako zadanie bez promptu
+            item['id'] = str(item.get('id', line_no))
+            yield item
+
+
+def item_error(item):
+    """Powód odrzucenia zadania z pliku wejściowego lub None, jeśli jest poprawne"""
+    prompt = item.get('prompt')
+    if not isinstance(prompt, str) or not prompt.strip():
+        return "brak pola 'prompt' (niepusty tekst)"
+    if not isinstance(item.get('model', ''), str):
+        return "pole 'model' musi być tekstem"
+    return None
+
+
+def load_completed(output_file):
+    """Id zadań zakończonych powodzeniem w poprzednich uruchomieniach"""
+    completed = set()
+    if not os.path.exists(output_file):
+        return completed
+    with open(output_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Urwana ostatnia linia po przerwaniu
+            if 'error' not in result:
+                completed.add(str(result['id']))
+    return completed
+
+
+def open_output(output_file):
+    """Otwórz plik wyników do dopisywania, domykając urwaną ostatnią linię"""
+    needs_newline = False
+    if os.path.exists(output_file) and os.path.getsize(output_file) > 0:
+        with open(output_file, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b'\n'
+    out = open(output_file, 'a', encoding='utf-8')
+    if needs_newline:
+        out.write('\n')
+    return out
+
+
+class BatchRunner:
+    """Wykonuje prompty z ograniczoną współbieżnością, z tą samą konfiguracją generowania co GUI
+
+    client - genai.Client lub fake_client.FakeClient
+    chat_manager - jeśli podany, każda udana odpowiedź zapisywana jest jako osobny czat
+    """
+
+    def __init__(self, client, config, concurrency=8, chat_manager=None, executor=None, response_cache=None,
+                 metrics=None):
+        self.client = client
+        self.config = config
+        self.concurrency = max(1, concurrency)
+        self.chat_manager = chat_manager
+        self.generate_config = build_generate_config(config)
+        self.executor = executor or RequestExecutor(
+            RateLimiter(config.requests_per_minute),
+            metrics=metrics,
+            max_retries=config.max_retries,
+            hedge_after=config.hedge_after_s
+        )
+        self.use_cache = cache_enabled(config.response_cache_mode, config.temperature)
+        self.response_cache = response_cache or ResponseCache(
+            max_entries=config.response_cache_size,
+            ttl=config.response_cache_ttl_s,
+            metrics=self.executor.metrics,
+            max_disk_bytes=int(config.response_cache_disk_mb * 1024 * 1024)
+        )
+
+    def run_one(self, item):
+        error = item_error(item)
+        if error is not None:
+            return {'id': item['id'], 'prompt': item.get('prompt'), 'error': error}
+        model_name = item.get('model', self.config.model_name)
+
+        def send():
+            # Każde zapytanie ma świeżą sesję, więc można je bezpiecznie powtórzyć lub zdublować (hedging)
+            session = self.client.chats.create(model=model_name, config=self.generate_config)
+            response = session.send_message(item['prompt'])
+            record_usage(self.executor.metrics, getattr(response, 'usage_metadata', None))
+            return response.text or ''
+
+        start = time.perf_counter()
+        cache_key = None
+        response_text = None
+        if self.use_cache:
+            cache_key = request_key(model_name, self.generate_config, [], item['prompt'])
+            response_text = self.response_cache.get(cache_key)
+        try:
+            if response_text is None:
+                response_text = self.executor.call(model_name, send, hedge=True)
+                if cache_key is not None:
+                    self.response_cache.put(cache_key, response_text)
+        except Exception as e:
+            return {'id': item['id'], 'prompt': item.get('prompt'), 'error': str(e)}
+        return {
+            'id': item['id'],
+            'prompt': item['prompt'],
+            'response': response_text,
+            'tokens': estimate_tokens(response_text),
+            'elapsed': round(time.perf_counter() - start, 3),
+        }
+
+    def write_result(self, out, result):
+        out.write(json.dumps(result, ensure_ascii=False) + '\n')
+        out.flush()
+        if self.chat_manager is not None and 'error' not in result:
+            chat_id = self.chat_manager.create_chat(f"Wsad {result['id']}")
+            self.chat_manager.add_message(chat_id, 'user', result['prompt'])
+            self.chat_manager.add_message(chat_id, 'model', result['response'], tokens=result['tokens'])
+
+    def run(self, input_file, output_file):
+        """Wykonaj zadania z input_file; zwraca podsumowanie (liczniki)"""
+        completed = load_completed(output_file)
+        summary = {'done': 0, 'failed': 0, 'skipped': 0}
+        pending = set()
+
+        def collect(futures):
+            for future in futures:
+                result = future.result()
+                self.write_result(out, result)
+                summary['failed' if 'error' in result else 'done'] += 1
+
+        with open_output(output_file) as out, ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            try:
+                for item in read_prompts(input_file):
+                    if item['id'] in completed:
+                        summary['skipped'] += 1
+                        continue
+                    # Ograniczone okno zadań - plik wejściowy nie jest wczytywany w całości
+                    if len(pending) >= self.concurrency * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+                    pending.add(executor.submit(self.run_one, item))
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    collect(done)
+            except KeyboardInterrupt:
+                # Niezaczęte zadania zostaną wykonane przy wznowieniu
+                for future in pending:
+                    future.cancel()
+                collect(f for f in pending if not f.cancelled())
+                summary['interrupted'] = True
+        return summary
+
+
+def default_output_file(input_file):
+    root, _ = os.path.splitext(input_file)
+    return f"{root}.out.jsonl"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Gemini Chat - tryb wsadowy')
+    parser.add_argument('--batch', required=True, metavar='PROMPTS.jsonl', help='plik z promptami (JSONL)')
+    parser.add_argument('--output', help='plik wyników (domyślnie <wejście>.out.jsonl)')
+    parser.add_argument('--concurrency', type=int, help='liczba równoczesnych zapytań')
+    parser.add_argument('--save-chats', action='store_true', help='zapisz każdą odpowiedź jako czat')
+    parser.add_argument('--mock', action='store_true', help='użyj lokalnego FakeClient zamiast API')
+    parser.add_argument('--config', default='config.json', help='plik konfiguracji')
+    args = parser.parse_args(argv)
+
+    config = Config(args.config)
+    if args.mock:
+        from fake_client import FakeClient
+        client = FakeClient()
+    elif config.api_key:
+        from google import genai
+        client = genai.Client(api_key=config.api_key)
+    else:
+        print("Błąd: brak klucza API (ustaw GEMINI_API_KEY lub api_key w config.json)")
+        return 2
+
+    metrics = Metrics()
+    chat_manager = None
+    if args.save_chats:
+        chat_manager = ChatManager(
+            storage=create_storage(config.storage_backend, fsync=config.save_interval_s > 0),
+            save_interval=config.save_interval_s,
+            metrics=metrics,
+            archive=ChatArchive(codec=config.archive_codec),
+            archive_after_days=config.archive_after_days
+        )
+
+    output_file = args.output or default_output_file(args.batch)
+    runner = BatchRunner(
+        client,
+        config,
+        concurrency=args.concurrency or config.batch_concurrency,
+        chat_manager=chat_manager,
+        metrics=metrics
+    )
+    start = time.perf_counter()
+    try:
+        summary = runner.run(args.batch, output_file)
+    finally:
+        runner.executor.shutdown()
+        if chat_manager is not None:
+            chat_manager.close()
+
+    print(f"Wyniki: {output_file}")
+    print(f"Zakończone: {summary['done']}, błędy: {summary['failed']}, pominięte (już gotowe): {summary['skipped']}, "
+          f"czas: {time.perf_counter() - start:.1f} s")
+    snapshot = metrics.snapshot()
+    if snapshot.get('latency_p50') is not None:
+        print(f"Czas odpowiedzi p50/p99: {snapshot['latency_p50']:.2f}/{snapshot['latency_p99']:.2f} s, "
+              f"ponowienia: {snapshot.get('retries', 0)}, oczekiwanie na limit: {snapshot.get('throttle_wait', 0):.1f} s, "
+              f"zapytania zapasowe: {snapshot.get('hedges', 0)} (wygrane: {snapshot.get('hedge_wins', 0)})")
+    if snapshot.get('cache_hits'):
+        print(f"Odpowiedzi z pamięci podręcznej: {snapshot['cache_hits']}")
+    if snapshot.get('prompt_tokens'):
+        print(f"Tokeny API: wejście {snapshot['prompt_tokens']}, wyjście {snapshot.get('response_tokens', 0)}")
+    if config.metrics_export:
+        MetricsExporter(metrics, config.metrics_file, config.metrics_export).export()
+    if summary.get('interrupted'):
+        print("Przerwano - uruchom ponownie, aby dokończyć pozostałe zadania")
+        return 130
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
@@ -0,0 +1,74 @@
+# benchmarks/bench_images.py
+# Oszczędność bajtów i czas kodowania przy zmniejszaniu obrazów przed wysłaniem
+#
+# Użycie: python benchmarks/bench_images.py [--images 8] [--size 4000x3000] [--max-dimension 1536]
+# Wymaga Pillow.
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from blob_store import BlobStore
+from image_preprocess import ImagePreprocessor, process_image_file
+
+
+def make_photo(path, width, height, seed):
+    """Syntetyczne 'zdjęcie': gradient z szumem, zapisane jako JPEG wysokiej jakości z EXIF"""
+    from PIL import Image
+
+    gradient = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    noise = Image.effect_noise((width, height), 40 + seed).convert('RGB')
+    photo = Image.blend(gradient, noise, 0.35)
+    exif = Image.Exif()
+    exif[0x010F] = 'Benchmark Camera'
+    photo.save(path, format='JPEG', quality=95, exif=exif)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--images', type=int, default=8)
+    parser.add_argument('--size', default='4000x3000')
+    parser.add_argument('--max-dimension', type=int, default=1536)
+    parser.add_argument('--quality', type=int, default=85)
+    args = parser.parse_args()
+    width, height = (int(v) for v in args.size.split('x'))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BlobStore(os.path.join(tmp, 'attachments'))
+        refs = []
+        for i in range(args.images):
+            path = os.path.join(tmp, f"photo_{i}.jpg")
+            make_photo(path, width, height, i)
+            refs.append(store.add(path))
+        original_bytes = sum(ref['size'] for ref in refs)
+
+        start = time.perf_counter()
+        for ref in refs:
+            process_image_file(store.blob_path(ref['sha256']), args.max_dimension, args.quality)
+        sequential = time.perf_counter() - start
+
+        preprocessor = ImagePreprocessor(store, args.max_dimension, args.quality)
+        start = time.perf_counter()
+        processed = preprocessor.process_many(refs)
+        pooled = time.perf_counter() - start
+
+        start = time.perf_counter()
+        preprocessor.process_many(refs)
+        cached = time.perf_counter() - start
+        preprocessor.shutdown()
+
+    processed_bytes = sum(ref['size'] for ref in processed)
+    print(f"Obrazy: {args.images} x {width}x{height}, max bok: {args.max_dimension}, jakość: {args.quality}")
+    print(f"Rozmiar przed: {original_bytes / 1024 / 1024:.2f} MB, po: {processed_bytes / 1024 / 1024:.2f} MB "
+          f"(oszczędność {100 * (1 - processed_bytes / original_bytes):.1f}%)")
+    print(f"Kodowanie sekwencyjne:  {sequential * 1000:.1f} ms ({sequential * 1000 / args.images:.1f} ms / obraz)")
+    print(f"Kodowanie w puli:       {pooled * 1000:.1f} ms (z uruchomieniem procesów)")
+    print(f"Ponownie (z pamięci):   {cached * 1000:.3f} ms")
+
+
+if __name__ == '__main__':
+    main()
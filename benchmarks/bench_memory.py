@@ -0,0 +1,99 @@
+# benchmarks/bench_memory.py
+# Pamięć zajmowana przez historię: słowniki wiadomości (dotychczasowy format) vs Message
+#
+# Użycie: python benchmarks/bench_memory.py [--messages 1000000]
+#
+# Każdy wariant mierzony jest w osobnym procesie (przyrost RSS i tracemalloc), a
+# wiadomości wczytywane są z JSON - jak przy starcie aplikacji, gdzie w słownikach
+# każda rola i znacznik czasu to osobny obiekt str.
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MEASURE_SNIPPET = """
+import gc, json, os, sys, time, tracemalloc
+from datetime import datetime
+sys.path.insert(0, {root!r})
+from messages import Message, json_object_hook
+
+
+def rss():
+    # Bieżący RSS (Linux); na innych systemach tylko tracemalloc
+    if not os.path.exists('/proc/self/statm'):
+        return 0
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+with open({path!r}, 'r', encoding='utf-8') as f:
+    raw = f.read()
+gc.collect()
+rss_before = rss()
+tracemalloc.start()
+# Jak JournalStorage.load - wiadomości tworzone w trakcie parsowania
+messages = json.loads(raw, object_hook=json_object_hook if {compact!r} else None)
+del raw
+gc.collect()
+size, _ = tracemalloc.get_traced_memory()
+tracemalloc.stop()
+rss_after = rss()
+
+# Godzina w nagłówku każdej wiadomości (renderer.format_message)
+start = time.perf_counter()
+if {compact!r}:
+    labels = [msg.time_label for msg in messages]
+else:
+    labels = [datetime.fromisoformat(msg['timestamp']).strftime('%H:%M') for msg in messages]
+headers = time.perf_counter() - start
+print(size, rss_after - rss_before, headers)
+"""
+
+
+def write_history(path, count):
+    start = datetime(2025, 1, 1)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump([
+            {'role': 'user' if i % 2 == 0 else 'model',
+             'content': f"Krótka wiadomość {i}",
+             'timestamp': (start + timedelta(seconds=i)).isoformat(),
+             'tokens': 6}
+            for i in range(count)
+        ], f)
+
+
+def measure(path, compact):
+    snippet = MEASURE_SNIPPET.format(root=ROOT, path=path, compact=compact)
+    result = subprocess.run([sys.executable, '-c', snippet], capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    size, rss, headers = result.stdout.split()
+    return int(size), int(rss), float(headers)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'messages.json')
+        write_history(path, args.messages)
+        results = {'słowniki': measure(path, False), 'Message': measure(path, True)}
+
+    print(f"Wiadomości: {args.messages}")
+    print(f"{'format':<10} | {'tracemalloc [MB]':>16} | {'RSS [MB]':>9} | {'B / wiadomość':>13} | {'nagłówki [ms]':>13}")
+    print('-' * 74)
+    for name, (size, rss, headers) in results.items():
+        print(f"{name:<10} | {size / 2**20:>16.1f} | {rss / 2**20:>9.1f} | {size / args.messages:>13.0f} | {headers * 1000:>13.1f}")
+
+
+if __name__ == '__main__':
+    main()
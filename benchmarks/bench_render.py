@@ -0,0 +1,108 @@
+# benchmarks/bench_render.py
+# Mikrobenchmark renderowania historii czatu przy 10 tys. wiadomości
+#
+# Użycie: python benchmarks/bench_render.py [--messages 10000] [--turns 50]
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_manager import ChatManager
+from messages import Message
+from renderer import ChatRenderer
+from storage import JournalStorage
+
+
+class StringView:
+    """Zamiennik MultilineView trzymający tekst w pamięci (bez Tk)"""
+
+    def __init__(self):
+        self.parts = []
+        self.tail = None
+
+    def set(self, text):
+        self.parts = [text]
+
+    def append(self, text):
+        self.parts.append(text)
+
+    def mark_tail(self):
+        self.tail = len(self.parts)
+
+    def truncate_tail(self):
+        del self.parts[self.tail:]
+
+    def text(self):
+        return ''.join(self.parts)
+
+
+def legacy_render(messages):
+    """Dotychczasowy algorytm update_chat_display: konkatenacja += i parsowanie czasu przy każdym odświeżeniu"""
+    history_text = ""
+    for msg in messages:
+        role = "[TY]" if msg['role'] == 'user' else "[GEMINI]"
+        timestamp = datetime.fromisoformat(msg['timestamp']).strftime('%H:%M')
+        attachments = ""
+        if 'attachments' in msg and msg['attachments']:
+            attachments = f" 📎({len(msg['attachments'])})"
+        history_text += f"{timestamp} {role}{attachments}\n{msg['content']}\n\n{'='*80}\n\n"
+    return history_text
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=10_000)
+    parser.add_argument('--turns', type=int, default=50, help='liczba dopisywanych wiadomości')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = ChatManager(storage=JournalStorage(os.path.join(tmp, 'chats.json'), compact_every=10**9))
+        chat_id = manager.create_chat('Benchmark')
+        start = datetime(2025, 1, 1)
+        manager.chats[chat_id]['messages'].extend(
+            Message.from_dict({'role': 'user' if i % 2 == 0 else 'model',
+                               'content': f"Wiadomość {i}: " + 'lorem ipsum dolor sit amet ' * 8,
+                               'timestamp': (start + timedelta(seconds=i)).isoformat()})
+            for i in range(args.messages)
+        )
+
+        renderer = ChatRenderer(manager)
+        view = StringView()
+
+        legacy_full = timed(lambda: legacy_render(manager.get_messages(chat_id)), 3)
+        first_render = timed(lambda: ChatRenderer(manager).render(StringView(), chat_id), 3)
+        renderer.render(view, chat_id)
+        cached_render = timed(lambda: renderer.render(view, chat_id), 20)
+
+        legacy_turns = 0.0
+        sync_turns = 0.0
+        for i in range(args.turns):
+            manager.add_message(chat_id, 'user', f"Nowa wiadomość {i}")
+            legacy_turns += timed(lambda: legacy_render(manager.get_messages(chat_id)), 1)
+            sync_turns += timed(lambda: renderer.sync(view, chat_id), 1)
+        manager.close()
+
+    print(f"Historia: {args.messages} wiadomości, okno renderowania: {renderer.window_size}")
+    print(f"{'operacja':<44} | {'ms':>10}")
+    print('-' * 58)
+    print(f"{'stary update_chat_display (pełna przebudowa)':<44} | {legacy_full:>10.3f}")
+    print(f"{'render okna (zimny bufor)':<44} | {first_render:>10.3f}")
+    print(f"{'render okna (z bufora bloków)':<44} | {cached_render:>10.3f}")
+    print(f"{'nowa wiadomość - stara przebudowa':<44} | {legacy_turns / args.turns:>10.3f}")
+    print(f"{'nowa wiadomość - sync przyrostowy':<44} | {sync_turns / args.turns:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
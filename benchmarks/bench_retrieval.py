@@ -0,0 +1,96 @@
+# benchmarks/bench_retrieval.py
+# Czas budowy indeksu fragmentów dużego załącznika, opóźnienie zapytań i trafność (recall@k)
+#
+# Użycie: python benchmarks/bench_retrieval.py [--size-mb 20] [--needles 200] [--top-k 8] [--encoding cp1250]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from attachment_index import AttachmentIndex
+from blob_store import BlobStore
+from metrics import percentile
+
+LEVELS = ['INFO'] * 8 + ['DEBUG'] * 3 + ['WARN']
+PATHS = ['/api/chats', '/api/messages', '/api/search', '/health', '/api/upload', '/api/login']
+MODULES = ['zapis', 'kolejka', 'indeks', 'sesja', 'płatności', 'użytkownicy', 'pamięć', 'eksport']
+
+
+def log_line(rng, line_no):
+    return (f"2025-12-{1 + line_no // 200_000:02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:"
+            f"{rng.randint(0, 59):02d} {rng.choice(LEVELS)} worker-{rng.randint(1, 32)} "
+            f"żądanie {rng.randint(1, 10**6)} obsłużone ścieżka={rng.choice(PATHS)} status=200 "
+            f"czas={rng.randint(1, 500)}ms\n")
+
+
+def write_log(path, size_bytes, needles, rng, encoding):
+    """Syntetyczny log z wplecionymi rzadkimi zdarzeniami; zwraca listę (zapytanie, numer linii)"""
+    planted = []
+    needle_at = sorted(rng.sample(range(1, size_bytes // 150), needles))
+    with open(path, 'w', encoding=encoding, newline='') as f:
+        written = 0
+        line_no = 1
+        while written < size_bytes:
+            if needle_at and line_no == needle_at[0]:
+                needle_at.pop(0)
+                code = f"E{rng.randint(10_000, 99_999)}"
+                module = rng.choice(MODULES)
+                line = f"2025-12-01 03:14:15 ERROR moduł {module} zgłosił błąd {code}: przekroczono limit połączeń\n"
+                planted.append((f"dlaczego moduł {module} zgłosił błąd {code}?", line_no))
+            else:
+                line = log_line(rng, line_no)
+            f.write(line)
+            written += len(line)
+            line_no += 1
+    return planted
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size-mb', type=float, default=20)
+    parser.add_argument('--needles', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=8)
+    parser.add_argument('--encoding', default='utf-8', help="kodowanie pliku testowego, np. cp1250")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'serwer.log')
+        planted = write_log(source, int(args.size_mb * 1024 * 1024), args.needles, rng, args.encoding)
+        blob_store = BlobStore(os.path.join(tmp, 'attachments'))
+        ref = blob_store.add(source)
+        db_file = os.path.join(tmp, 'attachments.db')
+        index = AttachmentIndex(blob_store, db_file)
+
+        start = time.perf_counter()
+        chunks = index.ensure(ref)
+        build = time.perf_counter() - start
+
+        latencies = []
+        found_first = found_any = 0
+        sent_chars = 0
+        for query, line_no in planted:
+            start = time.perf_counter()
+            hits = index.search([ref], query, args.top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+            matching = [hit for hit in hits if hit['first_line'] <= line_no <= hit['last_line']]
+            found_any += bool(matching)
+            found_first += bool(matching) and max(hits, key=lambda hit: hit['score']) is matching[0]
+            sent_chars += sum(len(hit['text']) for hit in hits)
+        index.close()
+        index_mb = os.path.getsize(db_file) / 1024 / 1024
+
+    print(f"Plik: {args.size_mb:.0f} MB ({args.encoding}), fragmentów: {chunks}, indeks: {index_mb:.0f} MB")
+    print(f"Budowa indeksu: {build:.2f} s ({args.size_mb / build:.1f} MB/s)")
+    print(f"Zapytanie: p50 {percentile(latencies, 50):.2f} ms, p99 {percentile(latencies, 99):.2f} ms")
+    print(f"Recall@1: {found_first / len(planted):.1%}, recall@{args.top_k}: {found_any / len(planted):.1%}")
+    print(f"Tokenów na zapytanie: ~{sent_chars / len(planted) / 4:.0f} zamiast ~{ref['size'] / 4:.0f} (cały plik)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# benchmarks/bench_search.py
+# Czas budowy indeksu wyszukiwania i opóźnienie zapytań przy dużej liczbie wiadomości
+#
+# Użycie: python benchmarks/bench_search.py [--messages 1000000] [--chats 1000] [--queries 200]
+
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from metrics import percentile
+from search_index import SearchIndex
+
+VOCABULARY_SIZE = 50_000
+WORDS_PER_MESSAGE = 30
+
+
+def make_vocabulary(rng):
+    letters = 'abcdefghijklmnoprstuwyząćęłńóśźż'
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(3, 10))) + str(i) for i in range(VOCABULARY_SIZE)]
+
+
+def make_messages(rng, vocabulary, count):
+    # Rozkład Zipfa - kilka słów występuje bardzo często, większość rzadko
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    for _ in range(count):
+        yield ' '.join(rng.choices(vocabulary, cum_weights=cum_weights, k=WORDS_PER_MESSAGE))
+
+
+def timed_queries(index, queries):
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, limit=20)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=1_000_000)
+    parser.add_argument('--chats', type=int, default=1000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    vocabulary = make_vocabulary(rng)
+    per_chat = args.messages // args.chats
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SearchIndex(os.path.join(tmp, 'search.db'))
+        messages = make_messages(rng, vocabulary, per_chat * args.chats)
+        start = time.perf_counter()
+        for chat in range(args.chats):
+            index.reindex_chat(f"chat-{chat}", (next(messages) for _ in range(per_chat)))
+        build = time.perf_counter() - start
+        size_mb = sum(os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp)) / 1024 / 1024
+
+        # Pojedyncze dopisanie wiadomości (ścieżka add_message)
+        start = time.perf_counter()
+        for seq in range(100):
+            index.add('chat-0', per_chat + seq, ' '.join(rng.choices(vocabulary, k=WORDS_PER_MESSAGE)))
+        add_ms = (time.perf_counter() - start) * 1000 / 100
+
+        cases = {
+            'rzadkie słowo': [rng.choice(vocabulary[10_000:]) for _ in range(args.queries)],
+            'średnie słowo': [rng.choice(vocabulary[100:1000]) for _ in range(args.queries)],
+            'częste słowo': [rng.choice(vocabulary[:10]) for _ in range(args.queries)],
+            'dwa słowa': [f"{rng.choice(vocabulary[:1000])} {rng.choice(vocabulary[1000:])}" for _ in range(args.queries)],
+            'prefiks': [rng.choice(vocabulary[1000:])[:4] for _ in range(args.queries)],
+        }
+
+        print(f"Wiadomości: {per_chat * args.chats} w {args.chats} czatach, indeks: {size_mb:.0f} MB, "
+              f"budowa: {build:.1f} s, dopisanie: {add_ms:.2f} ms / wiadomość")
+        print(f"{'zapytanie':<16}{'p50 [ms]':>10}{'p99 [ms]':>10}")
+        for name, queries in cases.items():
+            latencies = timed_queries(index, queries)
+            print(f"{name:<16}{percentile(latencies, 50):>10.2f}{percentile(latencies, 99):>10.2f}")
+        index.close()
+
+
+if __name__ == '__main__':
+    main()
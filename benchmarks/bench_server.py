@@ -0,0 +1,196 @@
+# benchmarks/bench_server.py
+# Test obciążenia usługi HTTP (server.py): wielu klientów naraz, odpowiedzi strumieniowane z FakeClient
+#
+# Użycie: python benchmarks/bench_server.py [--clients 300] [--messages 5] [--first-chunk-delay 0.3]
+#         python benchmarks/bench_server.py --url http://127.0.0.1:8765 [--token SEKRET]  (działająca usługa)
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_manager import ChatManager
+from config import Config
+from fake_client import FakeClient
+from metrics import Metrics, percentile
+from server import ChatServer, ChatService
+from storage import create_storage
+
+
+class HttpClient:
+    """Minimalny klient HTTP/1.1 (jedno połączenie keep-alive) - bez zależności spoza biblioteki standardowej"""
+
+    def __init__(self, host, port, token=''):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.reader = self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+    async def _send(self, method, path, data=None):
+        body = json.dumps(data).encode('utf-8') if data is not None else b''
+        head = [f"{method} {path} HTTP/1.1", f"Host: {self.host}", f"Content-Length: {len(body)}"]
+        if self.token:
+            head.append(f"Authorization: Bearer {self.token}")
+        self.writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return status, headers
+
+    async def _lines(self, headers):
+        """Linie treści odpowiedzi (także kodowanej chunked) w miarę ich nadchodzenia"""
+        if headers.get('transfer-encoding') == 'chunked':
+            buffer = b''
+            while True:
+                size = int((await self.reader.readline()).strip(), 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                buffer += (await self.reader.readexactly(size + 2))[:-2]
+                *lines, buffer = buffer.split(b'\n')
+                for line in lines:
+                    if line.strip():
+                        yield line
+            if buffer.strip():
+                yield buffer
+        else:
+            yield await self.reader.readexactly(int(headers.get('content-length', 0)))
+
+    async def request(self, method, path, data=None):
+        status, headers = await self._send(method, path, data)
+        body = b''.join([line async for line in self._lines(headers)])
+        return status, json.loads(body) if body else None
+
+    async def stream(self, method, path, data):
+        """Wyślij zapytanie strumieniowane; zwraca (czas do pierwszego fragmentu, czas całkowity, ostatni obiekt)"""
+        start = time.perf_counter()
+        status, headers = await self._send(method, path, data)
+        first = None
+        last = None
+        async for line in self._lines(headers):
+            last = json.loads(line)
+            if first is None and 'chunk' in last:
+                first = time.perf_counter() - start
+        if status != 200:
+            raise RuntimeError(f"HTTP {status}: {last}")
+        return first, time.perf_counter() - start, last
+
+
+async def simulated_user(host, port, token, user, messages, results):
+    client = HttpClient(host, port, token)
+    await client.connect()
+    try:
+        status, chat = await client.request('POST', '/chats', {'name': f"Obciążenie {user}"})
+        sent = 0
+        for i in range(messages):
+            try:
+                ttfb, total, last = await client.stream(
+                    'POST', f"/chats/{chat['id']}/messages", {'message': f"Pytanie {i} od klienta {user}"}
+                )
+            except Exception as e:
+                results['errors'].append(str(e))
+                continue
+            if 'error' in last:
+                results['errors'].append(last['error'])
+                continue
+            results['ttfb'].append(ttfb)
+            results['total'].append(total)
+            sent += 1
+        start = time.perf_counter()
+        status, page = await client.request('GET', f"/chats/{chat['id']}/messages?offset=0&limit=50")
+        results['page'].append(time.perf_counter() - start)
+        # Każda udana wymiana to dwie wiadomości w historii, nieudana nie zostawia śladu
+        results['history_mismatch'] += page['total'] != 2 * sent
+    finally:
+        await client.close()
+
+
+async def run(args):
+    server = None
+    chat_manager = None
+    tmp = None
+    model_time = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        tmp = tempfile.TemporaryDirectory()
+        config = Config(os.path.join(tmp.name, 'config.json'))
+        config.requests_per_minute = 0  # Mierzona jest usługa, nie limity API
+        chat_manager = ChatManager(
+            storage=create_storage(config.storage_backend, os.path.join(tmp.name, 'chats.json')),
+            save_interval=config.save_interval_s
+        )
+        fake = FakeClient(
+            responder=lambda text: f"Odpowiedź na: {text}. " + 'Lorem ipsum dolor sit amet. ' * 12,
+            first_chunk_delay=args.first_chunk_delay,
+            chunk_delay=args.chunk_delay
+        )
+        chunks = len(fake.split(fake.responder('Pytanie 0 od klienta 0')))
+        model_time = args.first_chunk_delay + args.chunk_delay * (chunks - 1)
+        service = ChatService(chat_manager, config, fake, metrics=Metrics(), session_cache_size=args.clients)
+        server = ChatServer(service)
+        host, port = await server.start('127.0.0.1', 0)
+
+    results = {'ttfb': [], 'total': [], 'page': [], 'errors': [], 'history_mismatch': 0}
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        simulated_user(host, port, args.token, user, args.messages, results) for user in range(args.clients)
+    ))
+    elapsed = time.perf_counter() - start
+
+    if server is not None:
+        await server.close()
+        chat_manager.close()
+        tmp.cleanup()
+
+    done = len(results['total'])
+    print(f"Klienci: {args.clients}, wiadomości: {done} (błędy: {len(results['errors'])}), czas: {elapsed:.1f} s, "
+          f"przepustowość: {done / elapsed:.0f} odpowiedzi/s")
+    if model_time is not None:
+        print(f"Czas odpowiedzi samego modelu (FakeClient): pierwszy fragment {args.first_chunk_delay * 1000:.0f} ms, "
+              f"całość {model_time * 1000:.0f} ms")
+    print(f"{'':<24}{'p50 [ms]':>10}{'p99 [ms]':>10}")
+    for name, key in (('pierwszy fragment', 'ttfb'), ('cała odpowiedź', 'total'), ('strona historii', 'page')):
+        values = [value * 1000 for value in results[key]]
+        if values:
+            print(f"{name:<24}{percentile(values, 50):>10.1f}{percentile(values, 99):>10.1f}")
+    if results['history_mismatch']:
+        print(f"Czaty z niespójną historią: {results['history_mismatch']}")
+    if results['errors']:
+        print(f"Przykładowy błąd: {results['errors'][0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=300)
+    parser.add_argument('--messages', type=int, default=5)
+    parser.add_argument('--first-chunk-delay', type=float, default=0.3)
+    parser.add_argument('--chunk-delay', type=float, default=0.01)
+    parser.add_argument('--url', help='adres działającej usługi (domyślnie usługa uruchamiana w tym procesie)')
+    parser.add_argument('--token', default='')
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
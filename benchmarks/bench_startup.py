@@ -0,0 +1,111 @@
+# benchmarks/bench_startup.py
+# Czas zimnego startu: import modułu aplikacji (-X importtime) i utworzenie GeminiChatApp
+#
+# Użycie: python benchmarks/bench_startup.py [--runs 5] [--top 15] [--save]
+#
+# --save zapisuje wynik jako benchmarks/startup_baseline.json; kolejne uruchomienia
+# porównują się z tym plikiem. Każdy pomiar to osobny proces Pythona (zimny start).
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_FILE = os.path.join(ROOT, 'benchmarks', 'startup_baseline.json')
+
+# Moduły, które nie powinny być ładowane przed pierwszym wysłaniem wiadomości
+DEFERRED_MODULES = ('google.genai', 'PIL.Image')
+
+CONSTRUCT_SNIPPET = """
+import sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+app = main.GeminiChatApp()
+constructed = time.perf_counter()
+print(imported - start, constructed - imported, ','.join(m for m in {deferred!r} if m in sys.modules))
+"""
+
+
+def parse_importtime(stderr):
+    """Wiersze -X importtime: (czas własny us, czas łączny us, moduł)"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows
+
+
+def measure_imports(module):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return parse_importtime(result.stderr)
+
+
+def measure_construct():
+    result = subprocess.run(
+        [sys.executable, '-c', CONSTRUCT_SNIPPET.format(deferred=DEFERRED_MODULES)],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    fields = result.stdout.splitlines()[-1].split(' ', 2)
+    loaded = fields[2].split(',') if len(fields) > 2 else []
+    return float(fields[0]), float(fields[1]), [m for m in loaded if m]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--module', default='main')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--save', action='store_true', help='zapisz wynik jako punkt odniesienia')
+    args = parser.parse_args()
+
+    totals = []
+    rows = []
+    for _ in range(args.runs):
+        rows = measure_imports(args.module)
+        totals.append(sum(self_us for self_us, _, _ in rows) / 1000)
+    import_ms = statistics.median(totals)
+
+    print(f"Import {args.module}: mediana {import_ms:.1f} ms z {args.runs} uruchomień ({len(rows)} modułów)")
+    print("Najwolniejsze moduły (czas łączny, ostatnie uruchomienie):")
+    top_level = [row for row in rows if not row[2].startswith(' ' * 3)]
+    for self_us, cumulative_us, name in sorted(top_level, key=lambda row: -row[1])[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name.strip()}")
+
+    result = {'module': args.module, 'import_ms': round(import_ms, 1)}
+    if args.module == 'main':
+        samples = [measure_construct() for _ in range(args.runs)]
+        result['construct_ms'] = round(statistics.median(s[1] for s in samples) * 1000, 1)
+        loaded = sorted({m for s in samples for m in s[2]})
+        print(f"GeminiChatApp(): mediana {result['construct_ms']:.1f} ms")
+        print(f"Odroczone moduły załadowane przy starcie: {', '.join(loaded) if loaded else 'brak'}")
+
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('module') == args.module:
+            for key in ('import_ms', 'construct_ms'):
+                if key in baseline and key in result:
+                    change = result[key] - baseline[key]
+                    print(f"{key}: {result[key]:.1f} ms (punkt odniesienia {baseline[key]:.1f} ms, {change:+.1f} ms)")
+
+    if args.save:
+        with open(BASELINE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"Zapisano {BASELINE_FILE}")
+
+
+if __name__ == '__main__':
+    main()
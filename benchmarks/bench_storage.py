@@ -0,0 +1,77 @@
+# benchmarks/bench_storage.py
+# Porównanie kosztu zapisu jednej wiadomości: pełny zapis chats.json vs dziennik append-only
+# oraz zapis w tle (save_interval) - mierzony jest czas po stronie wywołującego add_message
+#
+# Użycie: python benchmarks/bench_storage.py [--writes 20]
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_manager import ChatManager
+from storage import JournalStorage, JsonStorage
+
+HISTORY_SIZES = (10, 1_000, 100_000)
+MESSAGES_PER_CHAT = 100
+
+
+def populate(manager, total_messages):
+    """Wypełnij magazyn syntetyczną historią bez zapisu wiadomość po wiadomości"""
+    timestamp = datetime.now().isoformat()
+    remaining = total_messages
+    while remaining > 0:
+        chat_id = str(uuid.uuid4())
+        manager.chats[chat_id] = {'id': chat_id, 'name': f"Czat {len(manager.chats) + 1}", 'created_at': timestamp, 'messages': []}
+        count = min(MESSAGES_PER_CHAT, remaining)
+        manager.chats[chat_id]['messages'].extend(
+            {'role': 'user' if i % 2 == 0 else 'model', 'content': f"Wiadomość testowa numer {i} " * 4, 'timestamp': timestamp}
+            for i in range(count)
+        )
+        remaining -= count
+    manager.save_chats()
+    manager.load_chats()  # Odtwarza też kolejność listy czatów
+
+
+def measure(storage_factory, total_messages, writes, save_interval=0):
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = ChatManager(storage=storage_factory(os.path.join(tmp, 'chats.json')), save_interval=save_interval)
+        populate(manager, total_messages)
+        chat_id = next(iter(manager.chats))
+
+        start = time.perf_counter()
+        for i in range(writes):
+            manager.add_message(chat_id, 'user', f"Nowa wiadomość {i}")
+        elapsed = time.perf_counter() - start
+        manager.close()
+    return elapsed / writes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--writes', type=int, default=20, help='liczba mierzonych zapisów na rozmiar historii')
+    args = parser.parse_args()
+
+    # (fabryka backendu, save_interval)
+    backends = {
+        'json (pełny zapis)': (JsonStorage, 0),
+        'journal (append-only)': (lambda path: JournalStorage(path, compact_every=10**9), 0),
+        'journal + fsync': (lambda path: JournalStorage(path, compact_every=10**9, fsync=True), 0),
+        'journal + fsync, w tle': (lambda path: JournalStorage(path, compact_every=10**9, fsync=True), 1.0),
+    }
+
+    print(f"{'historia':>10} | {'backend':<24} | {'ms / wiadomość':>14}")
+    print('-' * 56)
+    for size in HISTORY_SIZES:
+        for name, (factory, save_interval) in backends.items():
+            per_write = measure(factory, size, args.writes, save_interval)
+            print(f"{size:>10} | {name:<24} | {per_write * 1000:>14.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,567 @@
+# benchmarks/bench_suite.py
+# Zestaw pomiarów całej aplikacji z lokalnym FakeClient zamiast genai.Client: start, wczytywanie
+# i zapis historii (1 tys. / 100 tys. / 1 mln wiadomości), renderowanie, przygotowanie załączników,
+# zapytania (opóźnienia, fragmenty, błędy) i pamięć - wyniki w JSON do porównywania przebiegów
+#
+# Użycie: python benchmarks/bench_suite.py [--sizes 1000,100000,1000000] [--backends journal,sqlite]
+#                                          [--archive-after-days 90] [--output wyniki.json] [--compare poprzednie.json]
+#                                          [--first-chunk-delay 0.2] [--chunk-delay 0.01] [--fail-every 5]
+#
+# Każdy pomiar to osobny proces Pythona (zimny start, własny RSS). Zapytania i załączniki
+# przechodzą przez GeminiChatApp.send_message, wątek roboczy i obsługę zdarzeń REQUEST_* jak
+# w oknie aplikacji (okno zastąpione pustymi elementami, historia - StringView), więc
+# wymagają zainstalowanych FreeSimpleGUI i google-genai; bez nich są pomijane z podaniem
+# przyczyny. Domyślnie wyniki trafiają do benchmarks/results/suite-<data>.json.
+
+import argparse
+import json
+import math
+import os
+import platform
+import queue
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from archive import ChatArchive
+from bench_render import StringView
+from bench_startup import measure_construct
+from chat_manager import ChatManager
+from config import Config
+from fake_client import FakeAPIError, FakeClient
+from metrics import percentile
+from renderer import ChatRenderer
+from search_index import SearchIndex
+from storage import create_storage
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+HISTORY_SIZES = (1_000, 100_000, 1_000_000)
+LOREM = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor. ' * 2
+
+
+def memory():
+    """Bieżący i szczytowy RSS procesu w bajtach (Linux; na innych systemach zera)"""
+    values = {'VmRSS': 0, 'VmHWM': 0}
+    if os.path.exists('/proc/self/status'):
+        with open('/proc/self/status') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in values:
+                    values[name] = int(value.split()[0]) * 1024
+    return values['VmRSS'], values['VmHWM']
+
+
+def summary(seconds, unit=1000):
+    """p50 / p99 / średnia serii czasów (domyślnie w ms)"""
+    values = [value * unit for value in seconds]
+    if not values:
+        return None
+    return {'p50': percentile(values, 50), 'p99': percentile(values, 99), 'mean': sum(values) / len(values)}
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+# --- Historia czatów (ChatManager, backend zapisu, SearchIndex, ChatRenderer) ---
+
+def synthetic_chat(index, count, created):
+    """Czat z `count` wiadomościami; identyfikatory deterministyczne"""
+    chat_id = str(uuid.UUID(int=index + 1))
+    return {
+        'id': chat_id,
+        'name': f"Czat {index + 1}",
+        'created_at': created.isoformat(),
+        'messages': [
+            {'role': 'user' if i % 2 == 0 else 'model',
+             'content': f"Wiadomość {i} w czacie {index + 1}: {LOREM}",
+             'timestamp': (created + timedelta(seconds=i)).isoformat(),
+             'tokens': 45}
+            for i in range(count)
+        ],
+    }
+
+
+def open_manager(spec):
+    # Jak w GeminiChatApp: backend z konfiguracji, indeks wyszukiwania synchronizowany przy wczytaniu
+    # i (przy --archive-after-days) archiwum nieaktywnych czatów
+    directory = spec['directory']
+    return ChatManager(
+        storage=create_storage(spec['backend'], os.path.join(directory, 'chats.json')),
+        autoload=False,
+        search_index=SearchIndex(os.path.join(directory, 'search.db')),
+        archive=ChatArchive(os.path.join(directory, 'chats_archive')) if spec['archive_after_days'] else None,
+        archive_after_days=spec['archive_after_days']
+    )
+
+
+def generate_history(spec):
+    """Zapisz syntetyczną historię (i zbuduj indeks wyszukiwania) - stan jak u użytkownika przed startem
+
+    Czaty rozłożone są równomiernie na ostatnie history_days dni (najnowszy - dziś).
+    """
+    manager = open_manager(spec)
+    chats = math.ceil(spec['size'] / spec['chat_size'])
+    start = datetime.now() - timedelta(days=spec['history_days'])
+    remaining = spec['size']
+    index = 0
+    while remaining > 0:
+        created = start + timedelta(days=spec['history_days'] * index / chats)
+        chat = synthetic_chat(index, min(spec['chat_size'], remaining), created)
+        manager.chats[chat['id']] = chat
+        remaining -= len(chat['messages'])
+        index += 1
+    manager.save_chats()
+    manager.load_chats()
+    manager.close()
+    return {'chats': index}
+
+
+def measure_history(spec):
+    """Wczytanie historii, renderowanie najnowszego czatu, koszt zapisu wiadomości i pełnego zapisu"""
+    rss_before, _ = memory()
+    manager = open_manager(spec)
+    load = timed(manager.load_chats)
+    rss_loaded, _ = memory()
+
+    # Okno historii jak update_chat_display po otwarciu czatu i po każdej nowej wiadomości
+    chat_id = manager.chat_id_at(0)
+    renderer = ChatRenderer(manager, window_size=spec['window'])
+    view = StringView()
+    render_cold = timed(lambda: renderer.render(view, chat_id))
+    render_cached = [timed(lambda: renderer.render(view, chat_id)) for _ in range(5)]
+    # Najstarszy czat - przy włączonym archiwum rozpakowywany przy otwarciu
+    oldest_id = manager.chat_id_at(len(manager.chats) - 1)
+    render_oldest = timed(lambda: ChatRenderer(manager, window_size=spec['window']).render(StringView(), oldest_id))
+
+    add_sync = []
+    render_sync = []
+    for i in range(spec['writes']):
+        add_sync.append(timed(lambda: manager.add_message(chat_id, 'user', f"Nowa wiadomość {i}: {LOREM}", tokens=45)))
+        render_sync.append(timed(lambda: renderer.sync(view, chat_id)))
+
+    # Zapis w tle (save_interval_s) - mierzony czas po stronie wywołującego i zapis całej serii
+    manager.save_interval = spec['save_interval']
+    add_behind = [
+        timed(lambda: manager.add_message(chat_id, 'model', f"Odpowiedź {i}: {LOREM}", tokens=45))
+        for i in range(spec['writes'])
+    ]
+    flush = timed(manager.flush)
+    save_all = timed(manager.save_chats)
+    archived = len(manager.archive.entries()) if manager.archive is not None else 0
+    manager.close()
+    _, rss_peak = memory()
+
+    return {
+        'chats_load_ms': load * 1000,
+        'rss_loaded_mb': (rss_loaded - rss_before) / 2**20,
+        'rss_peak_mb': rss_peak / 2**20,
+        'bytes_per_message': (rss_loaded - rss_before) / spec['size'],
+        'render_open_ms': render_cold * 1000,
+        'render_cached_ms': summary(render_cached),
+        'render_oldest_ms': render_oldest * 1000,
+        'archived_chats': archived,
+        'render_new_message_ms': summary(render_sync),
+        'add_message_us': summary(add_sync, 10**6),
+        'add_message_write_behind_us': summary(add_behind, 10**6),
+        'write_behind_flush_ms': flush * 1000,
+        'save_chats_ms': save_all * 1000,
+    }
+
+
+# --- Ścieżka wysyłania wiadomości (GeminiChatApp z FakeClient) ---
+
+class NullElement:
+    def update(self, *args, **kwargs):
+        pass
+
+
+class NullWindow:
+    """Okno bez Tk - send_message i obsługa zdarzeń czyszczą pola i ustawiają pasek stanu"""
+
+    def __getitem__(self, key):
+        return NullElement()
+
+
+def bench_app(directory, spec):
+    """GeminiChatApp z plikami w katalogu tymczasowym i FakeClient zamiast genai.Client"""
+    config = Config(os.path.join(directory, 'config.json'))
+    config.api_key = 'fake-key'
+    config.requests_per_minute = 0  # Mierzona jest aplikacja, nie limity API
+    config.response_cache_mode = 'off'
+    config.save()
+    os.chdir(directory)
+
+    import main
+    from workers import RequestWorker
+
+    fake = FakeClient(
+        responder=lambda text: f"Odpowiedź na: {text[-60:]}. " + LOREM * spec['reply_paragraphs'],
+        chunk_size=spec['chunk_size'],
+        first_chunk_delay=spec['first_chunk_delay'],
+        chunk_delay=spec['chunk_delay'],
+        error=FakeAPIError(503, 'UNAVAILABLE') if spec['fail_every'] else None,
+        fail_every=spec['fail_every']
+    )
+
+    class BenchApp(main.GeminiChatApp):
+        timings = {}
+
+        def create_client(self):
+            return fake
+
+        def prepare_attachments(self, task):
+            start = time.perf_counter()
+            super().prepare_attachments(task)
+            self.timings.setdefault('prepare', []).append(time.perf_counter() - start)
+
+        def build_content_parts(self, *args, **kwargs):
+            start = time.perf_counter()
+            parts = super().build_content_parts(*args, **kwargs)
+            self.timings.setdefault('build_parts', []).append(time.perf_counter() - start)
+            return parts
+
+    app = BenchApp()
+    app.executor.base_delay = spec['retry_delay']
+    app.chat_manager.load_chats()
+    app.chats_loaded = True
+    app.history_view = StringView()
+    events = queue.Queue()
+    app.worker = RequestWorker(lambda event, value: events.put((event, value)))
+    app.current_chat_id = app.chat_manager.create_chat('Benchmark')
+    return app, fake, events
+
+
+def exchange(app, events, message, attachments=None):
+    """Wyślij wiadomość jak przycisk Wyślij i obsłuż zdarzenia jak pętla okna; zwraca (pierwszy fragment, całość, wynik)"""
+    from workers import REQUEST_CANCELLED, REQUEST_CHUNK, REQUEST_DONE, REQUEST_ERROR, REQUEST_STARTED
+
+    window = NullWindow()
+    start = time.perf_counter()
+    app.send_message(window, message, attachments)
+    first = None
+    while True:
+        event, value = events.get()
+        if event == REQUEST_STARTED:
+            app.on_request_started(window, value)
+        elif event == REQUEST_CHUNK:
+            if first is None:
+                first = time.perf_counter() - start
+            app.on_request_chunk(window, *value)
+        elif event == REQUEST_DONE:
+            app.on_request_done(window, *value)
+            return first, time.perf_counter() - start, 'done'
+        elif event == REQUEST_ERROR:
+            app.on_request_failed(window, *value)
+            return first, time.perf_counter() - start, f"error: {value[1]}"
+        elif event == REQUEST_CANCELLED:
+            app.on_request_failed(window, value)
+            return first, time.perf_counter() - start, 'cancelled'
+
+
+def write_attachments(directory, document_mb, photos):
+    """Mała notatka (wstawiana w całości), duży log (fragmenty z indeksu) i opcjonalnie zdjęcia"""
+    paths = []
+    note = os.path.join(directory, 'notatka.txt')
+    with open(note, 'w', encoding='utf-8') as f:
+        f.write('Notatka do zapytania. ' * 400)
+    paths.append(note)
+
+    log = os.path.join(directory, 'serwer.log')
+    with open(log, 'w', encoding='utf-8') as f:
+        line = 0
+        while f.tell() < document_mb * 2**20:
+            f.write(f"2025-12-01 12:00:{line % 60:02d} INFO worker-{line % 32} żądanie {line} obsłużone status=200\n")
+            line += 1
+    paths.append(log)
+
+    if photos:
+        try:
+            from bench_images import make_photo
+            for i in range(photos):
+                photo = os.path.join(directory, f"zdjecie_{i}.jpg")
+                make_photo(photo, 4000, 3000, i)
+                paths.append(photo)
+        except ImportError:
+            pass  # Bez Pillow - tylko załączniki tekstowe
+    return paths
+
+
+def measure_attachments(spec):
+    """Przygotowanie załączników w send_message (magazyn, indeks fragmentów, obrazy) - FakeClient bez opóźnień"""
+    directory = spec['directory']
+    app, fake, events = bench_app(directory, dict(spec, first_chunk_delay=0, chunk_delay=0, fail_every=0))
+    paths = write_attachments(directory, spec['document_mb'], spec['photos'])
+    try:
+        baseline = exchange(app, events, 'Pytanie bez załączników')[1]
+        runs = {}
+        for name in ('cold', 'warm'):
+            app.timings.clear()
+            _, total, result = exchange(app, events, 'Ile żądań obsłużył worker-7?', list(paths))
+            runs[name] = {
+                'total_ms': total * 1000,
+                'prepare_ms': sum(app.timings.get('prepare', ())) * 1000,
+                'build_parts_ms': sum(app.timings.get('build_parts', ())) * 1000,
+                'result': result,
+            }
+    finally:
+        app.worker.shutdown()
+        app.chat_manager.close()
+        app.attachment_index.close()
+    return {
+        'files': len(paths),
+        'bytes': sum(os.path.getsize(path) for path in paths),
+        'no_attachments_ms': baseline * 1000,
+        'cold': runs['cold'],
+        'warm': runs['warm'],
+        'rss_peak_mb': memory()[1] / 2**20,
+    }
+
+
+def measure_requests(spec):
+    """Zapytania przez send_message z opóźnieniami, fragmentami i błędami FakeClient"""
+    app, fake, events = bench_app(spec['directory'], spec)
+    ttfb, totals, errors = [], [], []
+    try:
+        for i in range(spec['requests']):
+            first, total, result = exchange(app, events, f"Pytanie numer {i}")
+            if result != 'done':
+                errors.append(result)
+                continue
+            totals.append(total)
+            if first is not None:
+                ttfb.append(first)
+        chunks = len(fake.split(fake.responder('Pytanie numer 0')))
+        model_time = spec['first_chunk_delay'] + spec['chunk_delay'] * (chunks - 1)
+        messages = app.chat_manager.get_message_count(app.current_chat_id)
+    finally:
+        app.worker.shutdown()
+        app.chat_manager.close()
+    return {
+        'requests': spec['requests'],
+        'errors': len(errors),
+        'retries': app.metrics.counter('retries'),
+        'chunks_per_reply': chunks,
+        'model_time_ms': model_time * 1000,
+        'first_chunk_ms': summary(ttfb),
+        'total_ms': summary(totals),
+        'overhead_ms': summary([total - model_time for total in totals]),
+        'history_consistent': messages == 2 * len(totals),
+        'rss_peak_mb': memory()[1] / 2**20,
+    }
+
+
+CHILD_STEPS = {
+    'generate_history': generate_history,
+    'measure_history': measure_history,
+    'measure_attachments': measure_attachments,
+    'measure_requests': measure_requests,
+}
+
+
+def run_child(step, spec):
+    """Wykonaj krok w osobnym procesie; wynik to ostatnia linia wyjścia (JSON)"""
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', step, json.dumps(spec)],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError((result.stderr.strip().splitlines() or ['?'])[-1])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def skipped(fn, *args):
+    try:
+        return fn(*args)
+    except RuntimeError as e:
+        return {'skipped': str(e)}
+
+
+# --- Porównanie przebiegów ---
+
+def flatten(data, prefix=''):
+    values = {}
+    for key, value in data.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            values.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[name] = value
+    return values
+
+
+def compare(current, previous_file):
+    with open(previous_file, 'r', encoding='utf-8') as f:
+        previous = flatten(json.load(f)['results'])
+    print(f"\nPorównanie z {previous_file}:")
+    print(f"{'wartość':<64} | {'poprzednio':>12} | {'teraz':>12} | {'zmiana':>8}")
+    print('-' * 106)
+    for name, value in flatten(current).items():
+        old = previous.get(name)
+        if old is None:
+            continue
+        change = f"{(value - old) / old:+.0%}" if old else ''
+        print(f"{name:<64} | {old:>12.3f} | {value:>12.3f} | {change:>8}")
+
+
+def print_report(results):
+    startup = results['startup']
+    if 'skipped' in startup:
+        print(f"Start aplikacji: pominięty ({startup['skipped']})")
+    else:
+        print(f"Start aplikacji: import {startup['import_ms']:.0f} ms, GeminiChatApp() {startup['construct_ms']:.0f} ms")
+
+    print(f"\n{'backend':<8} {'wiadomości':>10} | {'wczytanie':>9} | {'RSS':>7} | {'otwarcie':>8} | "
+          f"{'najstarszy':>10} | {'nowa wiad.':>10} | {'add_message':>11} | {'w tle':>7} | {'save_chats':>10}")
+    print(f"{'':<8} {'':>10} | {'[ms]':>9} | {'[MB]':>7} | {'[ms]':>8} | {'[ms]':>10} | {'[ms] p50':>10} | "
+          f"{'[us] p50':>11} | {'[us]':>7} | {'[ms]':>10}")
+    print('-' * 117)
+    for backend, sizes in results['history'].items():
+        for size, row in sizes.items():
+            if 'skipped' in row:
+                print(f"{backend:<8} {size:>10} | pominięty: {row['skipped']}")
+                continue
+            print(f"{backend:<8} {size:>10} | {row['chats_load_ms']:>9.0f} | {row['rss_loaded_mb']:>7.0f} | "
+                  f"{row['render_open_ms']:>8.1f} | {row['render_oldest_ms']:>10.1f} | "
+                  f"{row['render_new_message_ms']['p50']:>10.2f} | "
+                  f"{row['add_message_us']['p50']:>11.0f} | {row['add_message_write_behind_us']['p50']:>7.0f} | "
+                  f"{row['save_chats_ms']:>10.0f}")
+
+    attachments = results['attachments']
+    if 'skipped' in attachments:
+        print(f"\nZałączniki: pominięte ({attachments['skipped']})")
+    else:
+        print(f"\nZałączniki ({attachments['files']} plików, {attachments['bytes'] / 2**20:.1f} MB), "
+              f"wiadomość bez załączników: {attachments['no_attachments_ms']:.0f} ms")
+        for name, label in (('cold', 'pierwsze wysłanie'), ('warm', 'ponowne wysłanie')):
+            run = attachments[name]
+            print(f"  {label:<18} całość {run['total_ms']:>7.0f} ms, magazyn {run['prepare_ms']:>6.0f} ms, "
+                  f"treść zapytania {run['build_parts_ms']:>6.0f} ms ({run['result']})")
+
+    requests = results['requests']
+    if 'skipped' in requests:
+        print(f"\nZapytania: pominięte ({requests['skipped']})")
+    else:
+        print(f"\nZapytania: {requests['requests']} (błędy: {requests['errors']}, ponowienia: {requests['retries']}), "
+              f"model: {requests['model_time_ms']:.0f} ms na odpowiedź")
+        for name, key in (('pierwszy fragment', 'first_chunk_ms'), ('cała odpowiedź', 'total_ms'),
+                          ('narzut aplikacji', 'overhead_ms')):
+            if requests[key]:
+                print(f"  {name:<18} p50 {requests[key]['p50']:>7.1f} ms, p99 {requests[key]['p99']:>7.1f} ms")
+        if not requests['history_consistent']:
+            print("  Historia czatu niespójna z liczbą udanych zapytań!")
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--child':
+        print(json.dumps(CHILD_STEPS[sys.argv[2]](json.loads(sys.argv[3]))))
+        return
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default=','.join(str(size) for size in HISTORY_SIZES),
+                        help='liczby wiadomości w historii, oddzielone przecinkami')
+    parser.add_argument('--backends', default='journal,sqlite', help='backendy zapisu (storage_backend)')
+    parser.add_argument('--chat-size', type=int, default=1_000, help='wiadomości w jednym czacie historii')
+    parser.add_argument('--history-days', type=int, default=365, help='okres, na który rozłożone są czaty historii')
+    parser.add_argument('--archive-after-days', type=int, default=0,
+                        help='archiwizacja czatów nieaktywnych dłużej niż tyle dni (0 - bez archiwum)')
+    parser.add_argument('--writes', type=int, default=50, help='dopisywane wiadomości przy pomiarze zapisu')
+    parser.add_argument('--window', type=int, default=200, help='okno renderowania (history_window)')
+    parser.add_argument('--save-interval', type=float, default=1.0, help='zapis w tle (save_interval_s)')
+    parser.add_argument('--requests', type=int, default=20, help='zapytania przez send_message')
+    parser.add_argument('--first-chunk-delay', type=float, default=0.2)
+    parser.add_argument('--chunk-delay', type=float, default=0.01)
+    parser.add_argument('--chunk-size', type=int, default=64, help='znaki w jednym fragmencie strumienia')
+    parser.add_argument('--reply-paragraphs', type=int, default=4, help='długość odpowiedzi FakeClient')
+    parser.add_argument('--fail-every', type=int, default=0, help='co n-te wywołanie API zwraca 503 (0 - bez błędów)')
+    parser.add_argument('--retry-delay', type=float, default=0.05, help='bazowe opóźnienie ponowień')
+    parser.add_argument('--document-mb', type=float, default=5, help='rozmiar dużego załącznika tekstowego')
+    parser.add_argument('--photos', type=int, default=2, help='zdjęcia 12 Mpx w załącznikach (wymaga Pillow)')
+    parser.add_argument('--output', help='plik wyników JSON')
+    parser.add_argument('--compare', help='wcześniejszy plik wyników do porównania')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+    backends = [backend for backend in args.backends.split(',') if backend]
+    fake_backend = {
+        'first_chunk_delay': args.first_chunk_delay,
+        'chunk_delay': args.chunk_delay,
+        'chunk_size': args.chunk_size,
+        'reply_paragraphs': args.reply_paragraphs,
+        'fail_every': args.fail_every,
+        'retry_delay': args.retry_delay,
+    }
+
+    results = {'startup': {}, 'history': {}, 'attachments': {}, 'requests': {}}
+    try:
+        import_s, construct_s, loaded = measure_construct()
+        results['startup'] = {'import_ms': import_s * 1000, 'construct_ms': construct_s * 1000, 'deferred_loaded': loaded}
+    except RuntimeError as e:
+        results['startup'] = {'skipped': str(e)}
+
+    for backend in backends:
+        results['history'][backend] = {}
+        for size in sizes:
+            with tempfile.TemporaryDirectory() as tmp:
+                spec = {'directory': tmp, 'backend': backend, 'size': size, 'chat_size': args.chat_size,
+                        'writes': args.writes, 'window': args.window, 'save_interval': args.save_interval,
+                        'history_days': args.history_days, 'archive_after_days': args.archive_after_days}
+                start = time.perf_counter()
+                generated = skipped(run_child, 'generate_history', spec)
+                print(f"Historia {backend} / {size}: wygenerowana w {time.perf_counter() - start:.1f} s", file=sys.stderr)
+                row = generated if 'skipped' in generated else dict(skipped(run_child, 'measure_history', spec),
+                                                                     chats=generated['chats'])
+                results['history'][backend][str(size)] = row
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results['attachments'] = skipped(run_child, 'measure_attachments', dict(
+            fake_backend, directory=tmp, document_mb=args.document_mb, photos=args.photos
+        ))
+    with tempfile.TemporaryDirectory() as tmp:
+        results['requests'] = skipped(run_child, 'measure_requests', dict(
+            fake_backend, directory=tmp, requests=args.requests
+        ))
+
+    print_report(results)
+    if args.compare:
+        compare(results, args.compare)
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"suite-{datetime.now():%Y%m%d-%H%M%S}.json")
+    report = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': vars(args),
+        },
+        'fake_backend': fake_backend,
+        'results': results,
+    }
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nWyniki zapisane w {output}")
+
+
+if __name__ == '__main__':
+    main()
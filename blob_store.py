@@ -0,0 +1,208 @@
+# blob_store.py
+# Magazyn załączników adresowany treścią (SHA-256) z deduplikacją
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from storage import atomic_write_json
+
+CHUNK_SIZE = 1024 * 1024
+PATH_DIGESTS = 4096  # Tyle skrótów ostatnio dołączanych plików pamięta BlobStore.add
+
+MIME_TYPES = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.bmp': 'image/bmp',
+    '.txt': 'text/plain',
+    '.md': 'text/markdown',
+}
+
+
+def guess_mime_type(file_path):
+    return MIME_TYPES.get(os.path.splitext(file_path)[1].lower(), 'text/plain')
+
+
+def is_image(ref):
+    return ref['mime_type'].startswith('image/')
+
+
+def hash_file(file_path, chunk_size=CHUNK_SIZE):
+    """SHA-256 pliku liczony strumieniowo, bez wczytywania całości do pamięci"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobStore:
+    """Kopie załączników w katalogu `root`, nazwane skrótem SHA-256 treści
+
+    Ten sam plik dołączony do wielu czatów jest przechowywany raz, a
+    wiadomości trzymają referencję (skrót), więc historia działa także po
+    przeniesieniu lub usunięciu oryginału. Po przekroczeniu `max_bytes`
+    usuwane są najdawniej używane pliki, ale nigdy te, do których odwołuje się
+    historia - referenced() zwraca ich skróty (None - nieznane, nic nie jest usuwane).
+    """
+
+    INDEX_FILE = 'index.json'
+
+    def __init__(self, root='attachments', max_bytes=1024 * 1024 * 1024, referenced=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.referenced = referenced
+        self._lock = threading.Lock()
+        self._index = {}
+        self._path_digests = OrderedDict()  # (ścieżka, rozmiar, mtime) -> skrót, LRU pod self._lock
+        self._load_index()
+
+    def _load_index(self):
+        path = os.path.join(self.root, self.INDEX_FILE)
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._index = json.load(f)
+            except Exception as e:
+                print(f"Błąd wczytywania indeksu załączników: {e}")
+                self._index = {}
+
+    def _save_index(self):
+        atomic_write_json(os.path.join(self.root, self.INDEX_FILE), self._index)
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def add(self, file_path):
+        """Dodaj plik do magazynu; zwraca referencję zapisywaną w wiadomości"""
+        stat = os.stat(file_path)
+        # Niezmieniony plik dołączany ponownie nie jest nawet ponownie haszowany
+        memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._path_digests.get(memo_key)
+            if digest is not None:
+                self._path_digests.move_to_end(memo_key)
+        if digest is None:
+            digest = hash_file(file_path)
+            with self._lock:
+                self._path_digests[memo_key] = digest
+                while len(self._path_digests) > PATH_DIGESTS:
+                    self._path_digests.popitem(last=False)
+
+        blob_path = self.blob_path(digest)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            tmp_path = os.path.join(self.root, f".{uuid.uuid4().hex}.tmp")
+            shutil.copyfile(file_path, tmp_path)
+            os.replace(tmp_path, blob_path)
+
+        size = stat.st_size
+        ref = {
+            'sha256': digest,
+            'name': os.path.basename(file_path),
+            'size': size,
+            'mime_type': guess_mime_type(file_path),
+        }
+        protected = self._protected(digest, size)
+        with self._lock:
+            self._index[digest] = {'size': size, 'last_used': time.time()}
+            self._evict(digest, protected)
+            self._save_index()
+        return ref
+
+    def add_bytes(self, data, name, mime_type):
+        """Dodaj dane z pamięci (np. przetworzony obraz); zwraca referencję jak add"""
+        digest = hashlib.sha256(data).hexdigest()
+        blob_path = self.blob_path(digest)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            tmp_path = os.path.join(self.root, f".{uuid.uuid4().hex}.tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, blob_path)
+
+        protected = self._protected(digest, len(data))
+        with self._lock:
+            self._index[digest] = {'size': len(data), 'last_used': time.time()}
+            self._evict(digest, protected)
+            self._save_index()
+        return {'sha256': digest, 'name': name, 'size': len(data), 'mime_type': mime_type}
+
+    def exists(self, ref):
+        return os.path.exists(self.blob_path(ref['sha256']))
+
+    def open(self, ref):
+        """Otwórz zawartość załącznika do odczytu (binarnie)"""
+        digest = ref['sha256']
+        with self._lock:
+            if digest in self._index:
+                self._index[digest]['last_used'] = time.time()
+        return open(self.blob_path(digest), 'rb')
+
+    def _protected(self, digest, size):
+        """Skróty chronione przed usunięciem, jeśli dodanie pliku przekroczy limit (None - nie usuwaj nic)
+
+        referenced() pobiera blokadę ChatManager, więc jest wywoływane przed blokadą magazynu.
+        """
+        with self._lock:
+            total = sum(entry['size'] for key, entry in self._index.items() if key != digest) + size
+        if total <= self.max_bytes:
+            return None
+        return self.referenced() if self.referenced is not None else set()
+
+    def _evict(self, keep, protected):
+        """Usuń najdawniej używane pliki, aż magazyn zmieści się w limicie (wywoływane pod blokadą)"""
+        if protected is None:
+            return
+        total = sum(entry['size'] for entry in self._index.values())
+        for digest, entry in sorted(self._index.items(), key=lambda item: item[1]['last_used']):
+            if total <= self.max_bytes:
+                break
+            if digest == keep or digest in protected:
+                continue
+            try:
+                os.remove(self.blob_path(digest))
+            except OSError:
+                pass
+            del self._index[digest]
+            total -= entry['size']
+
+
+class PreparedPartCache:
+    """Pamięć podręczna gotowych fragmentów zapytania (types.Part / tekst) wg skrótu załącznika, LRU z limitem bajtów"""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key, size, factory):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+                return item[0]
+
+        value = factory()
+
+        with self._lock:
+            if key not in self._items and size <= self.max_bytes:
+                self._items[key] = (value, size)
+                self._bytes += size
+                while self._bytes > self.max_bytes:
+                    _, (_, evicted_size) = self._items.popitem(last=False)
+                    self._bytes -= evicted_size
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
@@ -1,81 +1,641 @@
 # chat_manager.py
 # Zarządzanie czatami i historią rozmów
 
-import json
-import os
+import threading
 import uuid
-from datetime import datetime
-from pathlib import Path
+from collections import Counter, OrderedDict
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+from messages import Message, attachment_digests
+from storage import JournalStorage
+from tokens import estimate_message_tokens, message_tokens
+
+THAWED_CHATS = 4  # Tyle zarchiwizowanych czatów trzyma rozpakowane wiadomości w pamięci
+
+
+class ActivityOrder:
+    """Kolejność czatów wg ostatniej aktywności z pozycjami wyznaczanymi w O(log n)
+
+    Każde dotknięcie czatu nadaje mu kolejny numer (slot); drzewo Fenwicka zlicza
+    zajęte sloty, więc pozycja czatu na liście i czat na danej pozycji wyznaczane
+    są bez przeglądania wszystkich czatów. Gdy sloty się wyczerpią, struktura jest
+    przebudowywana (koszt rozłożony na wiele operacji).
+    """
+
+    def __init__(self, chat_ids=()):
+        self._rebuild(list(chat_ids))
+
+    def _rebuild(self, chat_ids):
+        """chat_ids - od najdawniej do ostatnio aktywnego"""
+        self._capacity = max(1024, 2 * len(chat_ids))
+        self._slot_ids = chat_ids + [None] * (self._capacity - len(chat_ids))
+        self._slots = {chat_id: slot for slot, chat_id in enumerate(chat_ids)}
+        self._next = len(chat_ids)
+        # Budowa drzewa w O(n): każdy węzeł przekazuje swoją sumę rodzicowi
+        tree = [0] + [1] * len(chat_ids) + [0] * (self._capacity - len(chat_ids))
+        for i in range(1, self._capacity + 1):
+            parent = i + (i & -i)
+            if parent <= self._capacity:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _add(self, slot, delta):
+        i = slot + 1
+        while i <= self._capacity:
+            self._tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, slot):
+        """Liczba zajętych slotów w zakresie 0..slot"""
+        i = slot + 1
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, chat_id):
+        return chat_id in self._slots
+
+    def append(self, chat_id):
+        """Dodaj czat jako ostatnio aktywny"""
+        if self._next == self._capacity:
+            self._rebuild(self.ids_oldest_first())
+        slot = self._next
+        self._next += 1
+        self._slots[chat_id] = slot
+        self._slot_ids[slot] = chat_id
+        self._add(slot, 1)
+
+    def remove(self, chat_id):
+        slot = self._slots.pop(chat_id)
+        self._slot_ids[slot] = None
+        self._add(slot, -1)
+
+    def position(self, chat_id):
+        """Pozycja na liście (0 - ostatnio aktywny)"""
+        return len(self._slots) - self._prefix(self._slots[chat_id])
+
+    def at(self, position):
+        """Czat na danej pozycji listy lub None"""
+        if not 0 <= position < len(self._slots):
+            return None
+        # Najmniejszy slot, przed którym (włącznie) jest `rank` zajętych slotów
+        rank = len(self._slots) - position
+        i = 0
+        step = 1 << self._capacity.bit_length()
+        while step:
+            if i + step <= self._capacity and self._tree[i + step] < rank:
+                i += step
+                rank -= self._tree[i]
+            step >>= 1
+        return self._slot_ids[i]
+
+    def ids_oldest_first(self):
+        return [chat_id for chat_id in self._slot_ids[:self._next] if chat_id is not None]
+
+
+def op_chat_id(op):
+    """Id czatu, którego dotyczy operacja zapisu"""
+    return op['chat']['id'] if op['op'] == 'create_chat' else op['chat_id']
+
 
 class ChatManager:
-    def __init__(self, storage_file='chats.json'):
+    """Czaty w pamięci z zapisem do backendu storage
+
+    Przy save_interval > 0 zmiany nie są zapisywane od razu (write-behind):
+    operacje trafiają do kolejki, a wątek zapisu co save_interval sekund
+    przekazuje całą serię do backendu jednym wywołaniem storage.apply. Para
+    add_message + pop_message (wycofanie po błędzie) oraz czat utworzony
+    i usunięty w tym samym oknie znoszą się jeszcze przed zapisem. close()
+    zawsze zapisuje resztę kolejki.
+
+    Z archiwum (archive.ChatArchive) czaty nieaktywne dłużej niż archive_after_days
+    są przy wczytaniu przenoszone z backendu do skompresowanych segmentów. Na liście
+    zostają jako czaty bez wiadomości (metadane z indeksu archiwum), treść jest
+    rozpakowywana przy otwarciu, a nowa wiadomość przywraca czat do backendu.
+    """
+
+    def __init__(self, storage_file='chats.json', storage=None, autoload=True, search_index=None, save_interval=0,
+                 metrics=None, archive=None, archive_after_days=0):
         self.storage_file = storage_file
-        self.chats = {}
-        self.load_chats()
+        # Domyślnie dziennik append-only; JsonStorage zachowuje stary format pełnego zapisu
+        self.storage = storage if storage is not None else JournalStorage(storage_file)
+        self.search_index = search_index  # Opcjonalny SearchIndex aktualizowany przy każdej zmianie
+        self.chats = {}  # id -> czat
+        self._order = ActivityOrder()  # Kolejność listy czatów (ostatnio aktywne na górze)
+        self.order_listener = None  # Wywoływany jako (akcja, pozycja, chat_id) przy zmianie kolejności
+        self._token_totals = {}  # chat_id -> suma tokenów, liczona raz i aktualizowana przyrostowo
+        self.save_interval = save_interval  # Sekundy między zapisami w tle (0 - zapis przy każdej zmianie)
+        self.metrics = metrics  # Opcjonalny metrics.Metrics - czasy wczytywania i zapisu (chats_load, disk_write)
+        # Chroni self.chats i kolejkę operacji; zapis na dysk odbywa się już poza nią
+        self._lock = threading.RLock()
+        # Kolejność zapisów do backendu (zawsze pobierana po self._lock, nigdy odwrotnie)
+        self._write_lock = threading.Lock()
+        self._pending_ops = []  # Operacje czekające na zapis
+        self._failed_ops = []  # Operacje, których zapis się nie udał - ponawiane przed kolejnymi
+        self._dirty = set()  # Czaty z niezapisanymi zmianami
+        self._in_flight = set()  # Czaty, których operacje są właśnie zapisywane (lub czekają na ponowienie)
+        self.write_error = None  # Ostatni błąd zapisu (None po udanym zapisie) - do paska stanu
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._writer = None
+        self.archive = archive  # Opcjonalny ChatArchive dla nieaktywnych czatów
+        self.archive_after_days = archive_after_days  # 0 - czaty nie są archiwizowane automatycznie
+        self._archived = {}  # chat_id -> wpis indeksu archiwum
+        self._thawed = OrderedDict()  # Zarchiwizowane czaty z rozpakowanymi wiadomościami (ostatnio otwarte)
+        self._hot = None  # Czaty backendu zapisu (bez archiwum), liczone przy pierwszym użyciu
+        self._blob_refs = None  # sha256 załącznika -> liczba wiadomości, liczone przy pierwszym użyciu
+        if autoload:
+            self.load_chats()
+    
+    def _timer(self, name):
+        return self.metrics.timer(name) if self.metrics is not None else nullcontext()
     
     def load_chats(self):
-        """Wczytaj czaty z pliku JSON"""
-        if os.path.exists(self.storage_file):
+        """Wczytaj czaty z backendu zapisu"""
+        with self._timer('chats_load'):
             try:
-                with open(self.storage_file, 'r', encoding='utf-8') as f:
-                    self.chats = json.load(f)
+                self.chats = self.storage.load()
             except Exception as e:
                 print(f"Błąd wczytywania czatów: {e}")
                 self.chats = {}
-        else:
-            self.chats = {}
+            for chat in self.chats.values():
+                if 'messages' in chat:
+                    chat['messages'] = [Message.from_dict(msg) for msg in chat['messages']]
+            self._load_archive()
+            self._rebuild_order()
+            self._blob_refs = None
+        
+        if self.archive is not None and self.archive_after_days:
+            self.archive_inactive(self.archive_after_days)
+        
+        if self.search_index is not None:
+            try:
+                self.search_index.sync(self)
+            except Exception as e:
+                print(f"Błąd indeksowania czatów: {e}")
     
     def save_chats(self):
-        """Zapisz czaty do pliku JSON"""
+        """Zapisz pełny stan czatów (w backendzie z dziennikiem - kompaktacja)"""
+        with self._lock:
+            if not self.flush():
+                return
+            with self._write_lock:
+                try:
+                    with self._timer('disk_save_all'):
+                        self.storage.save_all(self._hot_chats())
+                except Exception as e:
+                    self._write_failed(e)
+    
+    def _write_failed(self, error):
+        self.write_error = f"Błąd zapisywania czatów: {error}"
+        if self.metrics is not None:
+            self.metrics.incr('disk_write_errors')
+    
+    def _chats_for_write(self, ops):
+        """Stan czatów dla storage.apply - kopia, jeśli backend zapisze pełny stan (wołane pod self._lock)
+        
+        Kopia odpowiada dokładnie zapisywanym operacjom, więc snapshot dziennika nie obejmie
+        zmian dodanych w trakcie zapisu (te trafią do dziennika później i zostałyby odtworzone dwa razy).
+        """
+        chats = self._hot_chats()
+        needs_chats = getattr(self.storage, 'needs_chats', None)
+        if needs_chats is not None and not needs_chats(len(ops)):
+            return chats
+        return {
+            chat_id: dict(chat, messages=list(chat['messages'])) if 'messages' in chat else dict(chat)
+            for chat_id, chat in chats.items()
+        }
+    
+    def _record(self, op):
+        """Przekaż zmianę do backendu zapisu - od razu lub przez kolejkę wątku zapisu"""
+        with self._lock:
+            if not self._coalesce(op):
+                self._pending_ops.append(op)
+                self._dirty.add(op_chat_id(op))
+            if not self.save_interval:
+                self.flush()
+                return
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._writer_loop, name='chat-writer', daemon=True)
+                self._writer.start()
+            self._wake.set()
+    
+    def _coalesce(self, op):
+        """Znieś operację z niezapisanymi wcześniejszymi; True, jeśli nie trzeba jej już zapisywać"""
+        chat_id = op_chat_id(op)
+        if op['op'] == 'pop_message':
+            for index in range(len(self._pending_ops) - 1, -1, -1):
+                previous = self._pending_ops[index]
+                if op_chat_id(previous) == chat_id:
+                    if previous['op'] == 'add_message':
+                        del self._pending_ops[index]
+                        return True
+                    return False
+        elif op['op'] == 'delete_chat':
+            created = any(p['op'] == 'create_chat' and op_chat_id(p) == chat_id for p in self._pending_ops)
+            self._pending_ops = [p for p in self._pending_ops if op_chat_id(p) != chat_id]
+            self._dirty.discard(chat_id)
+            return created
+        return False
+    
+    def _writer_loop(self):
+        while not self._stop.is_set():
+            self._wake.wait()
+            # Zmiany z okna save_interval zapisywane są razem
+            self._stop.wait(self.save_interval)
+            self.flush()
+    
+    def flush(self):
+        """Zapisz operacje z kolejki jednym wywołaniem backendu; False, jeśli zapis się nie udał
+        
+        Kolejka jest pobierana pod self._lock, a zapis (z fsync) odbywa się po jej zwolnieniu,
+        więc odczyty i add_message z innych wątków nie czekają na dysk. Operacje, których
+        zapis się nie powiódł, są ponawiane przed nowszymi przy następnym flush.
+        """
+        with self._lock:
+            self._write_lock.acquire()
+            try:
+                ops = self._failed_ops + self._pending_ops
+                chats = self._chats_for_write(ops) if ops else None
+            except BaseException:
+                # Kolejka zostaje nietknięta - operacje zapisze następny flush
+                self._write_lock.release()
+                raise
+            self._wake.clear()
+            self._pending_ops = []
+            self._failed_ops = []
+            self._in_flight |= self._dirty
+            self._dirty = set()
+        try:
+            if not ops:
+                return True
+            try:
+                with self._timer('disk_write'):
+                    self.storage.apply(chats, ops)
+            except Exception as e:
+                self._failed_ops = ops
+                self._write_failed(e)
+                # Wątek zapisu ponowi próbę po kolejnym save_interval
+                self._wake.set()
+                return False
+            self._in_flight = set()
+            self.write_error = None
+            return True
+        finally:
+            self._write_lock.release()
+    
+    def _flush_if_dirty(self, chat_id):
+        """Przed odczytem z backendu - zapisz czekające zmiany czatu (i poczekaj na trwający zapis)"""
+        if chat_id in self._dirty or chat_id in self._in_flight:
+            self.flush()
+    
+    def close(self):
+        """Zapisz czekające zmiany i zamknij backend zapisu"""
+        self._stop.set()
+        self._wake.set()
+        if self._writer is not None:
+            self._writer.join()
+            self._writer = None
+        with self._lock:
+            if not self.flush():
+                print(self.write_error)
+            try:
+                self.storage.close()
+            except Exception as e:
+                print(f"Błąd zamykania magazynu czatów: {e}")
+        if self.search_index is not None:
+            self.search_index.close()
+    
+    def _stored_activity(self):
+        return self.storage.last_activity() if hasattr(self.storage, 'last_activity') else {}
+    
+    def _activity(self, chat_id, stored):
+        """Czas ostatniej wiadomości czatu (ISO); stored - wynik storage.last_activity dla czatów niewczytanych"""
+        chat = self.chats[chat_id]
+        if chat_id in self._archived:
+            return self._archived[chat_id]['last_activity']
+        if chat.get('messages'):
+            return chat['messages'][-1].timestamp
+        return stored.get(chat_id) or chat['created_at']
+    
+    def _rebuild_order(self):
+        """Uporządkuj czaty wg ostatniej aktywności (raz, po wczytaniu)"""
+        stored = self._stored_activity()
+        self._order = ActivityOrder(sorted(self.chats, key=lambda chat_id: self._activity(chat_id, stored)))
+    
+    def _hot_chats(self):
+        """Czaty przechowywane w backendzie zapisu (bez zarchiwizowanych)"""
+        if not self._archived:
+            return self.chats
+        if self._hot is None:
+            self._hot = {chat_id: chat for chat_id, chat in self.chats.items() if chat_id not in self._archived}
+        return self._hot
+    
+    def _load_archive(self):
+        """Dołącz czaty z indeksu archiwum jako czaty bez wiadomości (treść zostaje w segmentach)"""
+        self._archived = {}
+        self._thawed.clear()
+        self._hot = None
+        if self.archive is None:
+            return
+        stale = []
+        for chat_id, entry in self.archive.entries().items():
+            if chat_id in self.chats:
+                # Przerwane przenoszenie do archiwum lub z archiwum - obowiązuje wersja z backendu
+                stale.append(chat_id)
+                continue
+            self.chats[chat_id] = dict(entry['chat'])
+            self._archived[chat_id] = entry
+        if stale:
+            self.archive.remove(stale)
+    
+    @staticmethod
+    def _archive_entry(chat):
+        """Metadane czatu w indeksie archiwum - wystarczają do listy, liczników i kolejności"""
+        messages = chat['messages']
+        return {
+            'chat': {key: value for key, value in chat.items() if key != 'messages'},
+            'last_activity': messages[-1].timestamp if messages else chat['created_at'],
+            'message_count': len(messages),
+            'tokens': sum(message_tokens(msg) for msg in messages),
+            'attachments': sorted({digest for msg in messages for digest in attachment_digests(msg.get('attachments'))}),
+            'archived_at': datetime.now().isoformat(),
+        }
+    
+    def archive_inactive(self, days):
+        """Przenieś do archiwum czaty bez aktywności od `days` dni; zwraca liczbę przeniesionych czatów"""
+        cutoff = (datetime.now() - timedelta(days=days)).isoformat()
+        stored = self._stored_activity()
+        with self._lock:
+            inactive = [
+                chat_id for chat_id in self.chats
+                if chat_id not in self._archived and self._activity(chat_id, stored) < cutoff
+            ]
+            if not inactive:
+                return 0
+            try:
+                with self._timer('archive_write'):
+                    entries = self.archive.add([self._ensure_messages(chat_id) for chat_id in inactive], self._archive_entry)
+            except Exception as e:
+                print(f"Błąd archiwizacji czatów: {e}")
+                return 0
+            # Czaty są już w archiwum (utrwalone) - dopiero teraz znikają z backendu
+            for chat_id in inactive:
+                self.chats[chat_id] = dict(entries[chat_id]['chat'])
+                self._archived[chat_id] = entries[chat_id]
+                self._token_totals.pop(chat_id, None)
+                self._record({'op': 'delete_chat', 'chat_id': chat_id})
+            self._hot = None
+            # Dziennik: snapshot bez przeniesionych czatów, więc następny start wczytuje mniej
+            self.save_chats()
+        return len(inactive)
+    
+    def _archived_messages(self, chat_id):
+        """Wiadomości zarchiwizowanego czatu, rozpakowywane przy pierwszym odczycie"""
+        with self._lock:
+            chat = self.chats[chat_id]
+            messages = chat.get('messages')
+            if messages is None:
+                with self._timer('archive_load'):
+                    messages = chat['messages'] = [
+                        Message.from_dict(msg) for msg in self.archive.load(chat_id)['messages']
+                    ]
+            self._thawed[chat_id] = True
+            self._thawed.move_to_end(chat_id)
+            while len(self._thawed) > THAWED_CHATS:
+                evicted, _ = self._thawed.popitem(last=False)
+                if evicted in self._archived:
+                    self.chats[evicted].pop('messages', None)
+            return messages
+    
+    def _promote(self, chat_id):
+        """Przywróć zarchiwizowany czat do backendu zapisu (przed zmianą jego historii)"""
+        with self._lock:
+            if chat_id not in self._archived:
+                return
+            messages = self._archived_messages(chat_id)
+            del self._archived[chat_id]
+            self._thawed.pop(chat_id, None)
+            self._hot = None
+            self._record({'op': 'create_chat', 'chat': dict(self.chats[chat_id], messages=list(messages))})
+            # Czat musi być zapisany w backendzie, zanim zniknie z archiwum
+            if not self.flush():
+                return
         try:
-            with open(self.storage_file, 'w', encoding='utf-8') as f:
-                json.dump(self.chats, f, ensure_ascii=False, indent=2)
+            self.archive.remove([chat_id])
         except Exception as e:
-            print(f"Błąd zapisywania czatów: {e}")
+            print(f"Błąd usuwania czatu z archiwum: {e}")
+    
+    def referenced_blobs(self):
+        """Skróty załączników (BlobStore) używanych w historii czatów - pełne zliczenie tylko przy pierwszym użyciu"""
+        with self._lock:
+            if self._blob_refs is None:
+                refs = Counter()
+                stored = getattr(self.storage, 'attachment_refs', None)
+                if stored is not None:
+                    # Backend leniwy - wszystkie czaty poza archiwum zliczane w bazie
+                    self.flush()
+                    refs.update(stored())
+                for chat_id, chat in self.chats.items():
+                    if chat_id in self._archived:
+                        digests = self._archived[chat_id].get('attachments')
+                        if digests is None:
+                            # Wpis archiwum sprzed zapisywania skrótów w indeksie
+                            messages = self.archive.load(chat_id)['messages']
+                            digests = {d for msg in messages for d in attachment_digests(msg.get('attachments'))}
+                        refs.update(digests)
+                    elif stored is None:
+                        for msg in chat.get('messages') or ():
+                            refs.update(attachment_digests(msg.get('attachments')))
+                self._blob_refs = refs
+            return {digest for digest, count in self._blob_refs.items() if count > 0}
+    
+    def _notify(self, action, position, chat_id):
+        if self.order_listener is not None:
+            self.order_listener(action, position, chat_id)
+    
+    def _touch(self, chat_id):
+        """Przesuń czat na górę listy (ostatnio aktywny)"""
+        position = self._order.position(chat_id)
+        if position == 0:
+            return
+        self._order.remove(chat_id)
+        self._order.append(chat_id)
+        self._notify('move', position, chat_id)
+    
+    def _index(self, method, *args):
+        """Przekaż zmianę do indeksu wyszukiwania (błąd indeksu nie blokuje zapisu historii)"""
+        if self.search_index is None:
+            return
+        try:
+            getattr(self.search_index, method)(*args)
+        except Exception as e:
+            print(f"Błąd aktualizacji indeksu wyszukiwania: {e}")
     
     def create_chat(self, name):
         """Utwórz nowy czat"""
         chat_id = str(uuid.uuid4())
-        self.chats[chat_id] = {
-            'id': chat_id,
-            'name': name,
-            'created_at': datetime.now().isoformat(),
-            'messages': []
-        }
-        self.save_chats()
+        with self._lock:
+            self.chats[chat_id] = {
+                'id': chat_id,
+                'name': name,
+                'created_at': datetime.now().isoformat(),
+                'messages': []
+            }
+            self._order.append(chat_id)
+            self._hot = None
+            self._record({'op': 'create_chat', 'chat': {'id': chat_id, 'name': name, 'created_at': self.chats[chat_id]['created_at']}})
+        self._notify('insert', 0, chat_id)
         return chat_id
     
     def delete_chat(self, chat_id):
         """Usuń czat"""
         if chat_id in self.chats:
-            del self.chats[chat_id]
-            self.save_chats()
+            with self._lock:
+                position = self._order.position(chat_id)
+                del self.chats[chat_id]
+                self._order.remove(chat_id)
+                self._token_totals.pop(chat_id, None)
+                archived = self._archived.pop(chat_id, None) is not None
+                self._thawed.pop(chat_id, None)
+                self._hot = None
+                self._blob_refs = None  # Przeliczane przy następnym użyciu (wiadomości mogą nie być wczytane)
+                self._record({'op': 'delete_chat', 'chat_id': chat_id})
+            if archived:
+                try:
+                    self.archive.remove([chat_id])
+                except Exception as e:
+                    print(f"Błąd usuwania czatu z archiwum: {e}")
+            self._notify('delete', position, chat_id)
+            self._index('remove_chat', chat_id)
     
     def get_chat(self, chat_id):
-        """Pobierz czat po ID"""
-        return self.chats.get(chat_id)
+        """Pobierz czat po ID (w backendach leniwych i z archiwum - wczytując jego wiadomości)"""
+        return self._ensure_messages(chat_id)
+    
+    def _ensure_messages(self, chat_id):
+        """Wczytaj wiadomości czatu do pamięci, jeśli backend ładuje je leniwie lub czat jest w archiwum"""
+        chat = self.chats.get(chat_id)
+        if chat_id in self._archived:
+            self._archived_messages(chat_id)
+        elif chat is not None and 'messages' not in chat:
+            with self._lock:
+                self._flush_if_dirty(chat_id)
+                chat['messages'] = [Message.from_dict(msg) for msg in self.storage.load_messages(chat_id)]
+        return chat
     
     def get_chat_list(self):
-        """Pobierz listę nazw czatów"""
-        return [chat['name'] for chat in self.chats.values()]
+        """Pobierz listę nazw czatów (od ostatnio aktywnego)"""
+        return [self.chats[chat_id]['name'] for chat_id in self.get_chat_ids()]
     
-    def add_message(self, chat_id, role, content, attachments=None):
-        """Dodaj wiadomość do czatu"""
-        if chat_id in self.chats:
-            message = {
-                'role': role,
-                'content': content,
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            if attachments:
-                message['attachments'] = attachments
+    def get_chat_ids(self):
+        """Id czatów w kolejności listy (od ostatnio aktywnego)"""
+        return self._order.ids_oldest_first()[::-1]
+    
+    def chat_id_at(self, position):
+        """Id czatu na danej pozycji listy"""
+        return self._order.at(position)
+    
+    def get_position(self, chat_id):
+        """Pozycja czatu na liście (0 - ostatnio aktywny)"""
+        return self._order.position(chat_id)
+    
+    def add_message(self, chat_id, role, content, attachments=None, tokens=None):
+        """Dodaj wiadomość do czatu (tokens - dokładna liczba tokenów, domyślnie szacowana)"""
+        chat = self.chats.get(chat_id)
+        if chat is not None:
+            self._promote(chat_id)
+            if tokens is None:
+                tokens = estimate_message_tokens(content, attachments)
+            message = Message.now(role, content, tokens, attachments)
             
-            self.chats[chat_id]['messages'].append(message)
-            self.save_chats()
+            # Numer wiadomości, sumy tokenów i kolejka zapisu zmieniane razem (tryb usługi i wsadowy - wiele wątków)
+            with self._lock:
+                seq = self.get_message_count(chat_id) if self.search_index is not None else None
+                if chat_id in self._token_totals:
+                    self._token_totals[chat_id] += tokens
+                # Czat niewczytany z leniwego backendu - wystarczy zapis w magazynie
+                if 'messages' in chat:
+                    chat['messages'].append(message)
+                if self._blob_refs is not None:
+                    self._blob_refs.update(attachment_digests(attachments))
+                self._record({'op': 'add_message', 'chat_id': chat_id, 'message': message})
+                self._touch(chat_id)
+            self._index('add', chat_id, seq, content)
     
-    def get_messages(self, chat_id):
-        """Pobierz wiadomości z czatu"""
-        if chat_id in self.chats:
-            return self.chats[chat_id]['messages']
-        return []
+    def pop_message(self, chat_id):
+        """Usuń ostatnią wiadomość z czatu (np. po błędzie wysyłania)"""
+        self._promote(chat_id)
+        chat = self._ensure_messages(chat_id)
+        if chat and chat['messages']:
+            with self._lock:
+                message = chat['messages'].pop()
+                if chat_id in self._token_totals:
+                    self._token_totals[chat_id] -= message_tokens(message)
+                if self._blob_refs is not None:
+                    self._blob_refs.subtract(attachment_digests(message.get('attachments')))
+                self._record({'op': 'pop_message', 'chat_id': chat_id})
+            self._index('remove', chat_id, len(chat['messages']))
+            return message
+        return None
+    
+    def get_messages(self, chat_id, offset=0, limit=None):
+        """Pobierz wiadomości z czatu (opcjonalnie stronę od `offset` o długości `limit`)"""
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            return []
+        if chat_id in self._archived:
+            messages = self._archived_messages(chat_id)
+        elif 'messages' not in chat:
+            with self._lock:
+                self._flush_if_dirty(chat_id)
+                return [Message.from_dict(msg) for msg in self.storage.load_messages(chat_id, offset, limit)]
+        else:
+            messages = chat['messages']
+        if offset == 0 and limit is None:
+            return messages
+        end = None if limit is None else offset + limit
+        return messages[offset:end]
+    
+    def iter_messages_reversed(self, chat_id, page_size=100):
+        """Iteruj po wiadomościach od najnowszej, doczytując je stronami"""
+        end = self.get_message_count(chat_id)
+        while end > 0:
+            start = max(0, end - page_size)
+            yield from reversed(self.get_messages(chat_id, start, end - start))
+            end = start
+    
+    def search(self, query, limit=20):
+        """Wyszukaj wiadomości we wszystkich czatach: lista {'chat_id', 'offset', 'snippet', 'score'}"""
+        if self.search_index is None:
+            return []
+        return [hit for hit in self.search_index.search(query, limit) if hit['chat_id'] in self.chats]
+    
+    def get_token_count(self, chat_id):
+        """Łączna liczba tokenów czatu - pełne zliczenie tylko przy pierwszym użyciu"""
+        if chat_id not in self.chats:
+            return 0
+        if chat_id in self._archived:
+            return self._archived[chat_id]['tokens']
+        if chat_id not in self._token_totals:
+            self._token_totals[chat_id] = sum(message_tokens(msg) for msg in self.iter_messages_reversed(chat_id))
+        return self._token_totals[chat_id]
+    
+    def get_message_count(self, chat_id):
+        """Liczba wiadomości w czacie bez wczytywania ich treści"""
+        chat = self.chats.get(chat_id)
+        if chat is None:
+            return 0
+        if chat_id in self._archived:
+            return self._archived[chat_id]['message_count']
+        if 'messages' not in chat:
+            with self._lock:
+                self._flush_if_dirty(chat_id)
+                return self.storage.count_messages(chat_id)
+        return len(chat['messages'])
@@ -0,0 +1,74 @@
+# client_pool.py
+# Długożyjący klient API, wspólne konfiguracje generowania i pula sesji czatów
+
+from context import SessionCache
+from generation import build_generate_config, generate_config_key
+
+
+class ClientManager:
+    """Jeden klient API na klucz, konfiguracje generowania wg ustawień i sesje czatów (LRU)
+
+    Klient (genai.Client) trzyma pulę połączeń HTTP keep-alive, więc jest
+    tworzony od nowa tylko po zmianie klucza API. GenerateContentConfig
+    budowany jest raz dla danego zestawu ustawień i współdzielony (traktowany
+    jako niezmienny). Sesje czatów przeżywają przełączanie czatów i zapis
+    ustawień - usuwane są tylko, gdy zmieni się coś, od czego zależą.
+    """
+
+    MAX_CONFIGS = 16
+
+    def __init__(self, factory, config, session_cache_size=8):
+        self.factory = factory  # Funkcja bez argumentów tworząca klienta
+        self.sessions = SessionCache(session_cache_size)
+        self._client = None
+        self._api_key = None
+        self._configs = {}  # generate_config_key -> GenerateContentConfig
+        self._session_key = self.session_key(config)
+
+    @staticmethod
+    def session_key(config):
+        """Ustawienia, od których zależy sesja czatu (klucz API, model, parametry generowania)"""
+        return config.api_key, config.model_name, generate_config_key(config)
+
+    def client(self, api_key):
+        """Klient dla klucza API (nowy tylko po zmianie klucza)"""
+        if not api_key:
+            return None
+        if self._client is None or api_key != self._api_key:
+            # Poprzedniego klienta mogą jeszcze używać trwające zapytania - nie jest zamykany
+            self._client = self.factory()
+            self._api_key = api_key
+        return self._client
+
+    def generate_config(self, config):
+        """Współdzielony GenerateContentConfig dla bieżących ustawień - nie modyfikować"""
+        key = generate_config_key(config)
+        generate_config = self._configs.get(key)
+        if generate_config is None:
+            if len(self._configs) >= self.MAX_CONFIGS:
+                self._configs.clear()
+            generate_config = self._configs[key] = build_generate_config(config)
+        return generate_config
+
+    def apply_settings(self, config):
+        """Po zmianie ustawień: usuń sesje, tylko jeśli zależą od zmienionych wartości
+
+        Zwraca True, jeśli sesje zostały usunięte (odtworzą się z historii przy kolejnym wysłaniu).
+        """
+        session_key = self.session_key(config)
+        if session_key == self._session_key:
+            return False
+        self._session_key = session_key
+        self.sessions.clear()
+        return True
+
+    def close(self):
+        """Zamknij klienta i jego połączenia (po zatrzymaniu zapytań)"""
+        self.sessions.clear()
+        client, self._client = self._client, None
+        close = getattr(client, 'close', None)
+        if close is not None:
+            try:
+                close()
+            except Exception as e:
+                print(f"Błąd zamykania klienta API: {e}")
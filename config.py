@@ -18,6 +18,39 @@ class Config:
         self.top_k = 40
         self.system_instruction = ''
         self.enable_safety_filters = False  # Domyślnie wyłączone filtry bezpieczeństwa
+        self.storage_backend = 'journal'  # 'journal', 'sqlite' lub 'json'
+        self.save_interval_s = 1.0  # Zmiany czatów zapisywane w tle co tyle sekund (0 - przy każdej zmianie)
+        self.archive_after_days = 90  # Czaty bez aktywności dłużej niż tyle dni trafiają do archiwum (0 - wyłączone)
+        self.archive_codec = 'gzip'  # Kompresja archiwum: 'gzip' (szybsze otwieranie) lub 'lzma' (mniejsze pliki)
+        self.stream_responses = True  # Wyświetlaj odpowiedź fragmentami w trakcie generowania
+        self.history_window = 200  # Liczba ostatnich wiadomości renderowanych po otwarciu czatu
+        self.context_budget_tokens = 32000  # Budżet tokenów historii odtwarzanej w nowej sesji czatu
+        self.session_cache_size = 8  # Liczba sesji czatu trzymanych w pamięci (LRU)
+        self.exact_token_count = False  # Dokładne zliczanie tokenów przez API przed wysłaniem
+        self.attachment_store_mb = 1024  # Limit rozmiaru magazynu załączników (katalog attachments/)
+        self.upload_threshold_mb = 4  # Większe załączniki idą przez Files API (0 - zawsze w treści zapytania)
+        self.attachment_inline_kb = 32  # Większe pliki tekstowe wysyłane są we fragmentach pasujących do wiadomości (0 - w całości)
+        self.retrieval_top_k = 8  # Liczba fragmentów dużych plików tekstowych dołączanych do zapytania
+        self.image_max_dimension = 1536  # Obrazy zmniejszane do tego boku przed wysłaniem (0 - bez zmian)
+        self.image_quality = 85  # Jakość JPEG przy ponownym kodowaniu obrazów
+        self.batch_concurrency = 8  # Liczba równoczesnych zapytań w trybie wsadowym (--batch)
+        self.server_host = '127.0.0.1'  # Adres usługi HTTP (--serve)
+        self.server_port = 8765  # Port usługi HTTP
+        self.server_token = ''  # Token wymagany od klientów usługi ('' - bez uwierzytelniania)
+        self.requests_per_minute = 60  # Limit zapytań na minutę dla każdego modelu (0 - bez limitu)
+        self.max_retries = 3  # Ponowienia przy błędach przejściowych (429, 503, zerwane połączenie)
+        self.hedge_after_s = 0  # Zapytanie zapasowe po tylu sekundach bez odpowiedzi (0 - wyłączone)
+        self.response_cache_mode = 'deterministic'  # 'off', 'deterministic' (tylko temperatura 0) lub 'always'
+        self.response_cache_ttl_s = 24 * 3600  # Czas ważności odpowiedzi w pamięci podręcznej
+        self.response_cache_size = 256  # Liczba odpowiedzi trzymanych w pamięci (pozostałe na dysku)
+        self.response_cache_disk_mb = 100  # Limit rozmiaru katalogu response_cache/ (0 - bez limitu)
+        self.metrics_export = ''  # Eksport metryk: '' (wyłączony), 'jsonl' lub 'prometheus'
+        self.metrics_file = 'metrics.jsonl'  # Plik eksportu metryk
+        self.metrics_interval_s = 60  # Co ile sekund eksportować metryki
+        self.context_cache = False  # Instrukcja systemowa i przypięte pliki w pamięci kontekstu API (płatne przechowywanie)
+        self.context_cache_ttl_s = 3600  # Czas życia wpisu pamięci kontekstu (przedłużany przy używaniu)
+        self.context_cache_min_tokens = 1024  # Krótszy stały początek zapytania wysyłany jest bez pamięci kontekstu
+        self.context_cache_files = []  # Pliki referencyjne przypięte do każdego zapytania (tylko z pamięcią kontekstu)
         
         self.load()
     
@@ -35,6 +68,39 @@ class Config:
                     self.top_k = data.get('top_k', self.top_k)
                     self.system_instruction = data.get('system_instruction', self.system_instruction)
                     self.enable_safety_filters = data.get('enable_safety_filters', self.enable_safety_filters)
+                    self.storage_backend = data.get('storage_backend', self.storage_backend)
+                    self.save_interval_s = data.get('save_interval_s', self.save_interval_s)
+                    self.archive_after_days = data.get('archive_after_days', self.archive_after_days)
+                    self.archive_codec = data.get('archive_codec', self.archive_codec)
+                    self.stream_responses = data.get('stream_responses', self.stream_responses)
+                    self.history_window = data.get('history_window', self.history_window)
+                    self.context_budget_tokens = data.get('context_budget_tokens', self.context_budget_tokens)
+                    self.session_cache_size = data.get('session_cache_size', self.session_cache_size)
+                    self.exact_token_count = data.get('exact_token_count', self.exact_token_count)
+                    self.attachment_store_mb = data.get('attachment_store_mb', self.attachment_store_mb)
+                    self.upload_threshold_mb = data.get('upload_threshold_mb', self.upload_threshold_mb)
+                    self.attachment_inline_kb = data.get('attachment_inline_kb', self.attachment_inline_kb)
+                    self.retrieval_top_k = data.get('retrieval_top_k', self.retrieval_top_k)
+                    self.image_max_dimension = data.get('image_max_dimension', self.image_max_dimension)
+                    self.image_quality = data.get('image_quality', self.image_quality)
+                    self.batch_concurrency = data.get('batch_concurrency', self.batch_concurrency)
+                    self.server_host = data.get('server_host', self.server_host)
+                    self.server_port = data.get('server_port', self.server_port)
+                    self.server_token = data.get('server_token', self.server_token)
+                    self.requests_per_minute = data.get('requests_per_minute', self.requests_per_minute)
+                    self.max_retries = data.get('max_retries', self.max_retries)
+                    self.hedge_after_s = data.get('hedge_after_s', self.hedge_after_s)
+                    self.response_cache_mode = data.get('response_cache_mode', self.response_cache_mode)
+                    self.response_cache_ttl_s = data.get('response_cache_ttl_s', self.response_cache_ttl_s)
+                    self.response_cache_size = data.get('response_cache_size', self.response_cache_size)
+                    self.response_cache_disk_mb = data.get('response_cache_disk_mb', self.response_cache_disk_mb)
+                    self.metrics_export = data.get('metrics_export', self.metrics_export)
+                    self.metrics_file = data.get('metrics_file', self.metrics_file)
+                    self.metrics_interval_s = data.get('metrics_interval_s', self.metrics_interval_s)
+                    self.context_cache = data.get('context_cache', self.context_cache)
+                    self.context_cache_ttl_s = data.get('context_cache_ttl_s', self.context_cache_ttl_s)
+                    self.context_cache_min_tokens = data.get('context_cache_min_tokens', self.context_cache_min_tokens)
+                    self.context_cache_files = data.get('context_cache_files', self.context_cache_files)
             except Exception as e:
                 print(f"Błąd wczytywania konfiguracji: {e}")
     
@@ -49,7 +115,40 @@ class Config:
                 'top_p': self.top_p,
                 'top_k': self.top_k,
                 'system_instruction': self.system_instruction,
-                'enable_safety_filters': self.enable_safety_filters
+                'enable_safety_filters': self.enable_safety_filters,
+                'storage_backend': self.storage_backend,
+                'save_interval_s': self.save_interval_s,
+                'archive_after_days': self.archive_after_days,
+                'archive_codec': self.archive_codec,
+                'stream_responses': self.stream_responses,
+                'history_window': self.history_window,
+                'context_budget_tokens': self.context_budget_tokens,
+                'session_cache_size': self.session_cache_size,
+                'exact_token_count': self.exact_token_count,
+                'attachment_store_mb': self.attachment_store_mb,
+                'upload_threshold_mb': self.upload_threshold_mb,
+                'attachment_inline_kb': self.attachment_inline_kb,
+                'retrieval_top_k': self.retrieval_top_k,
+                'image_max_dimension': self.image_max_dimension,
+                'image_quality': self.image_quality,
+                'batch_concurrency': self.batch_concurrency,
+                'server_host': self.server_host,
+                'server_port': self.server_port,
+                'server_token': self.server_token,
+                'requests_per_minute': self.requests_per_minute,
+                'max_retries': self.max_retries,
+                'hedge_after_s': self.hedge_after_s,
+                'response_cache_mode': self.response_cache_mode,
+                'response_cache_ttl_s': self.response_cache_ttl_s,
+                'response_cache_size': self.response_cache_size,
+                'response_cache_disk_mb': self.response_cache_disk_mb,
+                'metrics_export': self.metrics_export,
+                'metrics_file': self.metrics_file,
+                'metrics_interval_s': self.metrics_interval_s,
+                'context_cache': self.context_cache,
+                'context_cache_ttl_s': self.context_cache_ttl_s,
+                'context_cache_min_tokens': self.context_cache_min_tokens,
+                'context_cache_files': self.context_cache_files
             }
             with open(self.config_file, 'w', encoding='utf-8') as f:
                 json.dump(data, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,89 @@
+# context.py
+# Odtwarzanie kontekstu rozmowy dla sesji czatu
+
+from collections import OrderedDict
+
+from tokens import message_tokens
+
+
+def message_to_content(msg):
+    """Zamień zapisaną wiadomość na wpis historii w formacie SDK (ContentDict)"""
+    text = msg['content']
+    if msg.get('attachments'):
+        note = f"[Załączniki: {len(msg['attachments'])}]"
+        text = f"{note}\n{text}" if text else note
+    return {'role': msg['role'], 'parts': [{'text': text}]}
+
+
+def build_history(messages_newest_first, max_tokens):
+    """Zbuduj historię sesji z najnowszych wiadomości mieszczących się w budżecie tokenów
+
+    messages_newest_first - wiadomości od najnowszej (np. ChatManager.iter_messages_reversed),
+    dzięki czemu koszt zależy od budżetu, a nie od długości całej rozmowy.
+    Historia zaczyna się od wiadomości użytkownika, kończy odpowiedzią modelu,
+    a role się przeplatają (wiadomości bez odpowiedzi są pomijane).
+    Zwraca (historia, liczba tokenów historii).
+    """
+    history = []
+    used = 0
+    for msg in messages_newest_first:
+        expected = history[-1][0]['role'] if history else 'user'
+        if msg['role'] == expected:
+            continue
+        tokens = message_tokens(msg)
+        if used + tokens > max_tokens:
+            break
+        history.append((message_to_content(msg), tokens))
+        used += tokens
+
+    # Najstarsza zachowana wiadomość musi pochodzić od użytkownika
+    if history and history[-1][0]['role'] != 'user':
+        used -= history.pop()[1]
+    history.reverse()
+    return [content for content, _ in history], used
+
+
+class SessionCache:
+    """Sesje czatu (z odtworzonym kontekstem) dla ostatnio używanych czatów, usuwane wg LRU
+
+    Dla każdej sesji liczona jest też bieżąca liczba tokenów jej historii,
+    aktualizowana przyrostowo po każdej wymianie wiadomości.
+    """
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self._sessions = OrderedDict()
+        self._tokens = {}
+
+    def get(self, chat_id):
+        session = self._sessions.get(chat_id)
+        if session is not None:
+            self._sessions.move_to_end(chat_id)
+        return session
+
+    def put(self, chat_id, session, tokens=0):
+        self._sessions[chat_id] = session
+        self._sessions.move_to_end(chat_id)
+        self._tokens[chat_id] = tokens
+        while len(self._sessions) > self.maxsize:
+            evicted, _ = self._sessions.popitem(last=False)
+            self._tokens.pop(evicted, None)
+
+    def tokens(self, chat_id):
+        """Liczba tokenów historii sesji czatu"""
+        return self._tokens.get(chat_id, 0)
+
+    def add_tokens(self, chat_id, tokens):
+        if chat_id in self._sessions:
+            self._tokens[chat_id] += tokens
+
+    def discard(self, chat_id):
+        self._sessions.pop(chat_id, None)
+        self._tokens.pop(chat_id, None)
+
+    def clear(self):
+        self._sessions.clear()
+        self._tokens.clear()
+
+    def __len__(self):
+        return len(self._sessions)
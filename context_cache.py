@@ -0,0 +1,176 @@
+# context_cache.py
+# Pamięć kontekstu po stronie API (client.caches) dla stałego początku zapytań:
+# instrukcji systemowej i przypiętych dokumentów referencyjnych
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from file_uploads import key_fingerprint
+from storage import atomic_write_json
+
+REFRESH_MARGIN = 300  # Sekundy przed wygaśnięciem, od których używany wpis jest przedłużany
+FAILURE_BACKOFF = 600  # Po nieudanym utworzeniu (np. za mało tokenów) ponowna próba dopiero po tym czasie
+
+
+def prefix_key(api_key, model_name, system_instruction, pinned_refs):
+    """Skrót stałego początku zapytania - klucz wpisu pamięci kontekstu"""
+    payload = json.dumps(
+        [model_name, system_instruction or '', [ref['sha256'] for ref in pinned_refs]],
+        ensure_ascii=False
+    )
+    return f"{key_fingerprint(api_key)}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+def _expires_at(cached, ttl):
+    expire_time = getattr(cached, 'expire_time', None)
+    if isinstance(expire_time, datetime):
+        if expire_time.tzinfo is None:
+            expire_time = expire_time.replace(tzinfo=timezone.utc)
+        return expire_time.timestamp()
+    return time.time() + ttl
+
+
+class ContextCache:
+    """Wpisy client.caches wg modelu i stałego początku zapytania, z przedłużaniem i usuwaniem
+
+    - wpis tworzony jest przy pierwszym zapytaniu, o ile początek ma co najmniej
+      min_tokens (mniejszych API nie przyjmuje, a zysk byłby pomijalny),
+    - używany wpis bliski wygaśnięcia jest przedłużany (caches.update z nowym ttl),
+    - dla każdego modelu trzymanych jest najwyżej max_per_model wpisów - najdawniej
+      używany jest usuwany po stronie API (przestaje być naliczany za przechowywanie),
+    - uchwyty zapisywane są w cache_file, więc po restarcie aplikacji wpisy są
+      używane ponownie aż do wygaśnięcia.
+    """
+
+    def __init__(self, cache_file='context_caches.json', ttl=3600, min_tokens=1024, max_per_model=2, metrics=None):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.max_per_model = max_per_model
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self._failures = {}  # klucz -> czas, do którego nie ponawiać tworzenia
+        self._entries = {}
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except Exception as e:
+                print(f"Błąd wczytywania pamięci kontekstu: {e}")
+
+    def _count(self, name):
+        if self.metrics is not None:
+            self.metrics.incr(name)
+
+    def _save(self):
+        try:
+            atomic_write_json(self.cache_file, self._entries)
+        except Exception as e:
+            print(f"Błąd zapisywania pamięci kontekstu: {e}")
+
+    def _lock_for(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def get(self, client, api_key, model_name, system_instruction, pinned_refs, estimated_tokens, build_contents):
+        """Nazwa wpisu (cached_content) dla początku zapytania lub None, gdy pamięć kontekstu nie ma zastosowania
+
+        build_contents() - lista Content z przypiętymi dokumentami (wywoływana tylko przy tworzeniu wpisu)
+        """
+        if estimated_tokens < self.min_tokens:
+            return None
+        key = prefix_key(api_key, model_name, system_instruction, pinned_refs)
+        with self._lock_for(key):
+            if self._failures.get(key, 0) > time.time():
+                return None
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry['expires_at'] <= time.time():
+                    del self._entries[key]
+                    entry = None
+            if entry is None:
+                entry = self._create(client, key, model_name, system_instruction, build_contents)
+                if entry is None:
+                    return None
+            elif entry['expires_at'] - REFRESH_MARGIN <= time.time():
+                self._refresh(client, entry)
+            else:
+                self._count('context_cache_hits')
+            entry['used_at'] = time.time()  # Kolejność usuwania - zapisywana razem z innymi zmianami
+            return entry['name']
+
+    def _create(self, client, key, model_name, system_instruction, build_contents):
+        from google.genai import types
+
+        try:
+            cached = client.caches.create(
+                model=model_name,
+                config=types.CreateCachedContentConfig(
+                    system_instruction=system_instruction or None,
+                    contents=build_contents() or None,
+                    ttl=f"{int(self.ttl)}s",
+                    display_name='gemini-chat-prefix',
+                )
+            )
+        except Exception as e:
+            print(f"Błąd tworzenia pamięci kontekstu (zapytania pójdą bez niej): {e}")
+            self._failures[key] = time.time() + FAILURE_BACKOFF
+            self._count('context_cache_errors')
+            return None
+
+        self._count('context_cache_creates')
+        entry = {'name': cached.name, 'model': model_name, 'expires_at': _expires_at(cached, self.ttl)}
+        with self._lock:
+            self._entries[key] = entry
+            evicted = self._evict(model_name, keep=key)
+            self._save()
+        for name in evicted:
+            self._delete_remote(client, name)
+        return entry
+
+    def _refresh(self, client, entry):
+        from google.genai import types
+
+        try:
+            cached = client.caches.update(
+                name=entry['name'],
+                config=types.UpdateCachedContentConfig(ttl=f"{int(self.ttl)}s")
+            )
+            with self._lock:
+                entry['expires_at'] = _expires_at(cached, self.ttl)
+                self._save()
+            self._count('context_cache_refreshes')
+        except Exception as e:
+            # Wpis jeszcze działa do wygaśnięcia - przy następnym użyciu spróbujemy znowu
+            print(f"Błąd przedłużania pamięci kontekstu: {e}")
+
+    def _evict(self, model_name, keep):
+        """Usuń wygasłe wpisy i nadmiarowe wpisy modelu (wywoływane pod blokadą); zwraca nazwy do usunięcia w API"""
+        now = time.time()
+        self._entries = {k: e for k, e in self._entries.items() if e['expires_at'] > now}
+        fingerprint = keep.split(':', 1)[0]
+        same_model = sorted(
+            (k for k, e in self._entries.items()
+             if e['model'] == model_name and k != keep and k.startswith(f"{fingerprint}:")),
+            key=lambda k: self._entries[k].get('used_at', 0)
+        )
+        excess = len(same_model) + 1 - self.max_per_model
+        return [self._entries.pop(k)['name'] for k in same_model[:max(0, excess)]]
+
+    def _delete_remote(self, client, name):
+        try:
+            client.caches.delete(name=name)
+            self._count('context_cache_evictions')
+        except Exception as e:
+            print(f"Błąd usuwania pamięci kontekstu {name}: {e}")
+
+    def invalidate(self, name):
+        """Zapomnij wpis, którego API już nie zna (np. usunięty ręcznie) - następne zapytanie utworzy nowy"""
+        with self._lock:
+            self._entries = {k: e for k, e in self._entries.items() if e['name'] != name}
+            self._save()
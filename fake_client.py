@@ -0,0 +1,320 @@
+# fake_client.py
+# Lokalny zamiennik genai.Client do testów i benchmarków (bez sieci i klucza API)
+
+import asyncio
+import itertools
+import time
+from datetime import datetime, timedelta, timezone
+
+
+def _message_text(message):
+    """Wyciągnij tekst z wiadomości w formacie przyjmowanym przez chat.send_message"""
+    if isinstance(message, str):
+        return message
+    parts = message if isinstance(message, (list, tuple)) else [message]
+    texts = []
+    for part in parts:
+        if isinstance(part, str):
+            texts.append(part)
+        elif isinstance(part, dict) and part.get('text'):
+            texts.append(part['text'])
+        elif getattr(part, 'text', None):
+            texts.append(part.text)
+    return '\n'.join(texts)
+
+
+def echo_responder(text):
+    """Domyślna odpowiedź fałszywego modelu"""
+    return f"Odpowiedź na: {text}"
+
+
+class FakeUsage:
+    """usage_metadata odpowiedzi (tokeny szacowane jak w tokens.estimate_tokens)"""
+
+    def __init__(self, prompt_text, response_text, cached_tokens=0):
+        self.cached_content_token_count = cached_tokens or None
+        self.prompt_token_count = max(1, len(prompt_text) // 4) + cached_tokens
+        self.candidates_token_count = max(1, len(response_text) // 4)
+        self.total_token_count = self.prompt_token_count + self.candidates_token_count
+
+
+class FakeResponse:
+    """Odpowiedź (lub fragment strumienia) z atrybutami .text i .usage_metadata jak w SDK"""
+
+    def __init__(self, text, usage_metadata=None):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class FakeChat:
+    """Sesja czatu udająca obiekt zwracany przez client.chats.create"""
+
+    def __init__(self, client, model, config=None, history=None):
+        self.client = client
+        self.model = model
+        self.config = config
+        self.history = list(history or [])
+
+    def _generate(self, message, config=None, stream=False):
+        self.client.calls += 1
+        # Przy error_after_chunks strumień rzuca błąd dopiero po części fragmentów
+        if self.client.should_fail() and not (stream and self.client.error_after_chunks):
+            raise self.client.error
+        cached_tokens = 0
+        cached_content = getattr(config, 'cached_content', None)
+        if cached_content:
+            cached_tokens = self.client.caches.use(cached_content, self.model).token_count
+        text = _message_text(message)
+        reply = self.client.responder(text)
+        self.history.extend([
+            {'role': 'user', 'parts': [{'text': text}]},
+            {'role': 'model', 'parts': [{'text': reply}]},
+        ])
+        return reply, FakeUsage(text, reply, cached_tokens)
+
+    def send_message(self, message, config=None):
+        """Zwróć całą odpowiedź po łącznym czasie generowania wszystkich fragmentów"""
+        reply, usage = self._generate(message, config)
+        chunks = self.client.split(reply)
+        time.sleep(self.client.first_chunk_delay + self.client.chunk_delay * max(len(chunks) - 1, 0))
+        return FakeResponse(reply, usage)
+
+    def send_message_stream(self, message, config=None):
+        """Zwracaj odpowiedź fragmentami z konfigurowalnymi opóźnieniami"""
+        reply, usage = self._generate(message, config, stream=True)
+        chunks = self.client.split(reply)
+        for i, chunk in enumerate(chunks):
+            if i == self.client.error_after_chunks and self.client.should_fail():
+                raise self.client.error
+            time.sleep(self.client.first_chunk_delay if i == 0 else self.client.chunk_delay)
+            # Jak w API - liczby tokenów przychodzą z ostatnim fragmentem
+            yield FakeResponse(chunk, usage if i == len(chunks) - 1 else None)
+
+    def get_history(self):
+        return list(self.history)
+
+
+class FakeChats:
+    def __init__(self, client):
+        self.client = client
+
+    def create(self, model, config=None, history=None):
+        return FakeChat(self.client, model, config=config, history=history)
+
+
+class FakeAsyncChat:
+    """Sesja czatu udająca obiekt zwracany przez client.aio.chats.create (opóźnienia bez blokowania pętli)"""
+
+    def __init__(self, client, model, config=None, history=None):
+        self.client = client
+        self._chat = FakeChat(client, model, config=config, history=history)
+
+    async def send_message(self, message, config=None):
+        reply, usage = self._chat._generate(message, config)
+        chunks = self.client.split(reply)
+        await asyncio.sleep(self.client.first_chunk_delay + self.client.chunk_delay * max(len(chunks) - 1, 0))
+        return FakeResponse(reply, usage)
+
+    async def send_message_stream(self, message, config=None):
+        """Jak w SDK - korutyna zwracająca asynchroniczny iterator fragmentów"""
+        reply, usage = self._chat._generate(message, config, stream=True)
+        return self._stream(reply, usage)
+
+    async def _stream(self, reply, usage):
+        chunks = self.client.split(reply)
+        for i, chunk in enumerate(chunks):
+            if i == self.client.error_after_chunks and self.client.should_fail():
+                raise self.client.error
+            await asyncio.sleep(self.client.first_chunk_delay if i == 0 else self.client.chunk_delay)
+            yield FakeResponse(chunk, usage if i == len(chunks) - 1 else None)
+
+    def get_history(self):
+        return self._chat.get_history()
+
+
+class FakeAsyncChats:
+    def __init__(self, client):
+        self.client = client
+
+    def create(self, model, config=None, history=None):
+        return FakeAsyncChat(self.client, model, config=config, history=history)
+
+
+class FakeAio:
+    """Asynchroniczna część klienta (client.aio)"""
+
+    def __init__(self, client):
+        self.chats = FakeAsyncChats(client)
+
+    async def aclose(self):
+        pass
+
+
+class FakeTokenCount:
+    def __init__(self, total_tokens):
+        self.total_tokens = total_tokens
+
+
+class FakeModels:
+    def __init__(self, client):
+        self.client = client
+
+    def count_tokens(self, model, contents):
+        """Zlicz tokeny tak jak lokalny estymator (ok. 4 znaki na token)"""
+        items = contents if isinstance(contents, (list, tuple)) else [contents]
+        texts = []
+        for item in items:
+            parts = getattr(item, 'parts', None)
+            if parts is None and isinstance(item, dict):
+                parts = item.get('parts')
+            texts.append(_message_text(parts if parts is not None else item))
+        return FakeTokenCount(sum(max(1, len(text) // 4) for text in texts if text))
+
+
+class FakeFile:
+    def __init__(self, name, mime_type, display_name=None, state='ACTIVE', lifetime=timedelta(hours=48)):
+        self.name = name
+        self.uri = f"https://fake.files/{name}"
+        self.mime_type = mime_type
+        self.display_name = display_name
+        self.state = state
+        self.expiration_time = datetime.now(timezone.utc) + lifetime
+
+
+class FakeFiles:
+    """Lokalny zamiennik endpointu Files API (client.files)"""
+
+    def __init__(self, client, processing_polls=0, lifetime=timedelta(hours=48)):
+        self.client = client
+        self.processing_polls = processing_polls
+        self.lifetime = lifetime
+        self.uploads = []
+        self._files = {}
+        self._polls = {}
+        self._ids = itertools.count(1)
+
+    def upload(self, file, config=None):
+        config = config or {}
+        name = f"files/fake-{next(self._ids)}"
+        state = 'PROCESSING' if self.processing_polls else 'ACTIVE'
+        uploaded = FakeFile(name, config.get('mime_type'), config.get('display_name'), state, self.lifetime)
+        self._files[name] = uploaded
+        self._polls[name] = self.processing_polls
+        self.uploads.append(file)
+        return uploaded
+
+    def get(self, name):
+        uploaded = self._files[name]
+        self._polls[name] -= 1
+        if self._polls[name] <= 0:
+            uploaded.state = 'ACTIVE'
+        return uploaded
+
+    def delete(self, name):
+        self._files.pop(name, None)
+
+
+class FakeAPIError(Exception):
+    """Błąd z kodem HTTP jak google.genai.errors.APIError"""
+
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+class FakeCachedContent:
+    def __init__(self, name, model, token_count, expire_time):
+        self.name = name
+        self.model = model
+        self.token_count = token_count
+        self.expire_time = expire_time
+
+
+class FakeCaches:
+    """Lokalny zamiennik pamięci kontekstu API (client.caches)"""
+
+    def __init__(self, client, min_tokens=0):
+        self.client = client
+        self.min_tokens = min_tokens
+        self._caches = {}
+        self._ids = itertools.count(1)
+
+    @staticmethod
+    def _ttl(config):
+        ttl = config.get('ttl') if isinstance(config, dict) else getattr(config, 'ttl', None)
+        return timedelta(seconds=float(str(ttl or '3600s').rstrip('s')))
+
+    def create(self, model, config=None):
+        field = (lambda key: config.get(key)) if isinstance(config, dict) else (lambda key: getattr(config, key, None))
+        texts = [_message_text(field('system_instruction') or '')]
+        for content in field('contents') or ():
+            parts = getattr(content, 'parts', None)
+            if parts is None and isinstance(content, dict):
+                parts = content.get('parts')
+            texts.append(_message_text(parts if parts is not None else content))
+        token_count = sum(len(text) // 4 for text in texts)
+        if token_count < self.min_tokens:
+            raise FakeAPIError(400, f"Cached content is too small: {token_count} < {self.min_tokens} tokens")
+        name = f"cachedContents/fake-{next(self._ids)}"
+        cached = FakeCachedContent(name, model, token_count, datetime.now(timezone.utc) + self._ttl(config))
+        self._caches[name] = cached
+        return cached
+
+    def get(self, name):
+        cached = self._caches.get(name)
+        if cached is None or cached.expire_time <= datetime.now(timezone.utc):
+            self._caches.pop(name, None)
+            raise FakeAPIError(403, f"CachedContent not found (or permission denied): {name}")
+        return cached
+
+    def update(self, name, config=None):
+        cached = self.get(name)
+        cached.expire_time = datetime.now(timezone.utc) + self._ttl(config)
+        return cached
+
+    def delete(self, name):
+        self.get(name)
+        del self._caches[name]
+
+    def use(self, name, model):
+        """Wpis użyty w zapytaniu - musi istnieć i należeć do tego samego modelu"""
+        cached = self.get(name)
+        if cached.model != model:
+            raise FakeAPIError(400, f"Model {model} does not match cached content model {cached.model}")
+        return cached
+
+
+class FakeClient:
+    """Deterministyczny zamiennik genai.Client
+
+    responder - funkcja tekst -> odpowiedź modelu
+    chunk_size - liczba znaków w jednym fragmencie strumienia
+    first_chunk_delay / chunk_delay - opóźnienia w sekundach (czas do pierwszego tokena / między fragmentami)
+    error - wyjątek rzucany przy każdym wywołaniu (symulacja błędów API)
+    fail_every - rzucaj error tylko przy co n-tym wywołaniu (np. przejściowe 503 ponawiane przez RequestExecutor)
+    error_after_chunks - w strumieniu rzuć error dopiero po tylu fragmentach (przerwana odpowiedź)
+    """
+
+    def __init__(self, responder=echo_responder, chunk_size=16, first_chunk_delay=0.0, chunk_delay=0.0, error=None,
+                 fail_every=0, error_after_chunks=0):
+        self.responder = responder
+        self.chunk_size = chunk_size
+        self.first_chunk_delay = first_chunk_delay
+        self.chunk_delay = chunk_delay
+        self.error = error
+        self.fail_every = fail_every
+        self.error_after_chunks = error_after_chunks
+        self.calls = 0
+        self.chats = FakeChats(self)
+        self.models = FakeModels(self)
+        self.files = FakeFiles(self)
+        self.caches = FakeCaches(self)
+        self.aio = FakeAio(self)
+
+    def should_fail(self):
+        if self.error is None:
+            return False
+        return not self.fail_every or self.calls % self.fail_every == 0
+
+    def split(self, text):
+        return [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)] or ['']
@@ -0,0 +1,113 @@
+# file_uploads.py
+# Przesyłanie dużych załączników przez Files API z ponownym użyciem uchwytów
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from storage import atomic_write_json
+
+DEFAULT_LIFETIME = timedelta(hours=47)  # Files API przechowuje pliki 48 h
+EXPIRY_MARGIN = 600  # Sekundy zapasu - uchwyt bliski wygaśnięcia jest przesyłany ponownie
+
+
+def key_fingerprint(api_key):
+    """Pliki są widoczne tylko dla projektu klucza API - uchwyty rozróżniane są skrótem klucza"""
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+
+
+def _state_name(state):
+    return getattr(state, 'name', state) or ''
+
+
+class UploadCache:
+    """Uchwyty plików przesłanych przez Files API wg skrótu treści, z czasem wygaśnięcia"""
+
+    def __init__(self, cache_file='uploads.json'):
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except Exception as e:
+                print(f"Błąd wczytywania uchwytów plików: {e}")
+
+    def get(self, key):
+        """Aktualny uchwyt lub None, jeśli go nie ma albo zaraz wygaśnie"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry['expires_at'] - EXPIRY_MARGIN <= time.time():
+                del self._entries[key]
+                return None
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            now = time.time()
+            self._entries = {k: e for k, e in self._entries.items() if e['expires_at'] > now}
+            self._entries[key] = entry
+            try:
+                atomic_write_json(self.cache_file, self._entries)
+            except Exception as e:
+                print(f"Błąd zapisywania uchwytów plików: {e}")
+
+
+class FileUploader:
+    """Przesyła załączniki powyżej progu przez client.files.upload i zapamiętuje uchwyty"""
+
+    def __init__(self, blob_store, cache, threshold_bytes, poll_interval=1.0, poll_timeout=120):
+        self.blob_store = blob_store
+        self.cache = cache
+        self.threshold_bytes = threshold_bytes
+        self.poll_interval = poll_interval
+        self.poll_timeout = poll_timeout
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def should_upload(self, ref):
+        return bool(self.threshold_bytes) and ref['size'] >= self.threshold_bytes
+
+    def _lock_for(self, key):
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get_handle(self, client, api_key, ref):
+        """Uchwyt pliku (uri, mime_type) - z pamięci podręcznej lub po przesłaniu"""
+        key = f"{key_fingerprint(api_key)}:{ref['sha256']}"
+        # Ten sam plik wysyłany równolegle z kilku czatów jest przesyłany raz
+        with self._lock_for(key):
+            entry = self.cache.get(key)
+            if entry is None:
+                entry = self._upload(client, ref)
+                self.cache.put(key, entry)
+        return entry
+
+    def _upload(self, client, ref):
+        uploaded = client.files.upload(
+            file=self.blob_store.blob_path(ref['sha256']),
+            config={'mime_type': ref['mime_type'], 'display_name': ref['name']}
+        )
+
+        deadline = time.time() + self.poll_timeout
+        while _state_name(uploaded.state) == 'PROCESSING':
+            if time.time() > deadline:
+                raise TimeoutError(f"Plik {ref['name']} nie został przetworzony przez Files API")
+            time.sleep(self.poll_interval)
+            uploaded = client.files.get(name=uploaded.name)
+        if _state_name(uploaded.state) == 'FAILED':
+            raise RuntimeError(f"Files API odrzuciło plik {ref['name']}")
+
+        expires = uploaded.expiration_time or datetime.now(timezone.utc) + DEFAULT_LIFETIME
+        return {
+            'name': uploaded.name,
+            'uri': uploaded.uri,
+            'mime_type': uploaded.mime_type or ref['mime_type'],
+            'expires_at': expires.timestamp(),
+        }
@@ -0,0 +1,72 @@
+# generation.py
+# Parametry generowania wspólne dla GUI i trybu wsadowego
+# (google.genai importowane przy pierwszym użyciu - nie spowalnia startu aplikacji)
+
+from functools import lru_cache
+
+HARM_CATEGORIES = (
+    'HARM_CATEGORY_HARASSMENT',
+    'HARM_CATEGORY_HATE_SPEECH',
+    'HARM_CATEGORY_SEXUALLY_EXPLICIT',
+    'HARM_CATEGORY_DANGEROUS_CONTENT',
+    'HARM_CATEGORY_CIVIC_INTEGRITY',
+)
+
+
+def get_safety_settings(enable_safety_filters):
+    """Ustawienia bezpieczeństwa dla wszystkich kategorii (BLOCK_NONE lub BLOCK_MEDIUM_AND_ABOVE)"""
+    return list(_safety_settings(bool(enable_safety_filters)))
+
+
+@lru_cache(maxsize=2)
+def _safety_settings(enable_safety_filters):
+    # Obiekty SafetySetting tworzone raz dla każdego wariantu i współdzielone
+    from google.genai import types
+
+    if enable_safety_filters:
+        threshold = types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE
+    else:
+        threshold = types.HarmBlockThreshold.BLOCK_NONE
+    return tuple(
+        types.SafetySetting(category=getattr(types.HarmCategory, category), threshold=threshold)
+        for category in HARM_CATEGORIES
+    )
+
+
+def with_cached_content(generate_config, cached_content):
+    """Kopia konfiguracji korzystająca z pamięci kontekstu API
+
+    Instrukcja systemowa jest już zapisana we wpisie cached_content - API nie
+    przyjmuje jej drugi raz w tym samym zapytaniu.
+    """
+    return generate_config.model_copy(update={'cached_content': cached_content, 'system_instruction': None})
+
+
+def generate_config_key(config):
+    """Ustawienia aplikacji, od których zależy GenerateContentConfig"""
+    return (
+        config.temperature,
+        config.top_p,
+        config.top_k,
+        config.max_tokens,
+        bool(config.enable_safety_filters),
+        config.system_instruction,
+    )
+
+
+def build_generate_config(config):
+    """GenerateContentConfig z ustawień aplikacji (Config)"""
+    from google.genai import types
+
+    generate_config = types.GenerateContentConfig(
+        temperature=config.temperature,
+        top_p=config.top_p,
+        top_k=config.top_k,
+        max_output_tokens=config.max_tokens,
+        safety_settings=get_safety_settings(config.enable_safety_filters),
+    )
+
+    if config.system_instruction:
+        generate_config.system_instruction = config.system_instruction
+
+    return generate_config
@@ -0,0 +1,145 @@
+# image_preprocess.py
+# Zmniejszanie obrazów przed wysłaniem do modelu (Pillow, pula procesów)
+
+import io
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from storage import atomic_write_json
+
+
+def process_image_file(path, max_dimension, quality):
+    """Zmniejsz obraz do max_dimension, przekoduj i usuń metadane (EXIF, profile, komentarze)
+
+    Zwraca (bajty, mime_type) albo None, gdy przetwarzanie nic nie daje
+    (animacja lub wynik nie mniejszy od oryginału bez zmiany rozmiaru).
+    Funkcja modułowa, żeby dało się ją wykonać w ProcessPoolExecutor.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as img:
+        if getattr(img, 'is_animated', False):
+            return None
+        original_size = img.size
+        # Orientacja z EXIF zostaje zastosowana do pikseli, bo EXIF nie trafi do wyniku
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+        has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+        output = io.BytesIO()
+        if has_alpha:
+            img.convert('RGBA').save(output, format='PNG', optimize=True)
+            mime_type = 'image/png'
+        else:
+            img.convert('RGB').save(output, format='JPEG', quality=quality, optimize=True)
+            mime_type = 'image/jpeg'
+
+    data = output.getvalue()
+    if img.size == original_size and len(data) >= os.path.getsize(path):
+        return None
+    return data, mime_type
+
+
+class ImagePreprocessor:
+    """Przetwarza obrazy z BlobStore w puli procesów i pamięta wyniki
+
+    Wynik jest zapisywany jako osobny blob; mapowanie (skrót źródła, ustawienia)
+    -> referencja wyniku trafia do `processed.json` w katalogu magazynu, więc
+    ten sam obraz nie jest przetwarzany ponownie także po restarcie.
+    """
+
+    def __init__(self, blob_store, max_dimension=1536, quality=85, max_workers=None):
+        self.blob_store = blob_store
+        self.max_dimension = max_dimension
+        self.quality = quality
+        self.max_workers = max_workers
+        self.mapping_file = os.path.join(blob_store.root, 'processed.json')
+        self._executor = None
+        self._lock = threading.Lock()
+        self._mapping = {}
+        if os.path.exists(self.mapping_file):
+            try:
+                with open(self.mapping_file, 'r', encoding='utf-8') as f:
+                    self._mapping = json.load(f)
+            except Exception as e:
+                print(f"Błąd wczytywania mapy przetworzonych obrazów: {e}")
+
+    @property
+    def enabled(self):
+        return bool(self.max_dimension)
+
+    def _key(self, ref):
+        return f"{ref['sha256']}:{self.max_dimension}:{self.quality}"
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    def _cached(self, ref):
+        with self._lock:
+            processed = self._mapping.get(self._key(ref))
+        if processed is None:
+            return None
+        # False oznacza, że oryginał jest najlepszą wersją
+        if processed is False:
+            return ref
+        return processed if self.blob_store.exists(processed) else None
+
+    def process_many(self, refs):
+        """Przetwórz obrazy równolegle; zwraca listę referencji do wysłania (w tej samej kolejności)"""
+        results = list(refs)
+        if not self.enabled:
+            return results
+
+        pending = {}
+        for i, ref in enumerate(refs):
+            if not ref['mime_type'].startswith('image/'):
+                continue
+            cached = self._cached(ref)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending[i] = ref
+        if not pending:
+            return results
+
+        executor = self._get_executor()
+        futures = {
+            i: executor.submit(process_image_file, self.blob_store.blob_path(ref['sha256']), self.max_dimension, self.quality)
+            for i, ref in pending.items()
+        }
+        for i, future in futures.items():
+            ref = pending[i]
+            try:
+                output = future.result()
+            except Exception as e:
+                print(f"Błąd przetwarzania obrazu {ref['name']}: {e}")
+                continue
+            if output is None:
+                processed = False
+            else:
+                data, mime_type = output
+                processed = self.blob_store.add_bytes(data, ref['name'], mime_type)
+                results[i] = processed
+            with self._lock:
+                self._mapping[self._key(ref)] = processed
+
+        with self._lock:
+            try:
+                atomic_write_json(self.mapping_file, self._mapping)
+            except Exception as e:
+                print(f"Błąd zapisywania mapy przetworzonych obrazów: {e}")
+        return results
+
+    def process(self, ref):
+        return self.process_many([ref])[0]
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -4,18 +4,50 @@
 # 3. Cała reszta kodu pozostaje bez zmian (100% kompatybilność)
 # 4. FreeSimpleGUI jest darmowe i nie wymaga specjalnej instalacji
 
+import sys
+
+# Tryby bez okna startują przed importem FreeSimpleGUI, więc nie wymagają biblioteki GUI
+if __name__ == '__main__' and '--batch' in sys.argv[1:]:
+    from batch import main as batch_main
+    sys.exit(batch_main(sys.argv[1:]))
+if __name__ == '__main__' and '--serve' in sys.argv[1:]:
+    from server import main as serve_main
+    sys.exit(serve_main(sys.argv[1:]))
+
 import FreeSimpleGUI as sg
 import os
 import json
+import threading
+import time
 from pathlib import Path
 from datetime import datetime
-from google import genai
-from google.genai import types
-from PIL import Image
-import io
 
+from archive import ChatArchive
+from attachment_index import CHUNK_CHARS, AttachmentIndex, decode_text
+from blob_store import BlobStore, PreparedPartCache, is_image
 from chat_manager import ChatManager
 from config import Config
+from file_uploads import FileUploader, UploadCache
+from client_pool import ClientManager
+from context_cache import ContextCache
+from generation import get_safety_settings, with_cached_content
+from image_preprocess import ImagePreprocessor
+from messages import attachment_digests
+from metrics import Metrics, MetricsExporter, record_usage
+from context import build_history
+from renderer import ChatRenderer, MultilineView, format_header
+from search_index import SearchIndex
+from sidebar import ChatListView
+from resilience import PartialResponseError, RateLimiter, RequestExecutor, error_status
+from response_cache import ResponseCache, cache_enabled, request_key
+from storage import create_storage
+from tokens import (
+    TokenBudgetExceeded, count_tokens, estimate_attachment_tokens, estimate_message_tokens, estimate_tokens,
+    input_token_limit
+)
+from workers import (
+    REQUEST_CANCELLED, REQUEST_CHUNK, REQUEST_DONE, REQUEST_ERROR, REQUEST_STARTED, RequestCancelled, RequestWorker
+)
 
 # Nowoczesny motyw
 sg.theme('DarkGrey13')
@@ -27,92 +59,144 @@ BUTTON_COLOR = ('#ffffff', '#0d7377')
 TEXT_COLOR = '#e0e0e0'
 ACCENT_COLOR = '#0d7377'
 
+CHATS_LOADED = '-CHATS_LOADED-'
+# Zdarzenia wymagające wczytanej listy czatów
+CHAT_EVENTS = ('-NEW_CHAT-', '-CHAT_LIST-', '-DELETE_CHAT-', '-SEND-', '-LOAD_OLDER-', '-SEARCH-')
+
+def is_document(ref, inline_bytes):
+    """Załącznik tekstowy za duży, by wstawić go w całości (przeszukiwany we fragmentach)"""
+    return isinstance(ref, dict) and not is_image(ref) and ref['size'] > inline_bytes
+
+
+def user_content(content_parts):
+    """Fragmenty zapytania (tekst lub Part) jako types.Content wiadomości użytkownika"""
+    from google.genai import types
+    
+    return types.Content(
+        role='user',
+        parts=[types.Part.from_text(text=part) if isinstance(part, str) else part for part in content_parts]
+    )
+
+
 class GeminiChatApp:
     def __init__(self):
         self.config = Config()
-        self.chat_manager = ChatManager()
+        # Czasy zapytań, zapisu i renderowania (pasek stanu, eksport metrics_export)
+        self.metrics = Metrics()
+        self.metrics_exporter = None
+        # Czaty wczytywane są w tle po pokazaniu okna (load_chats_in_background)
+        # Zmiany zapisywane w tle seriami, więc fsync obejmuje wiele wiadomości naraz
+        self.chat_manager = ChatManager(
+            storage=create_storage(self.config.storage_backend, fsync=self.config.save_interval_s > 0),
+            autoload=False,
+            search_index=SearchIndex(),
+            save_interval=self.config.save_interval_s,
+            metrics=self.metrics,
+            # Nieaktywne czaty w skompresowanym archiwum - krótszy start przy długiej historii
+            archive=ChatArchive(codec=self.config.archive_codec),
+            archive_after_days=self.config.archive_after_days
+        )
+        self.chats_loaded = False
         self.current_chat_id = None
-        self.client = None
-        self.chat_session = None
-        
-        if self.config.api_key:
-            self.client = genai.Client(api_key=self.config.api_key)
+        # Klient API (tworzony przy pierwszym wysłaniu), konfiguracje generowania i sesje czatów
+        self.clients = ClientManager(self.create_client, self.config, self.config.session_cache_size)
+        self.sessions = self.clients.sessions
+        self.worker = None
+        self.streaming = {}  # chat_id -> fragmenty odpowiedzi w trakcie strumieniowania
+        # Pliki z historii i przypięte nie są usuwane przy przekroczeniu limitu magazynu
+        self.blob_store = BlobStore(max_bytes=self.config.attachment_store_mb * 1024 * 1024, referenced=self.referenced_blobs)
+        self.part_cache = PreparedPartCache()
+        # Duże załączniki tekstowe - do zapytania trafiają tylko fragmenty pasujące do wiadomości
+        self.attachment_index = AttachmentIndex(self.blob_store, metrics=self.metrics)
+        self.documents = {}  # chat_id -> {sha256: referencja} dużych załączników tekstowych czatu
+        self.preprocessor = ImagePreprocessor(
+            self.blob_store,
+            max_dimension=self.config.image_max_dimension,
+            quality=self.config.image_quality
+        )
+        self.uploader = FileUploader(
+            self.blob_store,
+            UploadCache(),
+            int(self.config.upload_threshold_mb * 1024 * 1024)
+        )
+        self.executor = RequestExecutor(
+            RateLimiter(self.config.requests_per_minute),
+            metrics=self.metrics,
+            max_retries=self.config.max_retries,
+            hedge_after=self.config.hedge_after_s
+        )
+        self.response_cache = ResponseCache(
+            max_entries=self.config.response_cache_size,
+            ttl=self.config.response_cache_ttl_s,
+            metrics=self.metrics,
+            max_disk_bytes=int(self.config.response_cache_disk_mb * 1024 * 1024)
+        )
+        # Stały początek zapytań (instrukcja systemowa, przypięte pliki) w pamięci kontekstu API
+        self.context_cache = ContextCache(
+            ttl=self.config.context_cache_ttl_s,
+            min_tokens=self.config.context_cache_min_tokens,
+            metrics=self.metrics
+        )
+        self.pinned_refs = {}  # (ścieżka, mtime, rozmiar) -> referencja przypiętego pliku w BlobStore
+        self.renderer = ChatRenderer(self.chat_manager, window_size=self.config.history_window)
+        self.history_view = None
+        self.chat_list = None
+    
+    def create_client(self):
+        """Utwórz klienta API (do podmiany np. na fake_client.FakeClient w testach)"""
+        from google import genai
+        return genai.Client(api_key=self.config.api_key)
+    
+    def get_client(self):
+        """Klient API tworzony przy pierwszym wysłaniu - import SDK nie opóźnia startu"""
+        return self.clients.client(self.config.api_key)
+    
+    def load_chats_in_background(self, window):
+        """Wczytaj czaty po pokazaniu okna (w osobnym wątku)"""
+        self.chat_manager.load_chats()
+        window.write_event_value(CHATS_LOADED, None)
     
     def get_safety_settings(self):
-        if not self.config.enable_safety_filters:
-            return [
-                types.SafetySetting(
-                    category=types.HarmCategory.HARM_CATEGORY_HARASSMENT,
-                    threshold=types.HarmBlockThreshold.BLOCK_NONE,
-                ),
-                types.SafetySetting(
-                    category=types.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
-                    threshold=types.HarmBlockThreshold.BLOCK_NONE,
-                ),
-                types.SafetySetting(
-                    category=types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
-                    threshold=types.HarmBlockThreshold.BLOCK_NONE,
-                ),
-                types.SafetySetting(
-                    category=types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
-                    threshold=types.HarmBlockThreshold.BLOCK_NONE,
-                ),
-                types.SafetySetting(
-                    category=types.HarmCategory.HARM_CATEGORY_CIVIC_INTEGRITY,
-                    threshold=types.HarmBlockThreshold.BLOCK_NONE,
-                ),
-            ]
-        else:
-            return [
-                types.SafetySetting(
-                    category=types.HarmCategory.HARM_CATEGORY_HARASSMENT,
-                    threshold=types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                ),
-                types.SafetySetting(
-                    category=types.HarmCategory.HARM_CATEGORY_HATE_SPEECH,
-                    threshold=types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                ),
-                types.SafetySetting(
-                    category=types.HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT,
-                    threshold=types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                ),
-                types.SafetySetting(
-                    category=types.HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT,
-                    threshold=types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                ),
-                types.SafetySetting(
-                    category=types.HarmCategory.HARM_CATEGORY_CIVIC_INTEGRITY,
-                    threshold=types.HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
-                ),
-            ]
-        
-    def create_chat_session(self):
-        if not self.client:
+        return get_safety_settings(self.config.enable_safety_filters)
+        
+    def create_chat_session(self, history=None):
+        client = self.get_client()
+        if not client:
             return None
         
         try:
-            config = types.GenerateContentConfig(
-                temperature=self.config.temperature,
-                top_p=self.config.top_p,
-                top_k=self.config.top_k,
-                max_output_tokens=self.config.max_tokens,
-                safety_settings=self.get_safety_settings(),
-            )
-            
-            if self.config.system_instruction:
-                config.system_instruction = self.config.system_instruction
-            
-            self.chat_session = self.client.chats.create(
-                model=self.config.model_name,
-                config=config
-            )
-            
-            return self.chat_session
+            with self.metrics.timer('session_create'):
+                return client.chats.create(
+                    model=self.config.model_name,
+                    config=self.clients.generate_config(self.config),
+                    history=history
+                )
             
         except Exception as e:
             sg.popup_error(f"Błąd tworzenia sesji: {str(e)}", title="Błąd")
             return None
     
+    def get_chat_session(self, chat_id, max_history_tokens=None):
+        """Sesja czatu z pamięci podręcznej lub nowa, z kontekstem odtworzonym z zapisanej historii
+
+        Jeśli historia sesji przekroczyła max_history_tokens, sesja jest odtwarzana
+        od nowa z krótszym oknem najnowszych wiadomości.
+        """
+        budget = self.config.context_budget_tokens
+        if max_history_tokens is not None:
+            budget = min(budget, max_history_tokens)
+        
+        session = self.sessions.get(chat_id)
+        if session is not None and self.sessions.tokens(chat_id) > budget:
+            session = None
+        
+        if session is None:
+            history, tokens = build_history(self.chat_manager.iter_messages_reversed(chat_id), budget)
+            session = self.create_chat_session(history)
+            if session:
+                self.sessions.put(chat_id, session, tokens)
+        return session
+    
     def create_layout(self):
         """Utwórz pełen responsive layout"""
         
@@ -121,12 +205,15 @@ class GeminiChatApp:
             # Header
             [sg.Text('Gemini Chat', font=('Segoe UI', 18, 'bold'), text_color=ACCENT_COLOR, pad=(15, 15)),
              sg.Push(),
-             sg.Text('', key='-CHAT_NAME-', font=('Segoe UI', 12), text_color=TEXT_COLOR, pad=(15, 15))],
+             sg.Text('', key='-CHAT_NAME-', font=('Segoe UI', 12), text_color=TEXT_COLOR, pad=(15, 15)),
+             sg.Button('▲ Starsze', key='-LOAD_OLDER-', button_color=('#ffffff', '#6c757d'), font=('Segoe UI', 9), pad=(15, 15))],
             
             # Główna zawartość - horizontal layout
             [sg.Column([
                 # Sidebar z czatami
                 [sg.Text('Twoje czaty', font=('Segoe UI', 11, 'bold'), pad=(10, 10))],
+                [sg.Input(key='-SEARCH_QUERY-', size=(22, 1), font=('Segoe UI', 10), background_color=INPUT_BG, text_color=TEXT_COLOR, pad=(10, 5)),
+                 sg.Button('🔍', key='-SEARCH-', button_color=('#ffffff', '#6c757d'), font=('Segoe UI', 9), pad=(5, 5))],
                 [sg.Listbox(
                     values=self.chat_manager.get_chat_list(),
                     size=(30, 20),
@@ -179,6 +266,7 @@ class GeminiChatApp:
                 
                 [sg.Button('📎 Załącz', key='-ATTACH-', button_color=('#ffffff', '#6c757d'), font=('Segoe UI', 9), pad=(10, 10)),
                  sg.Push(),
+                 sg.Button('■ Anuluj', key='-CANCEL-', size=(10, 1), button_color=('#ffffff', '#6c757d'), font=('Segoe UI', 10), pad=(5, 10)),
                  sg.Button('➤ Wyślij', key='-SEND-', size=(15, 1), button_color=BUTTON_COLOR, font=('Segoe UI', 10, 'bold'), pad=(10, 10))]
                 
             ], vertical_alignment='top', background_color=BG_COLOR, pad=(10, 10), expand_x=True, expand_y=True)]
@@ -281,6 +369,16 @@ class GeminiChatApp:
                     )]
                 ], font=('Segoe UI', 10), pad=(10, 10), expand_x=True)],
                 
+                [sg.Frame('Odpowiedzi', [
+                    [sg.Checkbox(
+                        'Strumieniuj odpowiedzi (wyświetlaj w trakcie generowania)',
+                        default=self.config.stream_responses,
+                        key='-STREAM_RESPONSES-',
+                        font=('Segoe UI', 9),
+                        pad=(10, 10)
+                    )]
+                ], font=('Segoe UI', 10), pad=(10, 10), expand_x=True)],
+                
                 [sg.Frame('Instrukcje systemowe', [
                     [sg.Multiline(
                         self.config.system_instruction,
@@ -320,97 +418,476 @@ class GeminiChatApp:
         
         return layout
     
-    def update_chat_display(self, window):
-        if self.current_chat_id:
-            chat = self.chat_manager.get_chat(self.current_chat_id)
-            if chat:
+    def show_search_results(self, query):
+        """Okno z wynikami wyszukiwania; zwraca wybrany wynik lub None"""
+        hits = self.chat_manager.search(query, limit=50)
+        if not hits:
+            sg.popup(f'Brak wyników dla: {query}', font=('Segoe UI', 10), title='Wyszukiwanie')
+            return None
+        
+        rows = [f"{self.chat_manager.chats[hit['chat_id']]['name']} #{hit['offset'] + 1}: {hit['snippet']}" for hit in hits]
+        layout = [
+            [sg.Listbox(rows, size=(100, 20), key='-HITS-', enable_events=True, font=('Segoe UI', 10),
+                        background_color=INPUT_BG, text_color=TEXT_COLOR, highlight_background_color=ACCENT_COLOR)],
+            [sg.Push(), sg.Button('Zamknij', button_color=('#ffffff', '#6c757d'), font=('Segoe UI', 9))]
+        ]
+        popup = sg.Window(f'Wyniki: {query}', layout, modal=True, finalize=True, background_color=BG_COLOR)
+        selected = None
+        while True:
+            event, values = popup.read()
+            if event in (sg.WIN_CLOSED, 'Zamknij'):
+                break
+            if event == '-HITS-' and values['-HITS-']:
+                selected = hits[rows.index(values['-HITS-'][0])]
+                break
+        popup.close()
+        return selected
+    
+    def open_search_hit(self, window, hit):
+        """Otwórz czat z wyniku wyszukiwania, od znalezionej wiadomości"""
+        self.current_chat_id = hit['chat_id']
+        window['-CHAT_NAME-'].update(f"💬 {self.chat_manager.chats[hit['chat_id']]['name']}")
+        self.renderer.render(self.history_view, hit['chat_id'], first_index=hit['offset'])
+        self.restore_partial_response()
+        self.history_view.scroll_to_top()
+        self.update_status_bar(window)
+    
+    def update_chat_display(self, window, full=False):
+        """Odśwież historię czatu - przyrostowo, a po przełączeniu czatu od nowa"""
+        if not self.current_chat_id:
+            return
+        chat = self.chat_manager.chats.get(self.current_chat_id)
+        if not chat:
+            return
+        
+        with self.metrics.timer('render'):
+            if full or self.renderer.chat_id != self.current_chat_id:
                 window['-CHAT_NAME-'].update(f"💬 {chat['name']}")
-                
-                history_text = ""
-                for msg in chat['messages']:
-                    role = "[TY]" if msg['role'] == 'user' else "[GEMINI]"
-                    timestamp = datetime.fromisoformat(msg['timestamp']).strftime('%H:%M')
-                    
-                    attachments = ""
-                    if 'attachments' in msg and msg['attachments']:
-                        attachments = f" 📎({len(msg['attachments'])})"
-                    
-                    history_text += f"{timestamp} {role}{attachments}\n{msg['content']}\n\n{'='*80}\n\n"
-                
-                window['-CHAT_HISTORY-'].update(history_text)
+                self.renderer.render(self.history_view, self.current_chat_id)
+                self.restore_partial_response()
+            else:
+                self.renderer.sync(self.history_view, self.current_chat_id)
+    
+    def restore_partial_response(self):
+        """Po pełnym renderowaniu dopisz odpowiedź, która wciąż jest strumieniowana"""
+        streamed = self.streaming.get(self.current_chat_id)
+        if streamed and streamed['chunks']:
+            self.renderer.append_partial(
+                self.history_view,
+                format_header(streamed['time'], 'model') + ''.join(streamed['chunks'])
+            )
     
     def update_status_bar(self, window, message=None):
         if message:
             window['-STATUS-'].update(message)
         else:
-            window['-STATUS-'].update(
-                f'Model: {self.config.model_name} | Filtry: {"Włączone" if self.config.enable_safety_filters else "Wyłączone"}'
-            )
+            status = f'Model: {self.config.model_name} | Filtry: {"Włączone" if self.config.enable_safety_filters else "Wyłączone"}'
+            if self.current_chat_id:
+                status += f' | Tokeny czatu: ~{self.chat_manager.get_token_count(self.current_chat_id)}'
+            metrics = self.metrics
+            p50, p99 = metrics.percentile('latency', 50), metrics.percentile('latency', 99)
+            if p50 is not None:
+                status += f' | Czas odpowiedzi p50/p99: {p50:.1f}/{p99:.1f} s'
+            ttfb = metrics.percentile('ttfb', 50)
+            if ttfb is not None:
+                status += f' | Pierwszy fragment p50: {ttfb:.1f} s'
+            if metrics.counter('prompt_tokens'):
+                status += f' | Tokeny API (wej./wyj.): {metrics.counter("prompt_tokens")}/{metrics.counter("response_tokens")}'
+            render, disk = metrics.percentile('render', 99), metrics.percentile('disk_write', 99)
+            if render is not None:
+                status += f' | Render p99: {render * 1000:.0f} ms'
+            if disk is not None:
+                status += f' | Zapis p99: {disk * 1000:.0f} ms'
+            if metrics.counter('retries'):
+                status += f' | Ponowienia: {metrics.counter("retries")}'
+            if self.chat_manager.write_error:
+                # Niezapisane zmiany czekają w kolejce na ponowienie
+                status += f' | ⚠️ {self.chat_manager.write_error}'
+            window['-STATUS-'].update(status)
     
     def send_message(self, window, message, attachments=None):
+        """Dodaj zapytanie do kolejki czatu - odpowiedź przyjdzie jako zdarzenie REQUEST_*"""
         if not message.strip() and not attachments:
             return
         
-        if not self.client:
+        if not self.get_client():
             sg.popup_error("Skonfiguruj API Key w zakładce Ustawienia!", title="Błąd")
             return
         
-        self.chat_manager.add_message(self.current_chat_id, 'user', message, attachments)
-        self.update_chat_display(window)
+        # Budżet kontekstu modelu - sprawdzany lokalnie przed wysłaniem
+        inline_bytes = self.config.attachment_inline_kb * 1024
+        retrieval_bytes = self.config.retrieval_top_k * CHUNK_CHARS
+        message_tokens = estimate_message_tokens(
+            message, attachments, max(inline_bytes, retrieval_bytes) if inline_bytes else None
+        )
+        if self.documents.get(self.current_chat_id):
+            message_tokens += retrieval_bytes // 4
+        token_limit = input_token_limit(self.config.model_name)
+        if message_tokens > token_limit:
+            sg.popup_error(
+                f"Wiadomość (~{message_tokens} tokenów) przekracza limit modelu {self.config.model_name} ({token_limit} tokenów).",
+                title="Za długa wiadomość"
+            )
+            return
+        
+        chat_session = self.get_chat_session(self.current_chat_id, token_limit - message_tokens)
+        if not chat_session:
+            return
+        
         window['-MESSAGE-'].update('')
         window['-ATTACHED_FILES-'].update('')
-        self.update_status_bar(window, 'Wysyłanie...')
-        window.refresh()
         
+        self.worker.submit(
+            self.current_chat_id,
+            self.generate_response,
+            chat_session,
+            message,
+            self.config.stream_responses,
+            data={
+                'message': message,
+                'attachments': attachments,
+                'tokens': message_tokens,
+                'token_limit': token_limit if self.config.exact_token_count else None,
+                'client': self.get_client(),
+                'api_key': self.config.api_key,
+                'model_name': self.config.model_name,
+                'generate_config': self.clients.generate_config(self.config),
+                'use_cache': cache_enabled(self.config.response_cache_mode, self.config.temperature),
+                'inline_bytes': inline_bytes,
+                'retrieval_top_k': self.config.retrieval_top_k,
+                'context_cache': self.config.context_cache,
+                'system_instruction': self.config.system_instruction,
+                'pinned_files': list(self.config.context_cache_files),
+                'submitted': time.perf_counter(),
+            },
+            prepare=self.prepare_attachments
+        )
+        
+        queued = self.worker.pending_count(self.current_chat_id) - 1
+        self.update_status_bar(window, f'Wysyłanie... (w kolejce: {queued})' if queued else 'Wysyłanie...')
+    
+    def referenced_blobs(self):
+        """Skróty załączników używanych w historii i przypiętych plików (None przed wczytaniem czatów)"""
+        if not self.chats_loaded:
+            return None
+        return self.chat_manager.referenced_blobs() | {ref['sha256'] for ref in list(self.pinned_refs.values())}
+    
+    def prepare_attachments(self, task):
+        """Dodaj załączniki do magazynu (w wątku roboczym) - wiadomość zapisze referencje zamiast ścieżek"""
+        refs = []
+        for attachment in task.data['attachments'] or ():
+            if isinstance(attachment, dict):
+                refs.append(attachment)
+                continue
+            try:
+                refs.append(self.blob_store.add(attachment))
+            except Exception as e:
+                print(f"Błąd pliku {attachment}: {e}")
+        task.data['attachments'] = refs or None
+    
+    def build_content_parts(self, message, attachments=None, client=None, api_key=None, documents=None, top_k=8):
+        """Przygotuj treść zapytania: załączniki (referencje z BlobStore) + wiadomość
+
+        Załączniki powyżej progu upload_threshold_mb są przesyłane przez Files API
+        (jeśli podano klienta) i wstawiane jako odwołanie do pliku zamiast bajtów.
+        Obrazy są wcześniej zmniejszane (równolegle, w puli procesów).
+        documents - duże pliki tekstowe czatu: zamiast całych plików wstawiane jest
+        top_k fragmentów najlepiej pasujących do wiadomości.
+        """
+        content_parts = []
+        
+        available = []
+        for ref in attachments or ():
+            if self.blob_store.exists(ref):
+                available.append(ref)
+            else:
+                # Plik usunięty z magazynu - zapytanie i odtworzenie historii działają dalej
+                print(f"Brak pliku {ref['name']} w magazynie załączników")
+                content_parts.append(f"[Plik niedostępny: {ref['name']}]")
+        
+        for ref in self.preprocessor.process_many(available):
+            if documents is not None and ref['sha256'] in documents:
+                continue
+            if client is not None and self.uploader.should_upload(ref):
+                try:
+                    content_parts.extend(self.make_uploaded_parts(client, api_key, ref))
+                    continue
+                except Exception as e:
+                    print(f"Błąd przesyłania pliku {ref['name']} przez Files API, wysyłam w treści: {e}")
+            try:
+                content_parts.append(self.part_cache.get_or_create(
+                    (ref['sha256'], ref['name']),
+                    ref['size'],
+                    lambda: self.make_attachment_part(ref)
+                ))
+            except Exception as e:
+                print(f"Błąd pliku {ref['name']}: {e}")
+        
+        if documents:
+            retrieved = self.make_retrieval_part(list(documents.values()), message, top_k)
+            if retrieved:
+                content_parts.append(retrieved)
+        
+        if message.strip():
+            content_parts.append(message)
+        
+        return content_parts
+    
+    def make_retrieval_part(self, documents, message, top_k):
+        """Fragmenty dużych plików tekstowych dopasowane do wiadomości (indeks budowany raz na plik)"""
         try:
-            if not self.chat_session:
-                self.chat_session = self.create_chat_session()
-                if not self.chat_session:
-                    return
-            
-            content_parts = []
-            
-            if attachments:
-                for file_path in attachments:
-                    try:
-                        with open(file_path, 'rb') as f:
-                            file_data = f.read()
-                        
-                        ext = os.path.splitext(file_path)[1].lower()
-                        mime_types = {
-                            '.png': 'image/png',
-                            '.jpg': 'image/jpeg',
-                            '.jpeg': 'image/jpeg',
-                            '.gif': 'image/gif',
-                            '.bmp': 'image/bmp'
-                        }
-                        
-                        if ext in mime_types:
-                            part = types.Part.from_bytes(data=file_data, mime_type=mime_types[ext])
-                            content_parts.append(part)
-                        else:
-                            with open(file_path, 'r', encoding='utf-8') as f:
-                                content_parts.append(f"[Plik: {os.path.basename(file_path)}]\n{f.read()}")
-                    except Exception as e:
-                        print(f"Błąd pliku {file_path}: {e}")
-            
-            if message.strip():
-                content_parts.append(message)
-            
-            response = self.chat_session.send_message(content_parts)
+            hits = self.attachment_index.search(documents, message, top_k)
+        except Exception as e:
+            print(f"Błąd wyszukiwania w załącznikach: {e}")
+            return None
+        if not hits:
+            return None
+        sections = [f"[Plik: {hit['name']}, linie {hit['first_line']}-{hit['last_line']}]\n{hit['text']}" for hit in hits]
+        return "[Fragmenty załączników pasujące do wiadomości]\n\n" + '\n\n'.join(sections)
+    
+    def chat_documents(self, chat_id, inline_bytes):
+        """Duże załączniki tekstowe z dotychczasowych wiadomości czatu (przeszukiwane przy każdym zapytaniu)"""
+        documents = self.documents.get(chat_id)
+        if documents is None:
+            documents = {}
+            for msg in self.chat_manager.iter_messages_reversed(chat_id):
+                for ref in msg.get('attachments') or ():
+                    if is_document(ref, inline_bytes):
+                        documents.setdefault(ref['sha256'], ref)
+            self.documents[chat_id] = documents
+        return documents
+    
+    def make_attachment_part(self, ref):
+        """Fragment zapytania z załącznika: obraz jako bajty, tekst wstawiony do treści"""
+        with self.blob_store.open(ref) as f:
+            file_data = f.read()
+        
+        if is_image(ref):
+            from google.genai import types
+            return types.Part.from_bytes(data=file_data, mime_type=ref['mime_type'])
+        return f"[Plik: {ref['name']}]\n{decode_text(file_data)}"
+    
+    def make_uploaded_parts(self, client, api_key, ref):
+        """Odwołanie do pliku przesłanego przez Files API (uchwyt używany ponownie do wygaśnięcia)"""
+        from google.genai import types
+        
+        handle = self.uploader.get_handle(client, api_key, ref)
+        part = types.Part.from_uri(file_uri=handle['uri'], mime_type=handle['mime_type'])
+        if is_image(ref):
+            return [part]
+        return [f"[Plik: {ref['name']}]", part]
+    
+    def generate_response(self, task, chat_session, message, stream):
+        """Wykonaj zapytanie do modelu (w wątku roboczym - bez dostępu do okna)"""
+        documents = None
+        inline_bytes = task.data['inline_bytes']
+        if inline_bytes:
+            documents = self.chat_documents(task.chat_id, inline_bytes)
+            for ref in task.data['attachments'] or ():
+                if is_document(ref, inline_bytes):
+                    documents.setdefault(ref['sha256'], ref)
+        content_parts = self.build_content_parts(
+            message, task.data['attachments'], task.data['client'], task.data['api_key'],
+            documents, task.data['retrieval_top_k']
+        )
+        
+        model_name = task.data['model_name']
+        cache_key = None
+        if task.data['use_cache']:
+            # Treść przypiętych plików (pamięć kontekstu) nie występuje w content_parts
+            pinned = self.pinned_references(task.data['pinned_files']) if task.data['context_cache'] else []
+            attachments = {
+                'message': attachment_digests(task.data['attachments']),
+                'documents': sorted(documents or ()),
+                'pinned': [ref['sha256'] for ref in pinned],
+            }
+            cache_key = request_key(
+                model_name, task.data['generate_config'], chat_session.get_history(), content_parts, attachments
+            )
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                task.data['cached'] = True
+                return cached
+        
+        if task.data['token_limit']:
+            self.check_exact_budget(task, chat_session, content_parts)
+        
+        response_text = self.send_to_model(task, chat_session, content_parts, stream)
+        if cache_key is not None:
+            self.response_cache.put(cache_key, response_text)
+        return response_text
+    
+    def send_to_model(self, task, chat_session, content_parts, stream):
+        """Wyślij wiadomość w sesji czatu przez warstwę limitów i ponowień
+
+        Wpis pamięci kontekstu ustalany jest przy każdej próbie - ponowienie po
+        dłuższej przerwie przedłuży lub odtworzy wygasający wpis.
+        """
+        model_name = task.data['model_name']
+        if not stream:
+            task.check_cancelled()
             
-            self.chat_manager.add_message(self.current_chat_id, 'model', response.text)
-            self.update_chat_display(window)
-            self.update_status_bar(window, 'Gotowe!')
+            def send_once(config):
+                start = time.perf_counter()
+                response = chat_session.send_message(content_parts, config=config)
+                self.metrics.observe('ttfb', time.perf_counter() - start)
+                self.record_response_usage(task, response)
+                return response.text or ''
             
+            return self.executor.call(
+                model_name, lambda: self.send_with_prefix(task, send_once), check=task.check_cancelled
+            )
+        
+        def stream_once(config):
+            chunks = []
+            start = time.perf_counter()
+            try:
+                for chunk in chat_session.send_message_stream(content_parts, config=config):
+                    if chunk.text:
+                        if not chunks:
+                            self.metrics.observe('ttfb', time.perf_counter() - start)
+                        chunks.append(chunk.text)
+                        task.emit(chunk.text)
+                    # Pełne usage_metadata przychodzi z ostatnim fragmentem
+                    self.record_response_usage(task, chunk)
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                # Po wyświetleniu fragmentów ponowienie zdublowałoby tekst
+                if chunks:
+                    raise PartialResponseError(str(e)) from e
+                raise
+            return ''.join(chunks)
+        
+        return self.executor.call(
+            model_name, lambda: self.send_with_prefix(task, stream_once), check=task.check_cancelled
+        )
+    
+    def send_with_prefix(self, task, send):
+        """send(config) z pamięcią kontekstu; wpis nieznany już API (403/404) jest zapominany
+        
+        Zapytanie jest wtedy od razu ponawiane raz bez pamięci kontekstu (jak przy
+        krótkim początku), a następne zapytanie utworzy nowy wpis.
+        """
+        config = self.cached_prefix_config(task)
+        try:
+            return send(config)
         except Exception as e:
-            sg.popup_error(f"Błąd: {str(e)}", title="Błąd komunikacji")
-            if self.current_chat_id:
-                chat = self.chat_manager.get_chat(self.current_chat_id)
-                if chat and chat['messages']:
-                    chat['messages'].pop()
-                    self.chat_manager.save_chats()
+            if config is None or error_status(e) not in (403, 404):
+                raise
+            print(f"Pamięć kontekstu wygasła lub została usunięta, ponawiam bez niej: {e}")
+            self.context_cache.invalidate(config.cached_content)
+            self.metrics.incr('context_cache_errors')
+            return send(None)
+    
+    def cached_prefix_config(self, task):
+        """Konfiguracja zapytania z odwołaniem do pamięci kontekstu lub None (ustawienia sesji czatu)
+
+        Stały początek to instrukcja systemowa i pliki z context_cache_files. Gdy
+        jest za krótki albo wpisu nie da się utworzyć, zapytanie idzie jak
+        dotąd - z instrukcją systemową z sesji, ale bez przypiętych plików.
+        """
+        if not task.data['context_cache']:
+            return None
+        client, api_key = task.data['client'], task.data['api_key']
+        system_instruction = task.data['system_instruction']
+        pinned = self.pinned_references(task.data['pinned_files'])
+        estimated = estimate_tokens(system_instruction) + sum(estimate_attachment_tokens(ref) for ref in pinned)
+        name = self.context_cache.get(
+            client, api_key, task.data['model_name'], system_instruction, pinned, estimated,
+            lambda: self.build_cached_contents(pinned, client, api_key)
+        )
+        if name is None:
+            if pinned:
+                print(f"Pamięć kontekstu niedostępna - pominięto przypięte pliki ({len(pinned)})")
+            return None
+        return with_cached_content(task.data['generate_config'], name)
+    
+    def pinned_references(self, paths):
+        """Referencje BlobStore przypiętych plików (dodawane ponownie tylko po zmianie pliku)"""
+        refs = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                key = (path, stat.st_mtime_ns, stat.st_size)
+                ref = self.pinned_refs.get(key)
+                if ref is None:
+                    ref = self.pinned_refs[key] = self.blob_store.add(path)
+                refs.append(ref)
+            except Exception as e:
+                print(f"Błąd przypiętego pliku {path}: {e}")
+        return refs
+    
+    def build_cached_contents(self, pinned, client, api_key):
+        """Treść wpisu pamięci kontekstu: przypięte pliki jako jedna wiadomość użytkownika"""
+        content_parts = self.build_content_parts('', pinned, client, api_key)
+        return [user_content(content_parts)] if content_parts else []
+    
+    def record_response_usage(self, task, response):
+        """Zapamiętaj usage_metadata odpowiedzi (tokeny zliczane po zakończeniu zapytania)"""
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is not None:
+            task.data['usage'] = usage
+    
+    def check_exact_budget(self, task, chat_session, content_parts):
+        """Dokładne zliczenie tokenów całego zapytania przez API (opcja exact_token_count)"""
+        new_content = user_content(content_parts)
+        total = count_tokens(task.data['client'], task.data['model_name'], chat_session.get_history() + [new_content])
+        if total > task.data['token_limit']:
+            raise TokenBudgetExceeded(
+                f"Zapytanie ma {total} tokenów, a limit modelu {task.data['model_name']} to {task.data['token_limit']}"
+            )
+    
+    def on_request_started(self, window, task):
+        """Zapytanie wystartowało - zapisz wiadomość użytkownika (kolejność jak w sesji czatu)"""
+        self.chat_manager.add_message(task.chat_id, 'user', task.data['message'], task.data['attachments'], task.data['tokens'])
+        if task.chat_id == self.current_chat_id:
+            self.update_chat_display(window)
+    
+    def on_request_chunk(self, window, task, text):
+        """Dopisz fragment strumieniowanej odpowiedzi do historii"""
+        streamed = self.streaming.setdefault(task.chat_id, {'time': datetime.now().strftime('%H:%M'), 'chunks': []})
+        if task.chat_id == self.current_chat_id:
+            header = '' if streamed['chunks'] else format_header(streamed['time'], 'model')
+            self.renderer.append_partial(self.history_view, header + text)
+        streamed['chunks'].append(text)
+    
+    def on_request_done(self, window, task, response_text):
+        """Odpowiedź kompletna - zapisz ją jednorazowo w historii"""
+        self.streaming.pop(task.chat_id, None)
+        elapsed = time.perf_counter() - task.data['submitted']
+        self.metrics.observe('request_total', elapsed)
+        usage = record_usage(self.metrics, task.data.get('usage'))
+        response_tokens = usage[1] if usage and usage[1] else estimate_tokens(response_text)
+        self.chat_manager.add_message(task.chat_id, 'model', response_text, tokens=response_tokens)
+        if task.data.get('cached'):
+            # Sesja nie zna odpowiedzi z pamięci podręcznej - zostanie odtworzona z zapisanej historii
+            self.sessions.discard(task.chat_id)
+        else:
+            self.sessions.add_tokens(task.chat_id, task.data['tokens'] + response_tokens)
+        if task.chat_id == self.current_chat_id:
+            # Częściowa odpowiedź zostaje zastąpiona blokiem zapisanej wiadomości
+            self.update_chat_display(window)
+        if self.worker.pending_count():
             self.update_status_bar(window)
+        else:
+            self.update_status_bar(window, 'Gotowe! (z pamięci podręcznej)' if task.data.get('cached') else f'Gotowe! ({elapsed:.1f} s)')
+    
+    def on_request_failed(self, window, task, error=None):
+        """Błąd lub anulowanie - wycofaj wiadomość użytkownika i częściową odpowiedź"""
+        self.streaming.pop(task.chat_id, None)
+        if task.started:
+            self.chat_manager.pop_message(task.chat_id)
+        # Sesja mogła zapamiętać wycofaną wymianę (anulowanie, przerwany strumień) - zostanie odtworzona z historii
+        self.sessions.discard(task.chat_id)
+        if task.chat_id == self.current_chat_id:
+            self.update_chat_display(window)
+        
+        if error is not None:
+            sg.popup_error(f"Błąd: {str(error)}", title="Błąd komunikacji")
+            self.update_status_bar(window)
+        else:
+            self.update_status_bar(window, 'Anulowano')
     
     def run(self):
         window = sg.Window(
@@ -424,96 +901,161 @@ class GeminiChatApp:
             margins=(0, 0)
         )
         
+        self.worker = RequestWorker(window.write_event_value)
+        self.history_view = MultilineView(window['-CHAT_HISTORY-'])
+        self.chat_list = ChatListView(window['-CHAT_LIST-'], self.chat_manager)
         attached_files = []
+        self.update_status_bar(window, 'Wczytywanie czatów...')
+        threading.Thread(target=self.load_chats_in_background, args=(window,), daemon=True).start()
+        if self.config.metrics_export:
+            self.metrics_exporter = MetricsExporter(
+                self.metrics, self.config.metrics_file, self.config.metrics_export, self.config.metrics_interval_s
+            )
+            self.metrics_exporter.start()
         
-        while True:
-            event, values = window.read()
+        try:
+            while True:
+                event, values = window.read()
             
-            if event == sg.WIN_CLOSED:
-                break
+                if event == sg.WIN_CLOSED:
+                    break
+            
+                elif event == CHATS_LOADED:
+                    self.chats_loaded = True
+                    self.chat_list.reload()
+                    # Od teraz lista jest poprawiana punktowo przy każdej zmianie kolejności czatów
+                    self.chat_manager.order_listener = self.chat_list.apply
+                    self.update_status_bar(window)
+            
+                elif event in CHAT_EVENTS and not self.chats_loaded:
+                    self.update_status_bar(window, 'Wczytywanie czatów...')
+            
+                elif event == REQUEST_STARTED:
+                    self.on_request_started(window, values[event])
+            
+                elif event == REQUEST_CHUNK:
+                    self.on_request_chunk(window, *values[event])
+            
+                elif event == REQUEST_DONE:
+                    self.on_request_done(window, *values[event])
+            
+                elif event == REQUEST_ERROR:
+                    self.on_request_failed(window, *values[event])
+            
+                elif event == REQUEST_CANCELLED:
+                    self.on_request_failed(window, values[event])
             
-            elif event == '-NEW_CHAT-':
-                chat_name = sg.popup_get_text('Nazwa nowego czatu:', default_text=f'Czat {len(self.chat_manager.chats) + 1}', font=('Segoe UI', 10))
-                if chat_name:
-                    self.current_chat_id = self.chat_manager.create_chat(chat_name)
-                    self.chat_session = self.create_chat_session()
-                    window['-CHAT_LIST-'].update(self.chat_manager.get_chat_list())
-                    self.update_chat_display(window)
+                elif event == '-LOAD_OLDER-':
+                    if self.renderer.load_older(self.history_view):
+                        self.restore_partial_response()
             
-            elif event == '-CHAT_LIST-':
-                if values['-CHAT_LIST-']:
-                    chat_name = values['-CHAT_LIST-'][0]
-                    for chat_id, chat in self.chat_manager.chats.items():
-                        if chat['name'] == chat_name:
-                            self.current_chat_id = chat_id
-                            self.chat_session = self.create_chat_session()
-                            self.update_chat_display(window)
+                elif event == '-CANCEL-':
+                    if self.current_chat_id and self.worker.cancel_chat(self.current_chat_id):
+                        self.update_status_bar(window, 'Anulowanie...')
+            
+                elif event == '-NEW_CHAT-':
+                    chat_name = sg.popup_get_text('Nazwa nowego czatu:', default_text=f'Czat {len(self.chat_manager.chats) + 1}', font=('Segoe UI', 10))
+                    if chat_name:
+                        self.current_chat_id = self.chat_manager.create_chat(chat_name)
+                        self.chat_list.select(self.current_chat_id)
+                        self.update_chat_display(window, full=True)
+            
+                elif event == '-SEARCH-':
+                    query = values['-SEARCH_QUERY-'].strip()
+                    if query:
+                        hit = self.show_search_results(query)
+                        if hit:
+                            self.open_search_hit(window, hit)
+                            self.chat_list.select(hit['chat_id'])
                             attached_files = []
-                            break
             
-            elif event == '-DELETE_CHAT-':
-                if self.current_chat_id:
-                    confirm = sg.popup_yes_no('Czy na pewno usunąć ten czat?', font=('Segoe UI', 10), title='Potwierdzenie')
-                    if confirm == 'Yes':
-                        self.chat_manager.delete_chat(self.current_chat_id)
-                        self.current_chat_id = None
-                        self.chat_session = None
-                        window['-CHAT_LIST-'].update(self.chat_manager.get_chat_list())
-                        window['-CHAT_HISTORY-'].update('')
-                        window['-CHAT_NAME-'].update('')
+                elif event == '-CHAT_LIST-':
+                    chat_id = self.chat_list.selected_chat_id()
+                    if chat_id:
+                        self.current_chat_id = chat_id
+                        self.chat_list.select(chat_id)
+                        self.update_chat_display(window, full=True)
+                        attached_files = []
             
-            elif event == '-ATTACH-':
-                files = sg.popup_get_file(
-                    'Wybierz pliki',
-                    multiple_files=True,
-                    file_types=(('Obrazy', '*.png *.jpg *.jpeg *.gif *.bmp'), ('Teksty', '*.txt *.md'), ('Wszystkie', '*.*'))
-                )
-                if files:
-                    if isinstance(files, str):
-                        files = [files]
-                    attached_files.extend(files)
-                    window['-ATTACHED_FILES-'].update(', '.join([os.path.basename(f) for f in attached_files]))
+                elif event == '-DELETE_CHAT-':
+                    if self.current_chat_id:
+                        confirm = sg.popup_yes_no('Czy na pewno usunąć ten czat?', font=('Segoe UI', 10), title='Potwierdzenie')
+                        if confirm == 'Yes':
+                            self.worker.cancel_chat(self.current_chat_id)
+                            self.streaming.pop(self.current_chat_id, None)
+                            self.renderer.forget(self.current_chat_id)
+                            self.chat_manager.delete_chat(self.current_chat_id)
+                            self.sessions.discard(self.current_chat_id)
+                            self.documents.pop(self.current_chat_id, None)
+                            self.current_chat_id = None
+                            self.renderer.clear(self.history_view)
+                            window['-CHAT_NAME-'].update('')
             
-            elif event == '-SEND-':
-                if self.current_chat_id:
-                    msg = values['-MESSAGE-'].strip()
-                    self.send_message(window, msg, attached_files if attached_files else None)
-                    attached_files = []
-                else:
-                    sg.popup('Utwórz lub wybierz czat!', font=('Segoe UI', 10), title='Info')
+                elif event == '-ATTACH-':
+                    files = sg.popup_get_file(
+                        'Wybierz pliki',
+                        multiple_files=True,
+                        file_types=(('Obrazy', '*.png *.jpg *.jpeg *.gif *.bmp'), ('Teksty', '*.txt *.md'), ('Wszystkie', '*.*'))
+                    )
+                    if files:
+                        if isinstance(files, str):
+                            files = [files]
+                        attached_files.extend(files)
+                        window['-ATTACHED_FILES-'].update(', '.join([os.path.basename(f) for f in attached_files]))
             
-            elif event == '-SAVE_SETTINGS-':
-                self.config.api_key = values['-API_KEY-']
-                self.config.model_name = values['-MODEL-']
-                self.config.temperature = values['-TEMPERATURE-']
-                self.config.max_tokens = int(values['-MAX_TOKENS-'])
-                self.config.top_p = values['-TOP_P-']
-                self.config.top_k = int(values['-TOP_K-'])
-                self.config.system_instruction = values['-SYSTEM_INSTRUCTION-']
-                self.config.enable_safety_filters = values['-SAFETY_FILTERS-']
-                self.config.save()
-                
-                if self.config.api_key:
-                    self.client = genai.Client(api_key=self.config.api_key)
+                elif event == '-SEND-':
                     if self.current_chat_id:
-                        self.chat_session = self.create_chat_session()
-                    self.update_status_bar(window)
-                    sg.popup('Ustawienia zapisane!', font=('Segoe UI', 10), title='Sukces')
+                        msg = values['-MESSAGE-'].strip()
+                        self.send_message(window, msg, attached_files if attached_files else None)
+                        attached_files = []
+                    else:
+                        sg.popup('Utwórz lub wybierz czat!', font=('Segoe UI', 10), title='Info')
+            
+                elif event == '-SAVE_SETTINGS-':
+                    self.config.api_key = values['-API_KEY-']
+                    self.config.model_name = values['-MODEL-']
+                    self.config.temperature = values['-TEMPERATURE-']
+                    self.config.max_tokens = int(values['-MAX_TOKENS-'])
+                    self.config.top_p = values['-TOP_P-']
+                    self.config.top_k = int(values['-TOP_K-'])
+                    self.config.system_instruction = values['-SYSTEM_INSTRUCTION-']
+                    self.config.enable_safety_filters = values['-SAFETY_FILTERS-']
+                    self.config.stream_responses = values['-STREAM_RESPONSES-']
+                    self.config.save()
+                
+                    if self.config.api_key:
+                        # Sesje (odtworzone z historii) i klient powstaną od nowa tylko, jeśli zmieniło się coś, od czego zależą
+                        self.clients.apply_settings(self.config)
+                        self.update_status_bar(window)
+                        sg.popup('Ustawienia zapisane!', font=('Segoe UI', 10), title='Sukces')
             
-            elif event == '-RESET_SETTINGS-':
-                self.config = Config()
-                window['-API_KEY-'].update(self.config.api_key)
-                window['-MODEL-'].update(self.config.model_name)
-                window['-TEMPERATURE-'].update(self.config.temperature)
-                window['-MAX_TOKENS-'].update(self.config.max_tokens)
-                window['-TOP_P-'].update(self.config.top_p)
-                window['-TOP_K-'].update(self.config.top_k)
-                window['-SYSTEM_INSTRUCTION-'].update(self.config.system_instruction)
-                window['-SAFETY_FILTERS-'].update(self.config.enable_safety_filters)
-                self.update_status_bar(window)
-                sg.popup('Ustawienia zresetowane!', font=('Segoe UI', 10), title='Info')
-        
-        window.close()
+                elif event == '-RESET_SETTINGS-':
+                    self.config = Config()
+                    window['-API_KEY-'].update(self.config.api_key)
+                    window['-MODEL-'].update(self.config.model_name)
+                    window['-TEMPERATURE-'].update(self.config.temperature)
+                    window['-MAX_TOKENS-'].update(self.config.max_tokens)
+                    window['-TOP_P-'].update(self.config.top_p)
+                    window['-TOP_K-'].update(self.config.top_k)
+                    window['-SYSTEM_INSTRUCTION-'].update(self.config.system_instruction)
+                    window['-SAFETY_FILTERS-'].update(self.config.enable_safety_filters)
+                    window['-STREAM_RESPONSES-'].update(self.config.stream_responses)
+                    self.clients.apply_settings(self.config)
+                    self.update_status_bar(window)
+                    sg.popup('Ustawienia zresetowane!', font=('Segoe UI', 10), title='Info')
+        finally:
+            try:
+                self.worker.shutdown()
+                self.executor.shutdown()
+                self.preprocessor.shutdown()
+                self.attachment_index.close()
+                self.clients.close()
+                if self.metrics_exporter is not None:
+                    self.metrics_exporter.stop()
+                window.close()
+            finally:
+                # Czaty zapisywane także po wyjątku w pętli zdarzeń lub przy zamykaniu pozostałych elementów
+                self.chat_manager.close()
 
 if __name__ == '__main__':
     app = GeminiChatApp()
@@ -0,0 +1,111 @@
+# messages.py
+# Zwarta reprezentacja wiadomości czatu w pamięci
+
+import sys
+from datetime import datetime, timedelta
+
+# Znaczniki czasu to lokalny czas "ścienny" bez strefy (datetime.now()), więc liczone
+# są od naiwnej epoki - konwersja w obie strony nie zależy od strefy ani zmiany czasu
+EPOCH = datetime(1970, 1, 1)
+FIELDS = ('role', 'content', 'timestamp', 'tokens', 'attachments')
+OPTIONAL_FIELDS = ('tokens', 'attachments')  # Pomijane w to_dict(), gdy nieustawione
+
+
+def parse_timestamp(value):
+    """Znacznik czasu ISO -> sekundy od EPOCH"""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.replace(tzinfo=None)
+    return (moment - EPOCH).total_seconds()
+
+
+def format_timestamp(seconds):
+    """Sekundy od EPOCH -> znacznik czasu ISO (jak datetime.isoformat())"""
+    return (EPOCH + timedelta(seconds=seconds)).isoformat()
+
+
+class Message:
+    """Wiadomość czatu: pola w __slots__, wspólne obiekty ról, czas jako liczba
+
+    Zastępuje słownik {'role', 'content', 'timestamp', ...} - zajmuje kilka razy
+    mniej pamięci, a godzina do nagłówka liczona jest bez parsowania tekstu.
+    Dla zgodności obsługuje odczyt jak słownik (msg['timestamp'], msg.get('tokens')),
+    przy czym 'timestamp' jest wtedy formatowany z liczby.
+    """
+
+    __slots__ = ('role', 'content', 'created', 'tokens', 'attachments')
+
+    def __init__(self, role, content, created, tokens=None, attachments=None):
+        self.role = sys.intern(role)
+        self.content = content
+        self.created = created  # Sekundy od EPOCH (czas lokalny)
+        self.tokens = tokens
+        self.attachments = attachments or None
+
+    @classmethod
+    def now(cls, role, content, tokens=None, attachments=None):
+        return cls(role, content, parse_timestamp(datetime.now().isoformat()), tokens, attachments)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Wiadomość z formatu zapisu (słownik z polem 'timestamp' w ISO)"""
+        if isinstance(data, cls):
+            return data
+        return cls(data['role'], data['content'], parse_timestamp(data['timestamp']),
+                   data.get('tokens'), data.get('attachments'))
+
+    def to_dict(self):
+        """Słownik w formacie zapisu (JSON, dziennik, SQLite)"""
+        data = {'role': self.role, 'content': self.content, 'timestamp': self.timestamp}
+        if self.tokens is not None:
+            data['tokens'] = self.tokens
+        if self.attachments:
+            data['attachments'] = self.attachments
+        return data
+
+    @property
+    def timestamp(self):
+        return format_timestamp(self.created)
+
+    @property
+    def time_label(self):
+        """Godzina do nagłówka wiadomości (HH:MM)"""
+        minutes = int(self.created // 60) % (24 * 60)
+        return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __getitem__(self, key):
+        # Jak w słowniku z to_dict(): brak klucza to tylko pole nieustawione (tokens/attachments),
+        # a role/content/timestamp są zawsze obecne, także z wartością None
+        if key not in self:
+            raise KeyError(key)
+        return self.timestamp if key == 'timestamp' else getattr(self, key)
+
+    def __contains__(self, key):
+        if key in OPTIONAL_FIELDS:
+            return bool(getattr(self, key)) if key == 'attachments' else getattr(self, key) is not None
+        return key in FIELDS
+
+    def __repr__(self):
+        return f"Message({self.role!r}, {(self.content or '')[:30]!r}, {self.timestamp!r})"
+
+
+def attachment_digests(attachments):
+    """Skróty SHA-256 załączników z BlobStore (starsze wpisy ze ścieżkami plików są pomijane)"""
+    return [ref['sha256'] for ref in attachments or () if isinstance(ref, dict) and 'sha256' in ref]
+
+
+def json_object_hook(data):
+    """Hook json.load - wiadomości tworzone od razu przy parsowaniu (bez listy słowników w pamięci)"""
+    if 'role' in data and 'content' in data and 'timestamp' in data:
+        return Message.from_dict(data)
+    return data
+
+
+def json_default(obj):
+    """Hook json.dump - wiadomości zapisywane są w formacie słownikowym"""
+    if isinstance(obj, Message):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
@@ -0,0 +1,174 @@
+# metrics.py
+# Liczniki i rozkłady czasów (zapytania do API, zapis na dysk, renderowanie)
+# z eksportem do JSONL i formatu tekstowego Prometheus
+
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+PROMETHEUS_QUANTILES = (0.5, 0.9, 0.99)
+
+
+def percentile(values, p):
+    """Percentyl p (0-100) z listy wartości (metoda najbliższego rangi)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def record_usage(metrics, usage):
+    """Zlicz tokeny z usage_metadata odpowiedzi; zwraca (prompt, odpowiedź) lub None, gdy brak danych"""
+    if usage is None:
+        return None
+    prompt = getattr(usage, 'prompt_token_count', None) or 0
+    response = getattr(usage, 'candidates_token_count', None) or 0
+    metrics.incr('prompt_tokens', prompt)
+    metrics.incr('response_tokens', response)
+    # Część tokenów zapytania odczytana z pamięci kontekstu (context_cache)
+    metrics.incr('cached_tokens', getattr(usage, 'cached_content_token_count', None) or 0)
+    metrics.observe('response_tokens_per_request', response)
+    return prompt, response
+
+
+class Metrics:
+    """Bezpieczne wątkowo liczniki oraz próbki wartości (np. opóźnień) z ostatnich `window` pomiarów
+
+    Percentyle liczone są z okna ostatnich próbek, a suma i liczba wszystkich
+    pomiarów (do eksportu) rosną od startu. Czasy zapisywane są w sekundach.
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._samples = {}
+        self._totals = {}  # nazwa -> [liczba pomiarów, suma]
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, value):
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+            samples.append(value)
+            totals = self._totals.setdefault(name, [0, 0])
+            totals[0] += 1
+            totals[1] += value
+
+    @contextmanager
+    def timer(self, name):
+        """Zmierz czas bloku `with` jako próbkę `name`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def counter(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def percentile(self, name, p):
+        with self._lock:
+            values = list(self._samples.get(name, ()))
+        return percentile(values, p)
+
+    def snapshot(self):
+        """Liczniki i percentyle p50/p99 wszystkich próbek jako słownik"""
+        with self._lock:
+            result = dict(self._counters)
+            samples = {name: list(values) for name, values in self._samples.items()}
+        for name, values in samples.items():
+            result[f"{name}_p50"] = percentile(values, 50)
+            result[f"{name}_p99"] = percentile(values, 99)
+        return result
+
+    def write_jsonl(self, path):
+        """Dopisz bieżący snapshot jako linię JSON (z czasem pomiaru)"""
+        line = json.dumps(dict(self.snapshot(), time=time.time()), ensure_ascii=False)
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+    def prometheus_text(self, prefix='gemini_chat'):
+        """Liczniki i próbki w formacie tekstowym Prometheus (próbki jako summary z kwantylami)"""
+        with self._lock:
+            counters = dict(self._counters)
+            samples = {name: sorted(values) for name, values in self._samples.items()}
+            totals = {name: tuple(total) for name, total in self._totals.items()}
+
+        lines = []
+        for name, value in sorted(counters.items()):
+            metric = prometheus_name(prefix, name) + '_total'
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        for name, values in sorted(samples.items()):
+            metric = prometheus_name(prefix, name)
+            lines.append(f"# TYPE {metric} summary")
+            for q in PROMETHEUS_QUANTILES:
+                lines.append(f'{metric}{{quantile="{q}"}} {percentile(values, q * 100)}')
+            count, total = totals[name]
+            lines += [f"{metric}_sum {total}", f"{metric}_count {count}"]
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        """Zapisz metryki w formacie Prometheus (np. dla textfile collectora node_exportera)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._samples.clear()
+            self._totals.clear()
+
+
+def prometheus_name(prefix, name):
+    """Nazwa metryki zgodna z Prometheus ([a-zA-Z_:][a-zA-Z0-9_:]*)"""
+    return re.sub(r'[^a-zA-Z0-9_:]', '_', f"{prefix}_{name}")
+
+
+class MetricsExporter:
+    """Okresowy eksport metryk w tle: 'jsonl' (dopisywany snapshot) lub 'prometheus' (plik podmieniany)"""
+
+    def __init__(self, metrics, path, fmt='jsonl', interval=60):
+        self.metrics = metrics
+        self.path = path
+        self.fmt = fmt
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def export(self):
+        try:
+            if self.fmt == 'prometheus':
+                self.metrics.write_prometheus(self.path)
+            else:
+                self.metrics.write_jsonl(self.path)
+        except Exception as e:
+            print(f"Błąd eksportu metryk: {e}")
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name='metrics-export', daemon=True)
+        self._thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.export()
+
+    def stop(self):
+        """Zatrzymaj eksport i zapisz ostatni stan"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.export()
@@ -0,0 +1,166 @@
+# renderer.py
+# Przyrostowe renderowanie historii czatu
+
+from collections import OrderedDict
+
+SEPARATOR = f"\n\n{'='*80}\n\n"
+
+
+def format_header(timestamp, role, attachment_count=0):
+    """Nagłówek wiadomości: godzina, autor i liczba załączników"""
+    label = "[TY]" if role == 'user' else "[GEMINI]"
+    attachments = f" 📎({attachment_count})" if attachment_count else ""
+    return f"{timestamp} {label}{attachments}\n"
+
+
+def format_message(msg):
+    """Sformatuj wiadomość do bloku tekstu w historii"""
+    header = format_header(msg.time_label, msg.role, len(msg.attachments or ()))
+    return f"{header}{msg.content}{SEPARATOR}"
+
+
+class MultilineView:
+    """Adapter elementu sg.Multiline używany przez ChatRenderer
+
+    Częściowa (strumieniowana) odpowiedź jest oznaczana markiem Tk, dzięki
+    czemu można ją usunąć bez liczenia znaków i bez przebudowy całego tekstu.
+    """
+
+    TAIL_MARK = 'partial_tail'
+
+    def __init__(self, element):
+        self.element = element
+
+    def set(self, text):
+        self.element.update(text)
+
+    def append(self, text):
+        self.element.update(text, append=True)
+
+    def scroll_to_top(self):
+        self.element.Widget.see('1.0')
+
+    def mark_tail(self):
+        widget = self.element.Widget
+        widget.mark_set(self.TAIL_MARK, 'end-1c')
+        widget.mark_gravity(self.TAIL_MARK, 'left')
+
+    def truncate_tail(self):
+        widget = self.element.Widget
+        state = widget.cget('state')
+        widget.configure(state='normal')
+        widget.delete(self.TAIL_MARK, 'end-1c')
+        widget.configure(state=state)
+
+
+class ChatRenderer:
+    """Przyrostowy renderer historii czatu
+
+    - przy przełączeniu czatu renderuje tylko ostatnie `window_size` wiadomości
+      (starsze doczytywane są stronami przez load_older),
+    - po dodaniu wiadomości dopisuje wyłącznie nowe bloki (sync),
+    - sformatowane bloki są buforowane per czat, więc powrót do czatu nie
+      parsuje ponownie znaczników czasu.
+    """
+
+    def __init__(self, chat_manager, window_size=200, page_size=200, cached_chats=32):
+        self.chat_manager = chat_manager
+        self.window_size = window_size
+        self.page_size = page_size
+        self.cached_chats = cached_chats
+        self._blocks = OrderedDict()  # chat_id -> {indeks: (created, blok)}
+        self.chat_id = None
+        self.first_index = 0
+        self.rendered_count = 0
+        self.has_partial = False
+
+    def _chat_blocks(self, chat_id):
+        blocks = self._blocks.get(chat_id)
+        if blocks is None:
+            blocks = self._blocks[chat_id] = {}
+            while len(self._blocks) > self.cached_chats:
+                self._blocks.popitem(last=False)
+        else:
+            self._blocks.move_to_end(chat_id)
+        return blocks
+
+    def _format_range(self, chat_id, start, end):
+        """Bloki wiadomości [start, end) z bufora lub świeżo sformatowane"""
+        if end <= start:
+            return []
+        blocks = self._chat_blocks(chat_id)
+        result = []
+        for index, msg in enumerate(self.chat_manager.get_messages(chat_id, start, end - start), start):
+            cached = blocks.get(index)
+            # Znacznik czasu odróżnia wiadomość dodaną w miejsce wycofanej (pop_message)
+            if cached is None or cached[0] != msg.created:
+                cached = blocks[index] = (msg.created, format_message(msg))
+            result.append(cached[1])
+        return result
+
+    def _older_notice(self):
+        if not self.first_index:
+            return ""
+        return f"··· {self.first_index} starszych wiadomości - kliknij ▲ Starsze ···\n\n"
+
+    def render(self, view, chat_id, first_index=None):
+        """Pełne wyrenderowanie okna ostatnich wiadomości czatu"""
+        count = self.chat_manager.get_message_count(chat_id)
+        if first_index is None:
+            first_index = max(0, count - self.window_size)
+        self.chat_id = chat_id
+        self.first_index = first_index
+        self.rendered_count = count
+        self.has_partial = False
+        view.set(self._older_notice() + ''.join(self._format_range(chat_id, first_index, count)))
+
+    def sync(self, view, chat_id):
+        """Dopisz wiadomości dodane od ostatniego renderowania"""
+        if chat_id != self.chat_id:
+            self.render(view, chat_id)
+            return
+        count = self.chat_manager.get_message_count(chat_id)
+        if count < self.rendered_count or not self._last_block_current(chat_id):
+            # Wiadomość została wycofana - przebuduj okno (z bufora bloków)
+            self.render(view, chat_id, min(self.first_index, count))
+            return
+        if self.has_partial:
+            view.truncate_tail()
+            self.has_partial = False
+        new_blocks = self._format_range(chat_id, self.rendered_count, count)
+        self.rendered_count = count
+        if new_blocks:
+            view.append(''.join(new_blocks))
+
+    def _last_block_current(self, chat_id):
+        """Czy ostatnia wyrenderowana wiadomość wciąż jest w historii (wykrywa pop + add między odświeżeniami)"""
+        if not self.rendered_count:
+            return True
+        last = self.chat_manager.get_messages(chat_id, self.rendered_count - 1, 1)
+        cached = self._chat_blocks(chat_id).get(self.rendered_count - 1)
+        return bool(last) and cached is not None and cached[0] == last[0].created
+
+    def append_partial(self, view, text):
+        """Dopisz fragment odpowiedzi, który zostanie zastąpiony przy następnym sync"""
+        if not self.has_partial:
+            view.mark_tail()
+            self.has_partial = True
+        view.append(text)
+
+    def load_older(self, view):
+        """Doczytaj poprzednią stronę wiadomości; zwraca False, jeśli nie ma starszych"""
+        if self.chat_id is None or not self.first_index:
+            return False
+        self.render(view, self.chat_id, max(0, self.first_index - self.page_size))
+        return True
+
+    def clear(self, view):
+        self.chat_id = None
+        self.first_index = 0
+        self.rendered_count = 0
+        self.has_partial = False
+        view.set('')
+
+    def forget(self, chat_id):
+        """Usuń bufor bloków czatu (np. po jego usunięciu)"""
+        self._blocks.pop(chat_id, None)
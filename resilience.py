@@ -0,0 +1,229 @@
+# resilience.py
+# Ograniczanie tempa, ponawianie i zapytania zapasowe (hedging) wokół wywołań API
+
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from metrics import Metrics
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_MARKERS = ('RESOURCE_EXHAUSTED', 'UNAVAILABLE', 'DEADLINE_EXCEEDED', 'INTERNAL')
+SLEEP_SLICE = 0.1  # Oczekiwanie dzielone na krótkie odcinki, żeby szybko reagować na anulowanie
+
+
+class PartialResponseError(Exception):
+    """Strumień przerwany po przekazaniu fragmentów - ponowienie zdublowałoby tekst"""
+
+
+def error_status(error):
+    """Kod HTTP błędu API (google.genai.errors.APIError ma atrybut code) lub None"""
+    for attr in ('code', 'status_code'):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def is_retryable(error):
+    """Czy błąd jest przejściowy (limit zapytań, przeciążenie, zerwane połączenie)"""
+    if isinstance(error, PartialResponseError):
+        return False
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    status = error_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    text = str(error)
+    return any(marker in text for marker in RETRYABLE_MARKERS)
+
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=30.0):
+    """Wykładnicze opóźnienie z pełnym losowym rozrzutem (full jitter)"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+def interruptible_sleep(seconds, check=None):
+    """Śpij `seconds`, wywołując check() co SLEEP_SLICE (check może rzucić wyjątek, np. RequestCancelled)"""
+    deadline = time.monotonic() + seconds
+    while True:
+        if check:
+            check()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        time.sleep(min(SLEEP_SLICE, remaining))
+
+
+class TokenBucket:
+    """Kubełek żetonów: `rate` żetonów na sekundę, najwyżej `capacity` naraz"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self):
+        """Pobierz żeton (także na kredyt); zwraca czas oczekiwania na jego dostępność"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self, check=None):
+        """Poczekaj na żeton; zwraca czas oczekiwania w sekundach"""
+        wait_time = self._reserve()
+        if wait_time > 0:
+            interruptible_sleep(wait_time, check)
+        return wait_time
+
+
+class RateLimiter:
+    """Osobny kubełek żetonów dla każdego modelu (limity API są liczone per model)
+
+    requests_per_minute - domyślny limit; per_model - nadpisania {model: limit}; 0 wyłącza limit.
+    """
+
+    def __init__(self, requests_per_minute=60, per_model=None):
+        self.requests_per_minute = requests_per_minute
+        self.per_model = dict(per_model or {})
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, model):
+        with self._lock:
+            bucket = self._buckets.get(model)
+            if bucket is None:
+                rpm = self.per_model.get(model, self.requests_per_minute)
+                if not rpm:
+                    return None
+                bucket = self._buckets[model] = TokenBucket(rpm / 60.0, capacity=max(1, rpm // 10))
+            return bucket
+
+    def acquire(self, model, check=None):
+        bucket = self._bucket(model)
+        return bucket.acquire(check) if bucket else 0.0
+
+    def reserve(self, model):
+        """Pobierz żeton bez czekania; zwraca czas oczekiwania na niego (dla pętli asyncio)"""
+        bucket = self._bucket(model)
+        return bucket._reserve() if bucket else 0.0
+
+
+class RequestExecutor:
+    """Warstwa wykonywania zapytań: limit tempa, ponowienia z backoffem i opcjonalny hedging
+
+    hedge_after - po tylu sekundach bez odpowiedzi wysyłane jest zapytanie zapasowe
+    i zwracany jest pierwszy wynik (0 wyłącza). Dotyczy tylko wywołań oznaczonych
+    jako idempotentne (hedge=True), bo np. sesja czatu zapisuje historię przy wysłaniu.
+    Metryki: requests, errors, retries, throttled, throttle_wait, hedges, hedge_wins oraz latency (p50/p99).
+    """
+
+    def __init__(self, rate_limiter=None, metrics=None, max_retries=3, base_delay=1.0, max_delay=30.0,
+                 hedge_after=0):
+        self.rate_limiter = rate_limiter or RateLimiter(0)
+        self.metrics = metrics or Metrics()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_after = hedge_after
+        self._hedge_pool = None
+        self._hedge_lock = threading.Lock()
+
+    def call(self, model, fn, hedge=False, check=None):
+        """Wykonaj fn() z limitem tempa dla modelu i ponowieniami błędów przejściowych
+
+        check - funkcja wywoływana w trakcie oczekiwania (może przerwać je wyjątkiem)
+        """
+        attempt = 0
+        while True:
+            self._throttle(model, check)
+            start = time.perf_counter()
+            self.metrics.incr('requests')
+            try:
+                if hedge and self.hedge_after:
+                    result = self._hedged(model, fn, check)
+                else:
+                    result = fn()
+            except Exception as e:
+                self.metrics.incr('errors')
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                self.metrics.incr('retries')
+                interruptible_sleep(backoff_delay(attempt, self.base_delay, self.max_delay), check)
+                attempt += 1
+                continue
+            self.metrics.observe('latency', time.perf_counter() - start)
+            return result
+
+    async def acall(self, model, fn):
+        """Wersja call dla asyncio: fn() zwraca korutynę, oczekiwanie nie blokuje pętli zdarzeń (bez hedgingu)"""
+        attempt = 0
+        while True:
+            waited = self.rate_limiter.reserve(model)
+            if waited > 0:
+                self.metrics.incr('throttled')
+                self.metrics.incr('throttle_wait', waited)
+                await asyncio.sleep(waited)
+            start = time.perf_counter()
+            self.metrics.incr('requests')
+            try:
+                result = await fn()
+            except Exception as e:
+                self.metrics.incr('errors')
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                self.metrics.incr('retries')
+                await asyncio.sleep(backoff_delay(attempt, self.base_delay, self.max_delay))
+                attempt += 1
+                continue
+            self.metrics.observe('latency', time.perf_counter() - start)
+            return result
+
+    def _throttle(self, model, check):
+        waited = self.rate_limiter.acquire(model, check)
+        if waited:
+            self.metrics.incr('throttled')
+            self.metrics.incr('throttle_wait', waited)
+
+    def _pool(self):
+        with self._hedge_lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(thread_name_prefix='gemini-hedge')
+            return self._hedge_pool
+
+    def _hedged(self, model, fn, check):
+        """Pierwszy udany wynik z zapytania głównego lub zapasowego wysłanego po hedge_after"""
+        pool = self._pool()
+        primary = pool.submit(fn)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result()
+
+        self._throttle(model, check)
+        self.metrics.incr('hedges')
+        backup = pool.submit(fn)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        self.metrics.incr('hedge_wins')
+                    # Wolniejsze zapytanie kończy się w tle, jego wynik jest pomijany
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def shutdown(self):
+        with self._hedge_lock:
+            if self._hedge_pool is not None:
+                self._hedge_pool.shutdown(wait=False, cancel_futures=True)
+                self._hedge_pool = None
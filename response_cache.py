@@ -0,0 +1,210 @@
+# response_cache.py
+# Pamięć podręczna odpowiedzi dla identycznych zapytań (model, parametry, historia, treść)
+
+import enum
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from storage import atomic_write_json
+
+CACHE_MODES = ('off', 'deterministic', 'always')
+
+
+def cache_enabled(mode, temperature):
+    """Czy odpowiedź może pochodzić z pamięci podręcznej
+
+    'deterministic' - tylko przy temperaturze 0 (ta sama odpowiedź jest wtedy oczekiwana),
+    'always' - zawsze, 'off' - nigdy.
+    """
+    if mode == 'always':
+        return True
+    return mode == 'deterministic' and temperature == 0
+
+
+def _canonical_default(obj):
+    if isinstance(obj, (bytes, bytearray)):
+        # Dane binarne (np. obrazy) reprezentowane skrótem - klucz ma stały, mały rozmiar
+        return {'sha256': hashlib.sha256(obj).hexdigest()}
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    if hasattr(obj, 'model_dump'):
+        return obj.model_dump(exclude_none=True)
+    return str(obj)
+
+
+def request_key(model_name, generate_config, history, contents, attachments=None):
+    """Skrót SHA-256 kanonicznej postaci całego zapytania
+
+    generate_config - GenerateContentConfig (jak przy tworzeniu sesji czatu),
+    history - dotychczasowa historia sesji, contents - treść nowej wiadomości,
+    attachments - skróty załączników i przypiętych plików; pliki z Files API
+    i pamięci kontekstu trafiają do zapytania tylko jako odwołania (uri, nazwa wpisu).
+    """
+    payload = json.dumps(
+        [model_name, generate_config, history, contents, attachments],
+        default=_canonical_default,
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(',', ':')
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Odpowiedzi wg klucza zapytania: LRU w pamięci oraz pliki na dysku, oba z czasem ważności
+
+    cache_dir - katalog warstwy dyskowej (None wyłącza), max_entries - rozmiar LRU w pamięci,
+    ttl - czas ważności wpisu w sekundach, max_disk_bytes - limit rozmiaru katalogu (0 - bez limitu).
+
+    Plik wpisu ma czas modyfikacji ustawiony na chwilę wygaśnięcia, więc porządkowanie
+    katalogu (prune) nie musi czytać plików: najpierw usuwa wygasłe, a przy przekroczeniu
+    limitu - kolejne od najwcześniej wygasających (przy stałym ttl: najstarsze).
+    """
+
+    def __init__(self, cache_dir='response_cache', max_entries=256, ttl=24 * 3600, metrics=None,
+                 max_disk_bytes=100 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.metrics = metrics
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = None  # Rozmiar katalogu wg ostatniego porządkowania + późniejsze zapisy
+        self._pruning = False
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _count(self, name):
+        if self.metrics is not None:
+            self.metrics.incr(name)
+
+    def get(self, key):
+        """Zapisana odpowiedź lub None (brak albo wygasła)"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry['expires_at'] > now:
+                    self._memory.move_to_end(key)
+                    self._count('cache_hits')
+                    return entry['response']
+                del self._memory[key]
+
+        entry = self._read_disk(key)
+        if entry is None or entry['expires_at'] <= now:
+            self._count('cache_misses')
+            return None
+        with self._lock:
+            self._remember(key, entry)
+        self._count('cache_hits')
+        return entry['response']
+
+    def put(self, key, response, ttl=None):
+        entry = {'response': response, 'expires_at': time.time() + (self.ttl if ttl is None else ttl)}
+        with self._lock:
+            self._remember(key, entry)
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_write_json(path, entry)
+            os.utime(path, (entry['expires_at'], entry['expires_at']))
+            size = os.path.getsize(path)
+        except Exception as e:
+            print(f"Błąd zapisywania odpowiedzi w pamięci podręcznej: {e}")
+            return
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += size
+            # Pierwszy zapis w procesie porządkuje katalog (wpisy z poprzednich uruchomień)
+            prune = not self._pruning and (
+                self._disk_bytes is None or (self.max_disk_bytes and self._disk_bytes > self.max_disk_bytes)
+            )
+            if prune:
+                self._pruning = True
+        if prune:
+            try:
+                self.prune()
+            finally:
+                with self._lock:
+                    self._pruning = False
+
+    def prune(self):
+        """Usuń z dysku wygasłe wpisy, a przy przekroczeniu max_disk_bytes - najwcześniej wygasające
+
+        Katalog jest zmniejszany do 90% limitu, żeby kolejne zapisy nie porządkowały go za każdym razem.
+        Zwraca liczbę usuniętych plików.
+        """
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            with self._lock:
+                self._disk_bytes = 0
+            return 0
+        now = time.time()
+        files = []
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for item in os.scandir(shard.path):
+                if not item.name.endswith('.json'):
+                    continue  # Np. plik tymczasowy zapisu w toku
+                try:
+                    stat = item.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, item.path))
+
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        target = self.max_disk_bytes * 0.9 if self.max_disk_bytes else None
+        removed = 0
+        for expires_at, size, path in files:
+            if expires_at > now and (target is None or total <= target):
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        with self._lock:
+            self._disk_bytes = total
+        if removed and self.metrics is not None:
+            self.metrics.incr('cache_evictions', removed)
+        return removed
+
+    def _remember(self, key, entry):
+        """Wstaw wpis do LRU w pamięci (wywoływane pod blokadą)"""
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Błąd wczytywania odpowiedzi z pamięci podręcznej: {e}")
+            return None
+        if entry['expires_at'] <= time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
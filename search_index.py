@@ -0,0 +1,225 @@
+# search_index.py
+# Indeks pełnotekstowy wiadomości ze wszystkich czatów (SQLite FTS5)
+
+import math
+import re
+import sqlite3
+import threading
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+BM25_K1 = 1.2
+BM25_B = 0.75
+SNIPPET_CHARS = 60
+
+
+def make_snippet(content, lowered, words):
+    """Fragment treści wokół pierwszego wystąpienia szukanego słowa, słowo w nawiasach"""
+    positions = [(lowered.find(word), word) for word in words]
+    positions = [(pos, word) for pos, word in positions if pos >= 0]
+    if not positions:
+        return content[:2 * SNIPPET_CHARS]
+    pos, word = min(positions)
+    start = max(0, pos - SNIPPET_CHARS)
+    end = pos + len(word)
+    prefix = '…' if start else ''
+    suffix = '…' if end + SNIPPET_CHARS < len(content) else ''
+    return f"{prefix}{content[start:pos]}[{content[pos:end]}]{content[end:end + SNIPPET_CHARS]}{suffix}".replace('\n', ' ')
+
+
+class SearchIndex:
+    """Odwrócony indeks treści wiadomości, aktualizowany przyrostowo przez ChatManager
+
+    Każda wiadomość to wiersz tabeli FTS5 powiązany z (chat_id, seq), gdzie seq
+    to pozycja wiadomości w czacie. Tabela `indexed` przechowuje liczbę
+    zaindeksowanych wiadomości czatu - po starcie sync() porównuje ją z historią
+    i indeksuje od nowa tylko czaty, które się rozjechały (np. po awarii).
+    """
+
+    MAX_CANDIDATES = 500
+
+    def __init__(self, db_file='search.db'):
+        self.db_file = db_file
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    id INTEGER PRIMARY KEY,
+                    chat_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL
+                );
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_entries_chat ON entries (chat_id, seq);
+                CREATE TABLE IF NOT EXISTS indexed (
+                    chat_id TEXT PRIMARY KEY,
+                    message_count INTEGER NOT NULL
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                    content, tokenize='unicode61 remove_diacritics 2'
+                );
+            ''')
+        return self._conn
+
+    def _insert(self, conn, chat_id, seq, content):
+        cursor = conn.execute('INSERT INTO entries (chat_id, seq) VALUES (?, ?)', (chat_id, seq))
+        conn.execute('INSERT INTO messages_fts (rowid, content) VALUES (?, ?)', (cursor.lastrowid, content))
+
+    def _delete_chat(self, conn, chat_id):
+        conn.execute(
+            'DELETE FROM messages_fts WHERE rowid IN (SELECT id FROM entries WHERE chat_id = ?)', (chat_id,)
+        )
+        conn.execute('DELETE FROM entries WHERE chat_id = ?', (chat_id,))
+        conn.execute('DELETE FROM indexed WHERE chat_id = ?', (chat_id,))
+
+    def add(self, chat_id, seq, content):
+        """Zaindeksuj nową wiadomość czatu (seq - jej pozycja w czacie)"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                self._insert(conn, chat_id, seq, content)
+                conn.execute(
+                    'INSERT INTO indexed (chat_id, message_count) VALUES (?, ?) '
+                    'ON CONFLICT(chat_id) DO UPDATE SET message_count = excluded.message_count',
+                    (chat_id, seq + 1)
+                )
+
+    def remove(self, chat_id, seq):
+        """Usuń wiadomość z indeksu (po pop_message)"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                row = conn.execute('SELECT id FROM entries WHERE chat_id = ? AND seq = ?', (chat_id, seq)).fetchone()
+                if row is not None:
+                    conn.execute('DELETE FROM messages_fts WHERE rowid = ?', row)
+                    conn.execute('DELETE FROM entries WHERE id = ?', row)
+                conn.execute('UPDATE indexed SET message_count = ? WHERE chat_id = ?', (seq, chat_id))
+
+    def remove_chat(self, chat_id):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                self._delete_chat(conn, chat_id)
+
+    def reindex_chat(self, chat_id, contents):
+        """Zaindeksuj czat od nowa (contents - treści wiadomości w kolejności)"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                self._delete_chat(conn, chat_id)
+                count = 0
+                for seq, content in enumerate(contents):
+                    self._insert(conn, chat_id, seq, content)
+                    count += 1
+                conn.execute('INSERT INTO indexed (chat_id, message_count) VALUES (?, ?)', (chat_id, count))
+
+    def indexed_counts(self):
+        with self._lock:
+            return dict(self._connect().execute('SELECT chat_id, message_count FROM indexed'))
+
+    def sync(self, chat_manager, page_size=1000):
+        """Doprowadź indeks do zgodności z historią czatów; zwraca liczbę ponownie zaindeksowanych czatów"""
+        counts = self.indexed_counts()
+        for chat_id in counts.keys() - chat_manager.chats.keys():
+            self.remove_chat(chat_id)
+
+        reindexed = 0
+        for chat_id in list(chat_manager.chats):
+            if counts.get(chat_id) == chat_manager.get_message_count(chat_id):
+                continue
+            self.reindex_chat(chat_id, self._iter_contents(chat_manager, chat_id, page_size))
+            reindexed += 1
+        return reindexed
+
+    @staticmethod
+    def _iter_contents(chat_manager, chat_id, page_size):
+        offset = 0
+        while True:
+            page = chat_manager.get_messages(chat_id, offset, page_size)
+            for message in page:
+                yield message['content']
+            if len(page) < page_size:
+                return
+            offset += page_size
+
+    def search(self, query, limit=20):
+        """Najlepiej dopasowane wiadomości (ranking BM25): lista {'chat_id', 'offset', 'snippet', 'score'}
+
+        FTS5 zwraca MAX_CANDIDATES najnowszych wiadomości zawierających wszystkie
+        słowa, a ranking liczony jest tutaj - wbudowana funkcja bm25() przegląda
+        całą listę wystąpień każdego słowa, więc przy częstych słowach jej koszt
+        rósłby z rozmiarem historii. Liczności słów (IDF) też są ograniczone do
+        MAX_CANDIDATES, dzięki czemu zapytanie ma stały koszt niezależnie od liczby
+        wiadomości. Najpierw szukane są całe słowa; dopasowanie ostatniego słowa jako
+        prefiksu (wolniejsze, bo FTS5 scala wtedy listy wielu słów) uzupełnia wynik
+        tylko, gdy jest za krótki.
+        """
+        words = [word.lower() for word in WORD_RE.findall(query)]
+        if not words:
+            return []
+        with self._lock:
+            conn = self._connect()
+            hits = self._ranked(conn, words, False, limit)
+            if len(hits) < limit:
+                seen = {hit['rowid'] for hit in hits}
+                more = self._ranked(conn, words, True, limit)
+                hits.extend(hit for hit in more if hit['rowid'] not in seen)
+        for hit in hits:
+            del hit['rowid']
+        return hits[:limit]
+
+    def _ranked(self, conn, words, prefix, limit):
+        # Jak przy wpisywaniu - prefiksem może być tylko ostatnie słowo
+        terms = [f'"{word}"' for word in words]
+        if prefix:
+            terms[-1] += '*'
+        match = ' '.join(terms)
+        candidates = conn.execute(
+            'SELECT rowid, content FROM messages_fts WHERE messages_fts MATCH ? ORDER BY rowid DESC LIMIT ?',
+            (match, self.MAX_CANDIDATES)
+        ).fetchall()
+        if not candidates:
+            return []
+
+        total = conn.execute('SELECT MAX(id) FROM entries').fetchone()[0] or 1
+        idf = {}
+        for word, term in zip(words, terms):
+            df = conn.execute(
+                'SELECT COUNT(*) FROM (SELECT rowid FROM messages_fts WHERE messages_fts MATCH ? LIMIT ?)',
+                (term, self.MAX_CANDIDATES)
+            ).fetchone()[0]
+            idf[word] = math.log(1 + (total - df + 0.5) / (df + 0.5))
+
+        avg_length = sum(len(content) for _, content in candidates) / len(candidates) or 1
+        scored = []
+        for rowid, content in candidates:
+            text = content.lower()
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * len(content) / avg_length)
+            score = 0.0
+            for word in words:
+                # Kandydat na pewno zawiera słowo (dopasowanie FTS5 także bez znaków diakrytycznych)
+                tf = max(1, text.count(word))
+                score += idf[word] * tf * (BM25_K1 + 1) / (tf + norm)
+            scored.append((score, rowid, content, text))
+        scored.sort(key=lambda item: (-item[0], -item[1]))
+
+        hits = []
+        for score, rowid, content, text in scored[:limit]:
+            chat_id, seq = conn.execute('SELECT chat_id, seq FROM entries WHERE id = ?', (rowid,)).fetchone()
+            hits.append({
+                'chat_id': chat_id,
+                'offset': seq,
+                'snippet': make_snippet(content, text, words),
+                'score': score,
+                'rowid': rowid,
+            })
+        return hits
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,498 @@
+# server.py
+# Tryb usługi bez GUI: czaty i generowanie odpowiedzi przez lokalne HTTP (asyncio)
+#
+# Użycie: python server.py [--host 127.0.0.1] [--port 8765] [--token SEKRET] [--mock]
+#         (lub python main.py --serve ...)
+#
+# Endpointy (JSON, UTF-8):
+#   GET    /chats                              lista czatów (ostatnio aktywne na początku)
+#   POST   /chats {"name": ...}                nowy czat
+#   DELETE /chats/<id>                         usunięcie czatu
+#   GET    /chats/<id>/messages?offset=&limit= strona historii
+#   POST   /chats/<id>/messages {"message": ..., "stream": true}
+#          odpowiedź strumieniowana jako NDJSON: {"chunk": ...} ... {"done": true, "tokens": ...}
+#          albo {"error": ...}; przy "stream": false jeden obiekt {"response", "tokens"}
+#   GET    /metrics                            metryki w formacie Prometheus
+#   GET    /health
+
+import argparse
+import asyncio
+import hmac
+import json
+import time
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from archive import ChatArchive
+from chat_manager import ChatManager
+from client_pool import ClientManager
+from config import Config
+from context import build_history
+from metrics import Metrics, MetricsExporter, record_usage
+from resilience import PartialResponseError, RateLimiter, RequestExecutor
+from storage import create_storage
+from tokens import estimate_tokens
+
+MAX_BODY = 1024 * 1024
+MAX_HEADERS = 100
+MAX_PAGE = 500
+STATUS_TEXT = {
+    200: 'OK',
+    201: 'Created',
+    400: 'Bad Request',
+    401: 'Unauthorized',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    431: 'Request Header Fields Too Large',
+    500: 'Internal Server Error',
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ChatService:
+    """Operacje na czatach dla wielu klientów naraz (jedna pętla asyncio)
+
+    Czaty przechowuje wspólny ChatManager, a sesje modelu (client.aio) trzyma
+    pula LRU z ClientManager. Zapytania do jednego czatu wykonywane są po
+    kolei (blokada na czat), więc sesja i kolejność wiadomości w historii są
+    zawsze spójne; różne czaty obsługiwane są równolegle. Wywołania
+    ChatManager (zapis na dysk, archiwum, indeks) idą przez asyncio.to_thread,
+    żeby nie wstrzymywały pętli obsługującej pozostałe połączenia.
+    """
+
+    def __init__(self, chat_manager, config, client, metrics=None, executor=None, session_cache_size=1024):
+        self.chat_manager = chat_manager
+        self.config = config
+        self.client = client
+        self.metrics = metrics or Metrics()
+        self.clients = ClientManager(lambda: client, config, session_cache_size)
+        self.executor = executor or RequestExecutor(
+            RateLimiter(config.requests_per_minute),
+            metrics=self.metrics,
+            max_retries=config.max_retries
+        )
+        self._locks = {}  # chat_id -> asyncio.Lock
+
+    def _lock_for(self, chat_id):
+        lock = self._locks.get(chat_id)
+        if lock is None:
+            lock = self._locks[chat_id] = asyncio.Lock()
+        return lock
+
+    def check_chat(self, chat_id):
+        if chat_id not in self.chat_manager.chats:
+            raise HttpError(404, f"Nie ma czatu {chat_id}")
+
+    def _list_chats(self):
+        chats = self.chat_manager.chats
+        return [
+            {'id': chat_id, 'name': chats[chat_id]['name'], 'messages': self.chat_manager.get_message_count(chat_id)}
+            for chat_id in self.chat_manager.get_chat_ids()
+        ]
+
+    async def list_chats(self):
+        return await asyncio.to_thread(self._list_chats)
+
+    async def create_chat(self, name):
+        chat_id = await asyncio.to_thread(self.chat_manager.create_chat, name)
+        return {'id': chat_id, 'name': name}
+
+    async def delete_chat(self, chat_id):
+        self.check_chat(chat_id)
+        # Poczekaj na trwające zapytanie czatu - odpowiedź nie trafi do usuniętego czatu
+        async with self._lock_for(chat_id):
+            self.check_chat(chat_id)
+            await asyncio.to_thread(self.chat_manager.delete_chat, chat_id)
+            self.clients.sessions.discard(chat_id)
+        self._locks.pop(chat_id, None)
+
+    def _get_messages(self, chat_id, offset, limit):
+        total = self.chat_manager.get_message_count(chat_id)
+        messages = self.chat_manager.get_messages(chat_id, offset, min(limit, MAX_PAGE))
+        return {'total': total, 'offset': offset, 'messages': [msg.to_dict() for msg in messages]}
+
+    async def get_messages(self, chat_id, offset=0, limit=100):
+        self.check_chat(chat_id)
+        return await asyncio.to_thread(self._get_messages, chat_id, offset, limit)
+
+    async def _session(self, chat_id):
+        """Sesja czatu z puli lub nowa, z kontekstem odtworzonym z zapisanej historii"""
+        sessions = self.clients.sessions
+        budget = self.config.context_budget_tokens
+        session = sessions.get(chat_id)
+        if session is None or sessions.tokens(chat_id) > budget:
+            # Historia doczytywana z backendu lub archiwum - w wątku, pula sesji tylko w pętli
+            history, tokens = await asyncio.to_thread(
+                build_history, self.chat_manager.iter_messages_reversed(chat_id), budget
+            )
+            session = self.client.aio.chats.create(
+                model=self.config.model_name,
+                config=self.clients.generate_config(self.config),
+                history=history
+            )
+            sessions.put(chat_id, session, tokens)
+        return session
+
+    async def send(self, chat_id, message, emit=None):
+        """Wyślij wiadomość w czacie; emit(tekst) - korutyna dostająca kolejne fragmenty (None - bez strumienia)
+
+        Zwraca {'response', 'tokens'}. Po błędzie (także rozłączeniu klienta
+        w trakcie strumienia) wiadomość użytkownika jest wycofywana z historii.
+        """
+        self.check_chat(chat_id)
+        submitted = time.perf_counter()
+        async with self._lock_for(chat_id):
+            self.check_chat(chat_id)
+            session = await self._session(chat_id)
+            message_tokens = estimate_tokens(message)
+            await asyncio.to_thread(self.chat_manager.add_message, chat_id, 'user', message, tokens=message_tokens)
+            state = {}
+            try:
+                response_text = await self.executor.acall(
+                    self.config.model_name, lambda: self._generate(session, message, emit, state)
+                )
+            except BaseException:
+                self.clients.sessions.discard(chat_id)
+                await asyncio.to_thread(self.chat_manager.pop_message, chat_id)
+                raise
+            usage = record_usage(self.metrics, state.get('usage'))
+            response_tokens = usage[1] if usage and usage[1] else estimate_tokens(response_text)
+            await asyncio.to_thread(self.chat_manager.add_message, chat_id, 'model', response_text, tokens=response_tokens)
+            self.clients.sessions.add_tokens(chat_id, message_tokens + response_tokens)
+        self.metrics.observe('request_total', time.perf_counter() - submitted)
+        return {'response': response_text, 'tokens': response_tokens}
+
+    async def _generate(self, session, message, emit, state):
+        start = time.perf_counter()
+        if emit is None:
+            response = await session.send_message(message)
+            self.metrics.observe('ttfb', time.perf_counter() - start)
+            state['usage'] = getattr(response, 'usage_metadata', None)
+            return response.text or ''
+
+        chunks = []
+        try:
+            async for chunk in await session.send_message_stream(message):
+                usage = getattr(chunk, 'usage_metadata', None)
+                if usage is not None:
+                    state['usage'] = usage
+                if chunk.text:
+                    if not chunks:
+                        self.metrics.observe('ttfb', time.perf_counter() - start)
+                    chunks.append(chunk.text)
+                    await emit(chunk.text)
+        except Exception as e:
+            # Po wysłaniu fragmentów ponowienie zdublowałoby tekst u klienta
+            if chunks:
+                raise PartialResponseError(str(e)) from e
+            raise
+        return ''.join(chunks)
+
+
+class Request:
+    __slots__ = ('method', 'path', 'query', 'headers', 'body', 'keep_alive')
+
+    def __init__(self, method, path, query, headers, body, keep_alive):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.keep_alive = keep_alive
+
+    def json(self):
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise HttpError(400, f"Nieprawidłowy JSON: {e}")
+        if not isinstance(data, dict):
+            raise HttpError(400, "Oczekiwano obiektu JSON")
+        return data
+
+    def int_param(self, name, default):
+        try:
+            return max(0, int(self.query.get(name, [default])[0]))
+        except ValueError:
+            raise HttpError(400, f"Parametr {name} musi być liczbą")
+
+
+async def read_line(reader, status, message):
+    """Linia nagłówka zapytania; zbyt długa (ponad limit strumienia) - HttpError(status)"""
+    try:
+        return await reader.readline()
+    except (asyncio.LimitOverrunError, ValueError):
+        raise HttpError(status, message)
+
+
+async def read_request(reader):
+    """Następne zapytanie HTTP/1.1 z połączenia lub None po jego zamknięciu"""
+    line = await read_line(reader, 400, "Za długa linia zapytania")
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+    except ValueError:
+        raise HttpError(400, "Nieprawidłowa linia zapytania")
+    headers = {}
+    for _ in range(MAX_HEADERS + 1):
+        line = await read_line(reader, 431, "Za długi nagłówek zapytania")
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    else:
+        raise HttpError(431, f"Więcej niż {MAX_HEADERS} nagłówków zapytania")
+
+    try:
+        length = int(headers.get('content-length') or 0)
+    except ValueError:
+        raise HttpError(400, "Nieprawidłowy nagłówek Content-Length")
+    if length < 0:
+        raise HttpError(400, "Nieprawidłowy nagłówek Content-Length")
+    if length > MAX_BODY:
+        raise HttpError(413, f"Treść zapytania większa niż {MAX_BODY} B")
+    body = await reader.readexactly(length) if length else b''
+    connection = headers.get('connection', '').lower()
+    keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+    url = urlsplit(target)
+    return Request(method.upper(), unquote(url.path), parse_qs(url.query), headers, body, keep_alive)
+
+
+def response_head(status, content_type, keep_alive, length=None):
+    lines = [
+        f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+        f"Content-Type: {content_type}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+        f"Content-Length: {length}" if length is not None else "Transfer-Encoding: chunked",
+    ]
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def send_body(writer, status, body, content_type, keep_alive):
+    writer.write(response_head(status, content_type, keep_alive, len(body)) + body)
+    await writer.drain()
+
+
+async def send_json(writer, status, data, keep_alive):
+    body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+    await send_body(writer, status, body, 'application/json; charset=utf-8', keep_alive)
+
+
+class NdjsonStream:
+    """Odpowiedź strumieniowana: obiekty JSON w osobnych liniach, kodowanie chunked"""
+
+    def __init__(self, writer, keep_alive):
+        self.writer = writer
+        writer.write(response_head(200, 'application/x-ndjson; charset=utf-8', keep_alive))
+
+    async def send(self, data):
+        line = (json.dumps(data, ensure_ascii=False) + '\n').encode('utf-8')
+        self.writer.write(b'%x\r\n%s\r\n' % (len(line), line))
+        await self.writer.drain()  # Wolny klient spowalnia tylko swój strumień
+
+    async def close(self):
+        self.writer.write(b'0\r\n\r\n')
+        await self.writer.drain()
+
+
+class ChatServer:
+    """Serwer HTTP nad ChatService (asyncio.start_server, połączenia keep-alive)
+
+    token - jeśli ustawiony, wymagany jest nagłówek Authorization: Bearer <token>
+    """
+
+    def __init__(self, service, token=''):
+        self.service = service
+        self.token = token
+        self._server = None
+        self._connections = {}  # writer -> zadanie obsługujące połączenie (zamykane przy zatrzymaniu)
+
+    async def start(self, host='127.0.0.1', port=8765):
+        self._server = await asyncio.start_server(self._handle_connection, host, port, limit=MAX_BODY)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            # Bezczynne połączenia keep-alive kończą się jak po rozłączeniu klienta
+            tasks = list(self._connections.values())
+            for writer in list(self._connections):
+                writer.close()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._server.wait_closed()
+
+    async def _handle_connection(self, reader, writer):
+        self._connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HttpError as e:
+                    await send_json(writer, e.status, {'error': str(e)}, False)
+                    break
+                if request is None:
+                    break
+                await self._dispatch(request, writer)
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # Klient rozłączył się
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    async def _dispatch(self, request, writer):
+        try:
+            self._authorize(request)
+            result = await self._route(request, writer)
+        except HttpError as e:
+            await send_json(writer, e.status, {'error': str(e)}, request.keep_alive)
+            return
+        except ConnectionError:
+            raise
+        except Exception as e:
+            print(f"Błąd obsługi {request.method} {request.path}: {e}")
+            await send_json(writer, 500, {'error': str(e)}, request.keep_alive)
+            return
+        if result is not None:
+            status, data = result
+            if isinstance(data, str):
+                await send_body(writer, status, data.encode('utf-8'), 'text/plain; version=0.0.4', request.keep_alive)
+            else:
+                await send_json(writer, status, data, request.keep_alive)
+
+    def _authorize(self, request):
+        if not self.token:
+            return
+        expected = f"Bearer {self.token}"
+        if not hmac.compare_digest(request.headers.get('authorization', ''), expected):
+            raise HttpError(401, "Brak lub nieprawidłowy token")
+
+    async def _route(self, request, writer):
+        """Wykonaj zapytanie; zwraca (status, dane) albo None, gdy odpowiedź została już wysłana"""
+        parts = [part for part in request.path.split('/') if part]
+        method = request.method
+        service = self.service
+
+        if parts == ['health'] and method == 'GET':
+            write_error = service.chat_manager.write_error
+            return 200, {'status': 'degraded' if write_error else 'ok', 'chats': len(service.chat_manager.chats),
+                         'write_error': write_error}
+        if parts == ['metrics'] and method == 'GET':
+            return 200, service.metrics.prometheus_text()
+        if parts == ['chats']:
+            if method == 'GET':
+                return 200, {'chats': await service.list_chats()}
+            if method == 'POST':
+                name = str(request.json().get('name') or '').strip() or 'Nowy czat'
+                return 201, await service.create_chat(name)
+        elif len(parts) == 2 and parts[0] == 'chats':
+            if method == 'DELETE':
+                await service.delete_chat(parts[1])
+                return 200, {'deleted': parts[1]}
+        elif len(parts) == 3 and parts[0] == 'chats' and parts[2] == 'messages':
+            chat_id = parts[1]
+            if method == 'GET':
+                return 200, await service.get_messages(
+                    chat_id, request.int_param('offset', 0), request.int_param('limit', 100)
+                )
+            if method == 'POST':
+                return await self._send_message(request, writer, chat_id)
+        else:
+            raise HttpError(404, f"Nieznana ścieżka {request.path}")
+        raise HttpError(405, f"Metoda {method} nie jest obsługiwana dla {request.path}")
+
+    async def _send_message(self, request, writer, chat_id):
+        data = request.json()
+        message = data.get('message')
+        if not isinstance(message, str) or not message.strip():
+            raise HttpError(400, "Pole message jest wymagane")
+        if not data.get('stream', True):
+            return 200, await self.service.send(chat_id, message)
+
+        self.service.check_chat(chat_id)  # 404 przed rozpoczęciem strumienia
+        stream = NdjsonStream(writer, request.keep_alive)
+        try:
+            result = await self.service.send(chat_id, message, lambda text: stream.send({'chunk': text}))
+        except ConnectionError:
+            raise
+        except Exception as e:
+            # Nagłówki są już wysłane - błąd zgłaszany jako ostatnia linia strumienia
+            await stream.send({'error': str(e)})
+        else:
+            await stream.send({'done': True, 'tokens': result['tokens']})
+        await stream.close()
+        return None
+
+
+async def run_server(service, host, port, token=''):
+    server = ChatServer(service, token)
+    host, port = await server.start(host, port)
+    print(f"Gemini Chat - usługa HTTP na http://{host}:{port}")
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Gemini Chat - usługa HTTP')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--host', help='adres nasłuchiwania (domyślnie server_host z konfiguracji)')
+    parser.add_argument('--port', type=int, help='port (domyślnie server_port z konfiguracji)')
+    parser.add_argument('--token', help='wymagany token (nagłówek Authorization: Bearer ...)')
+    parser.add_argument('--sessions', type=int, default=1024, help='liczba sesji czatów trzymanych w pamięci')
+    parser.add_argument('--mock', action='store_true', help='użyj lokalnego FakeClient zamiast API')
+    parser.add_argument('--config', default='config.json', help='plik konfiguracji')
+    args = parser.parse_args(argv)
+
+    config = Config(args.config)
+    if args.mock:
+        from fake_client import FakeClient
+        client = FakeClient()
+    elif config.api_key:
+        from google import genai
+        client = genai.Client(api_key=config.api_key)
+    else:
+        print("Błąd: brak klucza API (ustaw GEMINI_API_KEY lub api_key w config.json)")
+        return 2
+
+    metrics = Metrics()
+    chat_manager = ChatManager(
+        storage=create_storage(config.storage_backend, fsync=config.save_interval_s > 0),
+        save_interval=config.save_interval_s,
+        metrics=metrics,
+        archive=ChatArchive(codec=config.archive_codec),
+        archive_after_days=config.archive_after_days
+    )
+    service = ChatService(chat_manager, config, client, metrics=metrics, session_cache_size=args.sessions)
+    exporter = None
+    if config.metrics_export:
+        exporter = MetricsExporter(metrics, config.metrics_file, config.metrics_export, config.metrics_interval_s)
+        exporter.start()
+    try:
+        asyncio.run(run_server(service, args.host or config.server_host, args.port or config.server_port,
+                               args.token if args.token is not None else config.server_token))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if exporter is not None:
+            exporter.stop()
+        chat_manager.close()
+    return 0
+
+
+if __name__ == '__main__':
+    import sys
+    sys.exit(main())
@@ -0,0 +1,56 @@
+# sidebar.py
+# Lista czatów w panelu bocznym powiązana z id czatów i aktualizowana punktowo
+
+class ChatListView:
+    """Adapter sg.Listbox dla listy czatów z ChatManager (ostatnio aktywne na górze)
+
+    Wiersz listy odpowiada pozycji w ChatManager, więc wybrany wiersz zamieniany
+    jest na id czatu bez szukania po nazwie (czaty o tej samej nazwie są
+    rozróżniane). Zmiany kolejności (ChatManager.order_listener) poprawiają tylko
+    dotknięte wiersze widżetu zamiast podmieniać całą listę.
+    """
+
+    def __init__(self, element, chat_manager):
+        self.element = element
+        self.chat_manager = chat_manager
+        self.selected_id = None
+
+    def label(self, chat_id):
+        return self.chat_manager.chats[chat_id]['name']
+
+    def reload(self):
+        """Pełne wypełnienie listy (po wczytaniu czatów)"""
+        self.element.update(values=self.chat_manager.get_chat_list())
+        self._restore_selection()
+
+    def apply(self, action, position, chat_id):
+        """Zastosuj zmianę kolejności: 'insert' (nowy czat na górze), 'delete', 'move' (na górę)"""
+        widget = self.element.Widget
+        values = self.element.Values
+        if action in ('delete', 'move'):
+            widget.delete(position)
+            del values[position]
+        if action in ('insert', 'move'):
+            label = self.label(chat_id)
+            widget.insert(0, label)
+            values.insert(0, label)
+        if action == 'delete' and chat_id == self.selected_id:
+            self.selected_id = None
+        self._restore_selection()
+
+    def select(self, chat_id):
+        self.selected_id = chat_id
+        self._restore_selection()
+
+    def selected_chat_id(self):
+        """Id czatu w zaznaczonym wierszu"""
+        indexes = self.element.get_indexes()
+        return self.chat_manager.chat_id_at(indexes[0]) if indexes else None
+
+    def _restore_selection(self):
+        widget = self.element.Widget
+        widget.selection_clear(0, 'end')
+        if self.selected_id in self.chat_manager.chats:
+            position = self.chat_manager.get_position(self.selected_id)
+            widget.selection_set(position)
+            widget.see(position)
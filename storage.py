@@ -0,0 +1,390 @@
+# storage.py
+# Backendy zapisu historii czatów
+
+import json
+import os
+import sqlite3
+
+from messages import attachment_digests, json_default, json_object_hook
+
+SNAPSHOT_VERSION = 1
+
+
+def apply_op(chats, op):
+    """Zastosuj pojedynczą operację dziennika do słownika czatów"""
+    kind = op['op']
+    if kind == 'create_chat':
+        chat = dict(op['chat'])
+        chat.setdefault('messages', [])
+        chats[chat['id']] = chat
+    elif kind == 'delete_chat':
+        chats.pop(op['chat_id'], None)
+    elif kind == 'add_message':
+        chat = chats.get(op['chat_id'])
+        if chat is not None:
+            chat['messages'].append(op['message'])
+    elif kind == 'pop_message':
+        chat = chats.get(op['chat_id'])
+        if chat is not None and chat['messages']:
+            chat['messages'].pop()
+
+
+def fsync_dir(path):
+    """Utrwal wpis katalogu po os.replace (POSIX; w Windows podmiana jest trwała bez tego)"""
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write_json(path, data, indent=None):
+    """Zapisz JSON do pliku tymczasowego i podmień go atomowo (os.replace)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent, default=json_default)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_dir(path)
+
+
+class JsonStorage:
+    """Dotychczasowy format - cała historia w jednym pliku JSON przepisywanym przy każdej zmianie"""
+
+    def __init__(self, storage_file='chats.json'):
+        self.storage_file = storage_file
+
+    def load(self):
+        """Wczytaj czaty z pliku JSON"""
+        if not os.path.exists(self.storage_file):
+            return {}
+        with open(self.storage_file, 'r', encoding='utf-8') as f:
+            return json.load(f, object_hook=json_object_hook)
+
+    def needs_chats(self, op_count):
+        """Czy apply odczyta pełny stan czatów (tu - zawsze)"""
+        return True
+
+    def apply(self, chats, ops):
+        """Zapisz zmiany - ten backend zawsze przepisuje cały plik"""
+        self.save_all(chats)
+
+    def save_all(self, chats):
+        """Zapisz wszystkie czaty do pliku JSON"""
+        atomic_write_json(self.storage_file, chats, indent=2)
+
+    def close(self):
+        pass
+
+
+class JournalStorage:
+    """Snapshot + dziennik operacji dopisywanych na końcu pliku (append-only)
+
+    Każda zmiana to jedna linia JSON w pliku dziennika, więc koszt zapisu
+    wiadomości nie zależy od rozmiaru historii. Co `compact_every` operacji
+    stan jest zrzucany do snapshotu (zapis do pliku tymczasowego + os.replace),
+    a dziennik jest czyszczony. Numery sekwencyjne operacji sprawiają, że
+    awaria pomiędzy podmianą snapshotu a wyczyszczeniem dziennika nie powoduje
+    podwójnego odtworzenia operacji.
+    """
+
+    def __init__(self, storage_file='chats.json', compact_every=1000, fsync=False):
+        base, _ = os.path.splitext(storage_file)
+        self.legacy_file = storage_file
+        self.snapshot_file = f"{base}.snapshot.json"
+        self.journal_file = f"{base}.journal"
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self._journal = None
+        self._seq = 0
+        self._pending = 0
+
+    def load(self):
+        """Wczytaj snapshot i odtwórz dziennik (z jednorazową migracją z chats.json)"""
+        if not os.path.exists(self.snapshot_file) and os.path.exists(self.legacy_file):
+            self.migrate_legacy()
+
+        chats = {}
+        self._seq = 0
+        if os.path.exists(self.snapshot_file):
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f, object_hook=json_object_hook)
+            chats = snapshot.get('chats', {})
+            self._seq = snapshot.get('seq', 0)
+
+        self._pending = self._replay(chats)
+        self._journal = open(self.journal_file, 'a', encoding='utf-8')
+
+        if self._pending >= self.compact_every:
+            self.compact(chats)
+        return chats
+
+    def _replay(self, chats):
+        """Odtwórz operacje z dziennika; urwana ostatnia linia (awaria w trakcie zapisu) jest obcinana"""
+        if not os.path.exists(self.journal_file):
+            return 0
+
+        replayed = 0
+        good_offset = 0
+        with open(self.journal_file, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    op = json.loads(line, object_hook=json_object_hook)
+                except ValueError:
+                    break
+                good_offset += len(line)
+                if op['seq'] <= self._seq:
+                    continue
+                apply_op(chats, op)
+                self._seq = op['seq']
+                replayed += 1
+
+        if good_offset < os.path.getsize(self.journal_file):
+            print(f"Obcinanie uszkodzonego końca dziennika: {self.journal_file}")
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(good_offset)
+        return replayed
+
+    def migrate_legacy(self):
+        """Jednorazowa migracja z pojedynczego pliku chats.json do snapshotu"""
+        with open(self.legacy_file, 'r', encoding='utf-8') as f:
+            chats = json.load(f)
+        atomic_write_json(self.snapshot_file, {'version': SNAPSHOT_VERSION, 'seq': 0, 'chats': chats})
+        os.replace(self.legacy_file, f"{self.legacy_file}.bak")
+
+    def needs_chats(self, op_count):
+        """Czy apply z op_count operacjami odczyta pełny stan czatów (kompaktacja)"""
+        return self._pending + op_count >= self.compact_every
+
+    def apply(self, chats, ops):
+        """Dopisz operacje do dziennika"""
+        lines = []
+        for op in ops:
+            self._seq += 1
+            lines.append(json.dumps(dict(op, seq=self._seq), ensure_ascii=False, default=json_default))
+        self._journal.write('\n'.join(lines) + '\n')
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+
+        self._pending += len(ops)
+        if self._pending >= self.compact_every:
+            self.compact(chats)
+
+    def save_all(self, chats):
+        """Zapisz pełny stan - w tym backendzie oznacza to kompaktację"""
+        self.compact(chats)
+
+    def compact(self, chats):
+        """Zrzuć pełny stan do snapshotu i wyczyść dziennik"""
+        atomic_write_json(self.snapshot_file, {'version': SNAPSHOT_VERSION, 'seq': self._seq, 'chats': chats})
+        if self._journal:
+            self._journal.close()
+        self._journal = open(self.journal_file, 'w', encoding='utf-8')
+        self._pending = 0
+
+    def close(self):
+        """Zamknij dziennik"""
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+
+
+class SqliteStorage:
+    """Backend SQLite (tryb WAL) z leniwym wczytywaniem wiadomości
+
+    Przy starcie wczytywane są tylko metadane czatów; wiadomości pobierane są
+    stronami po indeksie (chat_id, seq), więc otwarcie czatu kosztuje O(strona),
+    a nie O(cała historia).
+    """
+
+    lazy_messages = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS chats (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            message_count INTEGER NOT NULL DEFAULT 0,
+            meta TEXT NOT NULL DEFAULT '{}'
+        );
+        CREATE TABLE IF NOT EXISTS messages (
+            chat_id TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            attachments TEXT,
+            tokens INTEGER,
+            PRIMARY KEY (chat_id, seq)
+        );
+        CREATE INDEX IF NOT EXISTS idx_messages_chat_timestamp ON messages(chat_id, timestamp);
+    """
+
+    CHAT_COLUMNS = ('id', 'name', 'created_at', 'messages')
+
+    def __init__(self, db_file='chats.db', legacy_file='chats.json', fsync=False):
+        self.db_file = db_file
+        self.legacy_file = legacy_file
+        self.fsync = fsync  # synchronous=FULL - każda transakcja utrwalona na dysku
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=FULL' if self.fsync else 'PRAGMA synchronous=NORMAL')
+            self._conn.executescript(self.SCHEMA)
+            columns = {row[1] for row in self._conn.execute('PRAGMA table_info(messages)')}
+            if 'tokens' not in columns:
+                self._conn.execute('ALTER TABLE messages ADD COLUMN tokens INTEGER')
+        return self._conn
+
+    def load(self):
+        """Wczytaj metadane czatów (bez wiadomości)"""
+        conn = self._connect()
+        if conn.execute('SELECT COUNT(*) FROM chats').fetchone()[0] == 0:
+            self._import_legacy()
+
+        chats = {}
+        for chat_id, name, created_at, meta in conn.execute(
+                'SELECT id, name, created_at, meta FROM chats ORDER BY rowid'):
+            chat = json.loads(meta)
+            chat.update({'id': chat_id, 'name': name, 'created_at': created_at})
+            chats[chat_id] = chat
+        return chats
+
+    def _import_legacy(self):
+        """Jednorazowy import historii z formatu JSON / dziennika"""
+        base, _ = os.path.splitext(self.legacy_file)
+        if not (os.path.exists(self.legacy_file) or os.path.exists(f"{base}.snapshot.json")):
+            return
+        journal = JournalStorage(self.legacy_file)
+        chats = journal.load()
+        journal.close()
+        self.save_all(chats)
+
+    def last_activity(self):
+        """Czas ostatniej wiadomości każdego czatu (po indeksie (chat_id, timestamp), bez wczytywania wiadomości)"""
+        return dict(self._connect().execute(
+            'SELECT id, (SELECT MAX(timestamp) FROM messages WHERE chat_id = chats.id) FROM chats'
+        ))
+
+    def load_messages(self, chat_id, offset=0, limit=None):
+        """Pobierz stronę wiadomości czatu"""
+        query = ('SELECT role, content, timestamp, attachments, tokens FROM messages '
+                 'WHERE chat_id = ? AND seq >= ?')
+        params = [chat_id, offset]
+        if limit is not None:
+            query += ' AND seq < ?'
+            params.append(offset + limit)
+        query += ' ORDER BY seq'
+
+        messages = []
+        for role, content, timestamp, attachments, tokens in self._connect().execute(query, params):
+            message = {'role': role, 'content': content, 'timestamp': timestamp}
+            if tokens is not None:
+                message['tokens'] = tokens
+            if attachments:
+                message['attachments'] = json.loads(attachments)
+            messages.append(message)
+        return messages
+
+    def attachment_refs(self):
+        """Skróty załączników wszystkich wiadomości w bazie (bez wczytywania wiadomości do pamięci)"""
+        for (attachments,) in self._connect().execute('SELECT attachments FROM messages WHERE attachments IS NOT NULL'):
+            yield from attachment_digests(json.loads(attachments))
+
+    def count_messages(self, chat_id):
+        """Liczba wiadomości w czacie (bez wczytywania ich treści)"""
+        row = self._connect().execute('SELECT message_count FROM chats WHERE id = ?', (chat_id,)).fetchone()
+        return row[0] if row else 0
+
+    def needs_chats(self, op_count):
+        """Operacje zapisywane są bezpośrednio w bazie - pełny stan nie jest potrzebny"""
+        return False
+
+    def apply(self, chats, ops):
+        """Zapisz operacje w jednej transakcji"""
+        conn = self._connect()
+        with conn:
+            for op in ops:
+                self._apply_op(conn, op)
+
+    def _apply_op(self, conn, op):
+        kind = op['op']
+        if kind == 'create_chat':
+            self._upsert_chat(conn, op['chat'])
+            # Czat przywracany z archiwum przychodzi razem z historią
+            for message in op['chat'].get('messages', ()):
+                self._insert_message(conn, op['chat']['id'], message)
+        elif kind == 'delete_chat':
+            conn.execute('DELETE FROM messages WHERE chat_id = ?', (op['chat_id'],))
+            conn.execute('DELETE FROM chats WHERE id = ?', (op['chat_id'],))
+        elif kind == 'add_message':
+            self._insert_message(conn, op['chat_id'], op['message'])
+        elif kind == 'pop_message':
+            conn.execute(
+                'DELETE FROM messages WHERE chat_id = ? AND seq = '
+                '(SELECT message_count - 1 FROM chats WHERE id = ?)',
+                (op['chat_id'], op['chat_id'])
+            )
+            conn.execute('UPDATE chats SET message_count = message_count - 1 WHERE id = ? AND message_count > 0',
+                         (op['chat_id'],))
+
+    def _upsert_chat(self, conn, chat):
+        meta = {k: v for k, v in chat.items() if k not in self.CHAT_COLUMNS}
+        conn.execute(
+            'INSERT INTO chats (id, name, created_at, meta) VALUES (?, ?, ?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET name = excluded.name, meta = excluded.meta',
+            (chat['id'], chat['name'], chat['created_at'], json.dumps(meta, ensure_ascii=False))
+        )
+
+    def _insert_message(self, conn, chat_id, message):
+        conn.execute(
+            'INSERT INTO messages (chat_id, seq, role, content, timestamp, attachments, tokens) '
+            'SELECT ?, message_count, ?, ?, ?, ?, ? FROM chats WHERE id = ?',
+            (chat_id, message['role'], message['content'], message['timestamp'],
+             json.dumps(message['attachments'], ensure_ascii=False) if message.get('attachments') else None,
+             message.get('tokens'), chat_id)
+        )
+        conn.execute('UPDATE chats SET message_count = message_count + 1 WHERE id = ?', (chat_id,))
+
+    def save_all(self, chats):
+        """Zapisz pełny stan; wiadomości przepisywane są tylko dla czatów wczytanych do pamięci"""
+        conn = self._connect()
+        with conn:
+            conn.execute('DELETE FROM chats WHERE id NOT IN (%s)' % ','.join('?' * len(chats)), list(chats))
+            conn.execute('DELETE FROM messages WHERE chat_id NOT IN (SELECT id FROM chats)')
+            for chat in chats.values():
+                self._upsert_chat(conn, chat)
+                if 'messages' in chat:
+                    conn.execute('DELETE FROM messages WHERE chat_id = ?', (chat['id'],))
+                    conn.execute('UPDATE chats SET message_count = 0 WHERE id = ?', (chat['id'],))
+                    for message in chat['messages']:
+                        self._insert_message(conn, chat['id'], message)
+
+    def close(self):
+        """Zamknij połączenie z bazą"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def create_storage(backend='journal', storage_file='chats.json', fsync=False):
+    """Utwórz backend zapisu na podstawie nazwy z konfiguracji
+
+    fsync - utrwalaj każdy zapis na dysku (opłacalne przy zapisie w tle, gdy
+    jedna operacja zapisu obejmuje wiele zmian)
+    """
+    if backend == 'sqlite':
+        base, _ = os.path.splitext(storage_file)
+        return SqliteStorage(f"{base}.db", legacy_file=storage_file, fsync=fsync)
+    if backend == 'json':
+        return JsonStorage(storage_file)
+    return JournalStorage(storage_file, fsync=fsync)
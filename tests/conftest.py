@@ -0,0 +1,134 @@
+# tests/conftest.py
+# Wspólne elementy testów: moduły z katalogu głównego i aplikacja bez okna z FakeClient
+
+import os
+import queue
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_client import FakeClient
+
+
+class NullElement:
+    def update(self, *args, **kwargs):
+        pass
+
+
+class NullWindow:
+    """Okno bez Tk - send_message i obsługa zdarzeń czyszczą pola i ustawiają pasek stanu"""
+
+    def __getitem__(self, key):
+        return NullElement()
+
+
+class StringView:
+    """Zamiennik MultilineView trzymający tekst historii w pamięci"""
+
+    def __init__(self):
+        self.parts = []
+        self.tail = None
+
+    def set(self, text):
+        self.parts = [text]
+
+    def append(self, text):
+        self.parts.append(text)
+
+    def mark_tail(self):
+        self.tail = len(self.parts)
+
+    def truncate_tail(self):
+        del self.parts[self.tail:]
+
+    def text(self):
+        return ''.join(self.parts)
+
+
+class HeadlessChat:
+    """GeminiChatApp bez okna - zdarzenia wątku roboczego obsługiwane jak w pętli run()"""
+
+    def __init__(self, app, events):
+        self.app = app
+        self.events = events
+        self.window = NullWindow()
+        self.chunks = []
+        self.errors = []
+
+    @property
+    def chat_id(self):
+        return self.app.current_chat_id
+
+    def send(self, message, attachments=None):
+        """Wyślij wiadomość jak przycisk Wyślij; zwraca 'done', 'error' lub 'cancelled'"""
+        from workers import REQUEST_CANCELLED, REQUEST_CHUNK, REQUEST_DONE, REQUEST_ERROR, REQUEST_STARTED
+
+        app, window = self.app, self.window
+        self.chunks = []
+        app.send_message(window, message, attachments)
+        while True:
+            event, value = self.events.get(timeout=10)
+            if event == REQUEST_STARTED:
+                app.on_request_started(window, value)
+            elif event == REQUEST_CHUNK:
+                self.chunks.append(value[1])
+                app.on_request_chunk(window, *value)
+            elif event == REQUEST_DONE:
+                app.on_request_done(window, *value)
+                return 'done'
+            elif event == REQUEST_ERROR:
+                app.on_request_failed(window, *value)
+                return 'error'
+            elif event == REQUEST_CANCELLED:
+                app.on_request_failed(window, value)
+                return 'cancelled'
+
+
+@pytest.fixture
+def headless_chat(tmp_path, monkeypatch):
+    """Fabryka: headless_chat(client, **ustawienia) - aplikacja w katalogu tymczasowym z podanym klientem"""
+    pytest.importorskip('FreeSimpleGUI')
+    pytest.importorskip('google.genai')
+    monkeypatch.chdir(tmp_path)
+    import main
+    from config import Config
+    from workers import RequestWorker
+
+    chats = []
+
+    def create(client=None, **settings):
+        config = Config('config.json')
+        config.api_key = 'fake-key'
+        config.requests_per_minute = 0
+        config.response_cache_mode = 'off'
+        config.save_interval_s = 0
+        for name, value in settings.items():
+            setattr(config, name, value)
+        config.save()
+
+        fake = client or FakeClient()
+        errors = []
+
+        class HeadlessApp(main.GeminiChatApp):
+            def create_client(self):
+                return fake
+
+        monkeypatch.setattr(main.sg, 'popup_error', lambda *args, **kwargs: errors.append(args), raising=False)
+        app = HeadlessApp()
+        app.chat_manager.load_chats()
+        app.chats_loaded = True
+        app.history_view = StringView()
+        events = queue.Queue()
+        app.worker = RequestWorker(lambda event, value: events.put((event, value)))
+        app.current_chat_id = app.chat_manager.create_chat('Test')
+        chat = HeadlessChat(app, events)
+        chat.errors = errors
+        chats.append(chat)
+        return chat
+
+    yield create
+    for chat in chats:
+        chat.app.worker.shutdown()
+        chat.app.chat_manager.close()
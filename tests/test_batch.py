@@ -0,0 +1,211 @@
+# tests/test_batch.py
+# Tryb wsadowy: okno zadań, wznawianie po przerwaniu, naprawa pliku wyników i kody wyjścia (FakeClient)
+
+import json
+
+import pytest
+
+pytest.importorskip('google.genai')
+
+import batch
+from batch import BatchRunner, load_completed, open_output
+from config import Config
+from fake_client import FakeClient
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv('GEMINI_API_KEY', raising=False)
+    config = Config('config.json')
+    config.requests_per_minute = 0
+    config.response_cache_mode = 'off'
+    config.max_retries = 0
+    return config
+
+
+def write_prompts(path, items):
+    path.write_text(''.join(json.dumps(item, ensure_ascii=False) + '\n' for item in items), encoding='utf-8')
+    return str(path)
+
+
+def read_results(path):
+    return [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines() if line.strip()]
+
+
+def run(config, input_file, output_file, client=None, concurrency=4):
+    runner = BatchRunner(client or FakeClient(), config, concurrency=concurrency)
+    try:
+        return runner.run(input_file, str(output_file))
+    finally:
+        runner.executor.shutdown()
+
+
+def test_every_prompt_gets_a_result(tmp_path, config):
+    prompts = write_prompts(tmp_path / 'in.jsonl', [{'id': i, 'prompt': f"Pytanie {i}"} for i in range(20)])
+
+    summary = run(config, prompts, tmp_path / 'out.jsonl')
+
+    results = read_results(tmp_path / 'out.jsonl')
+    assert summary == {'done': 20, 'failed': 0, 'skipped': 0}
+    assert sorted(int(result['id']) for result in results) == list(range(20))
+    assert all(result['response'] == f"Odpowiedź na: {result['prompt']}" for result in results)
+
+
+def test_pending_window_is_bounded(tmp_path, config, monkeypatch):
+    concurrency = 2
+    prompts = write_prompts(tmp_path / 'in.jsonl', [{'prompt': f"Pytanie {i}"} for i in range(30)])
+    client = FakeClient(first_chunk_delay=0.005)
+    runner = BatchRunner(client, config, concurrency=concurrency)
+    counts = {'read': 0, 'written': 0, 'max_pending': 0}
+    read_prompts = batch.read_prompts
+
+    def counting_read(input_file):
+        for item in read_prompts(input_file):
+            counts['read'] += 1
+            counts['max_pending'] = max(counts['max_pending'], counts['read'] - counts['written'])
+            yield item
+
+    write_result = runner.write_result
+
+    def counting_write(out, result):
+        counts['written'] += 1
+        write_result(out, result)
+
+    monkeypatch.setattr(batch, 'read_prompts', counting_read)
+    runner.write_result = counting_write
+    try:
+        summary = runner.run(prompts, str(tmp_path / 'out.jsonl'))
+    finally:
+        runner.executor.shutdown()
+
+    # Wczytane, a niezapisane zadania nie przekraczają okna (2 x współbieżność) i bieżącego zadania
+    assert summary['done'] == 30
+    assert counts['max_pending'] <= concurrency * 2 + 1
+
+
+def test_rerun_skips_completed_and_retries_failed(tmp_path, config):
+    prompts = write_prompts(tmp_path / 'in.jsonl', [{'id': i, 'prompt': f"Pytanie {i}"} for i in range(1, 4)])
+    output = tmp_path / 'out.jsonl'
+    output.write_text(
+        json.dumps({'id': '1', 'prompt': 'Pytanie 1', 'response': 'gotowe'}) + '\n'
+        + json.dumps({'id': '2', 'prompt': 'Pytanie 2', 'error': '503 UNAVAILABLE'}) + '\n',
+        encoding='utf-8'
+    )
+    client = FakeClient()
+
+    summary = run(config, prompts, output, client)
+
+    assert summary == {'done': 2, 'failed': 0, 'skipped': 1}
+    assert client.calls == 2
+    assert load_completed(str(output)) == {'1', '2', '3'}
+
+
+def test_truncated_last_line_is_closed(tmp_path, config):
+    prompts = write_prompts(tmp_path / 'in.jsonl', [{'id': 'a', 'prompt': 'Pierwsze'}, {'id': 'b', 'prompt': 'Drugie'}])
+    output = tmp_path / 'out.jsonl'
+    # Przerwany zapis: pierwsze zadanie gotowe, drugie urwane w połowie linii
+    output.write_text(
+        json.dumps({'id': 'a', 'prompt': 'Pierwsze', 'response': 'ok'}) + '\n' + '{"id": "b", "prompt": "Dru',
+        encoding='utf-8'
+    )
+
+    assert load_completed(str(output)) == {'a'}
+    summary = run(config, prompts, output)
+
+    lines = output.read_text(encoding='utf-8').splitlines()
+    assert summary == {'done': 1, 'failed': 0, 'skipped': 1}
+    assert lines[1] == '{"id": "b", "prompt": "Dru'
+    assert json.loads(lines[2])['id'] == 'b'
+    assert load_completed(str(output)) == {'a', 'b'}
+
+
+def test_open_output_keeps_complete_file(tmp_path):
+    output = tmp_path / 'out.jsonl'
+    output.write_text('{"id": "a"}\n', encoding='utf-8')
+
+    with open_output(str(output)) as out:
+        out.write('{"id": "b"}\n')
+
+    assert output.read_text(encoding='utf-8') == '{"id": "a"}\n{"id": "b"}\n'
+
+
+def test_invalid_items_are_rejected_without_api_call(tmp_path, config):
+    prompts = tmp_path / 'in.jsonl'
+    prompts.write_text(
+        '{"id": "ok", "prompt": "Pytanie"}\n'
+        '42\n'
+        '{"id": "pusty", "prompt": "  "}\n'
+        '{"id": "model", "prompt": "Pytanie", "model": 5}\n'
+        '{"id": "urwany", "prom\n'
+        '"Sam tekst"\n',
+        encoding='utf-8'
+    )
+    client = FakeClient()
+
+    summary = run(config, str(prompts), tmp_path / 'out.jsonl', client)
+
+    results = {result['id']: result for result in read_results(tmp_path / 'out.jsonl')}
+    assert summary == {'done': 2, 'failed': 3, 'skipped': 0}
+    assert client.calls == 2
+    assert set(results) == {'ok', '2', 'pusty', 'model', '6'}
+    assert 'prompt' in results['2']['error']
+    assert 'model' in results['model']['error']
+    assert results['6']['response'] == 'Odpowiedź na: Sam tekst'
+
+
+def test_interrupted_run_resumes(tmp_path, config, monkeypatch):
+    prompts = write_prompts(tmp_path / 'in.jsonl', [{'id': i, 'prompt': f"Pytanie {i}"} for i in range(12)])
+    output = tmp_path / 'out.jsonl'
+    read_prompts = batch.read_prompts
+
+    def interrupted_read(input_file):
+        for number, item in enumerate(read_prompts(input_file)):
+            if number == 5:
+                raise KeyboardInterrupt
+            yield item
+
+    monkeypatch.setattr(batch, 'read_prompts', interrupted_read)
+    first = run(config, prompts, output, FakeClient(first_chunk_delay=0.01), concurrency=2)
+    monkeypatch.setattr(batch, 'read_prompts', read_prompts)
+    second = run(config, prompts, output)
+
+    ids = [result['id'] for result in read_results(output)]
+    # Niezaczęte zadania z okna są anulowane; wznowienie wykonuje resztę, każde zadanie dokładnie raz
+    assert first['interrupted'] is True
+    assert 0 < first['done'] <= 5
+    assert second == {'done': 12 - first['done'], 'failed': 0, 'skipped': first['done']}
+    assert sorted(ids, key=int) == [str(i) for i in range(12)]
+
+
+def test_exit_codes(tmp_path, config, monkeypatch):
+    prompts = write_prompts(tmp_path / 'in.jsonl', [{'prompt': 'Pytanie'}])
+    bad = write_prompts(tmp_path / 'bad.jsonl', [{'prompt': 'Pytanie'}, {'id': 'x'}])
+
+    assert batch.main(['--batch', prompts]) == 2
+    assert batch.main(['--batch', prompts, '--mock']) == 0
+    assert read_results(tmp_path / 'in.out.jsonl')[0]['response'] == 'Odpowiedź na: Pytanie'
+    assert batch.main(['--batch', bad, '--mock', '--output', str(tmp_path / 'bad.out.jsonl')]) == 1
+
+    monkeypatch.setattr(BatchRunner, 'run', lambda self, *args: {'done': 0, 'failed': 0, 'skipped': 0, 'interrupted': True})
+    assert batch.main(['--batch', prompts, '--mock']) == 130
+
+
+def test_save_chats_is_thread_safe(tmp_path, config):
+    from chat_manager import ChatManager
+    from storage import create_storage
+
+    prompts = write_prompts(tmp_path / 'in.jsonl', [{'id': i, 'prompt': f"Pytanie {i}"} for i in range(40)])
+    chat_manager = ChatManager(storage=create_storage('journal', str(tmp_path / 'chats.json')))
+    runner = BatchRunner(FakeClient(), config, concurrency=8, chat_manager=chat_manager)
+    try:
+        runner.run(prompts, str(tmp_path / 'out.jsonl'))
+    finally:
+        runner.executor.shutdown()
+        chat_manager.close()
+
+    reloaded = ChatManager(storage=create_storage('journal', str(tmp_path / 'chats.json')))
+    reloaded.load_chats()
+    assert len(reloaded.chats) == 40
+    assert all(reloaded.get_message_count(chat_id) == 2 for chat_id in reloaded.chats)
+    reloaded.close()
@@ -0,0 +1,62 @@
+# tests/test_blob_store.py
+# Magazyn załączników: deduplikacja, limit rozmiaru i ochrona plików, do których odwołuje się historia
+
+import os
+
+import blob_store
+from blob_store import BlobStore
+
+
+def write(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(name.encode() * (size // len(name)))
+    return str(path)
+
+
+def test_same_file_is_stored_once(tmp_path):
+    store = BlobStore(str(tmp_path / 'attachments'))
+    path = write(tmp_path, 'a.txt', 1000)
+
+    first = store.add(path)
+    second = store.add(path)
+
+    assert first == second
+    assert os.listdir(os.path.dirname(store.blob_path(first['sha256']))) == [first['sha256']]
+
+
+def test_eviction_skips_referenced_blobs(tmp_path):
+    referenced = set()
+    store = None
+
+    def protected():
+        # Wywoływane bez blokady magazynu (w aplikacji bierze blokadę ChatManager)
+        assert not store._lock.locked()
+        return referenced
+
+    store = BlobStore(str(tmp_path / 'attachments'), max_bytes=2500, referenced=protected)
+    a = store.add(write(tmp_path, 'a.txt', 1000))
+    referenced.add(a['sha256'])
+    b = store.add(write(tmp_path, 'b.txt', 1000))
+    c = store.add(write(tmp_path, 'c.txt', 1000))
+
+    assert store.exists(a) and store.exists(c)
+    assert not store.exists(b)
+
+
+def test_unknown_references_prevent_eviction(tmp_path):
+    store = BlobStore(str(tmp_path / 'attachments'), max_bytes=1500, referenced=lambda: None)
+    refs = [store.add(write(tmp_path, f"{name}.txt", 1000)) for name in 'abc']
+
+    assert all(store.exists(ref) for ref in refs)
+
+
+def test_path_digests_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(blob_store, 'PATH_DIGESTS', 3)
+    store = BlobStore(str(tmp_path / 'attachments'))
+    paths = [write(tmp_path, f"{name}.txt", 100) for name in 'abcde']
+
+    for path in paths:
+        store.add(path)
+
+    assert len(store._path_digests) == 3
+    assert [key[0] for key in store._path_digests] == [os.path.abspath(path) for path in paths[2:]]
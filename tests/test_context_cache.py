@@ -0,0 +1,132 @@
+# tests/test_context_cache.py
+# Pamięć kontekstu API: tworzenie, ponowne użycie, przedłużanie i wygaśnięcie wpisów (FakeClient().caches)
+
+import time
+
+import pytest
+
+pytest.importorskip('google.genai')
+
+from context_cache import REFRESH_MARGIN, ContextCache
+from fake_client import FakeClient
+from metrics import Metrics
+
+MODEL = 'gemini-test'
+INSTRUCTION = 'Jesteś asystentem działu wsparcia. ' * 200  # ok. 1700 tokenów
+
+
+@pytest.fixture
+def client():
+    client = FakeClient()
+    client.caches.min_tokens = 400
+    return client
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ContextCache(str(tmp_path / 'context_caches.json'), ttl=3600, min_tokens=1024, metrics=Metrics())
+
+
+def get(cache, client, instruction=INSTRUCTION, model=MODEL, api_key='klucz'):
+    return cache.get(client, api_key, model, instruction, [], len(instruction) // 4, lambda: [])
+
+
+def test_creates_entry_for_long_prefix(cache, client):
+    name = get(cache, client)
+
+    assert name is not None
+    assert client.caches.get(name).model == MODEL
+    assert cache.metrics.counter('context_cache_creates') == 1
+
+
+def test_short_prefix_skips_api(cache, client):
+    assert get(cache, client, instruction='Krótko.') is None
+    assert client.caches._caches == {}
+
+
+def test_rejected_prefix_is_not_retried_immediately(tmp_path, client):
+    # Lokalny szacunek przepuszcza, ale API odrzuca za krótki wpis (400)
+    cache = ContextCache(str(tmp_path / 'context_caches.json'), min_tokens=0, metrics=Metrics())
+    instruction = 'Za krótko dla API. ' * 20
+
+    assert get(cache, client, instruction=instruction) is None
+    assert get(cache, client, instruction=instruction) is None
+    assert cache.metrics.counter('context_cache_errors') == 1
+
+
+def test_entry_is_reused(tmp_path, cache, client):
+    first = get(cache, client)
+
+    assert get(cache, client) == first
+    assert cache.metrics.counter('context_cache_hits') == 1
+    # Po restarcie aplikacji uchwyt jest czytany z pliku
+    reloaded = ContextCache(cache.cache_file, min_tokens=1024)
+    assert get(reloaded, client) == first
+    assert len(client.caches._caches) == 1
+
+
+def test_entries_are_per_model(cache, client):
+    first = get(cache, client)
+    other = get(cache, client, model='gemini-inny')
+
+    assert other != first
+    assert client.caches.get(other).model == 'gemini-inny'
+
+
+def test_entry_close_to_expiry_is_refreshed(cache, client):
+    name = get(cache, client)
+    entry = next(iter(cache._entries.values()))
+    entry['expires_at'] = time.time() + REFRESH_MARGIN / 2
+
+    assert get(cache, client) == name
+    assert entry['expires_at'] > time.time() + REFRESH_MARGIN
+    assert cache.metrics.counter('context_cache_refreshes') == 1
+
+
+def test_expired_entry_is_recreated(cache, client):
+    first = get(cache, client)
+    next(iter(cache._entries.values()))['expires_at'] = time.time() - 1
+
+    second = get(cache, client)
+
+    assert second != first
+    assert cache.metrics.counter('context_cache_creates') == 2
+
+
+def test_invalidated_entry_is_recreated(cache, client):
+    first = get(cache, client)
+    client.caches.delete(first)  # Wpis usunięty po stronie API (np. wygasł wcześniej)
+
+    cache.invalidate(first)
+
+    assert get(cache, client) not in (None, first)
+
+
+def test_excess_entries_are_deleted_remotely(cache, client):
+    first = get(cache, client, instruction=INSTRUCTION + 'A')
+    get(cache, client, instruction=INSTRUCTION + 'B')
+    get(cache, client, instruction=INSTRUCTION + 'C')
+
+    assert first not in client.caches._caches
+    assert len(client.caches._caches) == cache.max_per_model
+
+
+def test_expired_remote_entry_does_not_fail_request(headless_chat):
+    client = FakeClient()
+    client.caches.min_tokens = 400
+    chat = headless_chat(client, context_cache=True, system_instruction=INSTRUCTION, stream_responses=False)
+
+    assert chat.send('Pierwsze pytanie') == 'done'
+    assert len(client.caches._caches) == 1
+    # Wpis znika po stronie API, a aplikacja wciąż ma go w context_caches.json
+    client.caches._caches.clear()
+
+    assert chat.send('Drugie pytanie') == 'done'
+    assert chat.errors == []
+    assert chat.app.metrics.counter('context_cache_errors') == 1
+    assert chat.app.chat_manager.get_message_count(chat.chat_id) == 4
+    assert chat.app.context_cache._entries == {}
+
+    # Następne zapytanie tworzy nowy wpis
+    assert chat.send('Trzecie pytanie') == 'done'
+    assert len(client.caches._caches) == 1
@@ -0,0 +1,97 @@
+# tests/test_file_uploads.py
+# Files API: przesyłanie, oczekiwanie na przetworzenie i ponowne użycie uchwytów (FakeClient().files)
+
+from datetime import timedelta
+
+import pytest
+
+from blob_store import BlobStore
+from fake_client import FakeClient
+from file_uploads import FileUploader, UploadCache
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(str(tmp_path / 'attachments'))
+
+
+@pytest.fixture
+def ref(tmp_path, store):
+    path = tmp_path / 'raport.txt'
+    path.write_text('wiersz raportu\n' * 1000, encoding='utf-8')
+    return store.add(str(path))
+
+
+def make_uploader(tmp_path, store, **kwargs):
+    return FileUploader(store, UploadCache(str(tmp_path / 'uploads.json')), threshold_bytes=1024, poll_interval=0, **kwargs)
+
+
+def test_upload_returns_handle(tmp_path, store, ref):
+    client = FakeClient()
+    uploader = make_uploader(tmp_path, store)
+
+    assert uploader.should_upload(ref)
+    handle = uploader.get_handle(client, 'klucz', ref)
+
+    assert client.files.uploads == [store.blob_path(ref['sha256'])]
+    assert handle['uri'] == f"https://fake.files/{handle['name']}"
+    assert handle['mime_type'] == 'text/plain'
+
+
+def test_waits_until_processing_finishes(tmp_path, store, ref):
+    client = FakeClient()
+    client.files.processing_polls = 3
+    polled = []
+    get = client.files.get
+    client.files.get = lambda name: polled.append(name) or get(name)
+    uploader = make_uploader(tmp_path, store)
+
+    handle = uploader.get_handle(client, 'klucz', ref)
+
+    assert polled == [handle['name']] * 3
+    assert client.files.get(handle['name']).state == 'ACTIVE'
+
+
+def test_processing_timeout(tmp_path, store, ref):
+    client = FakeClient()
+    client.files.processing_polls = 1000
+    uploader = make_uploader(tmp_path, store, poll_timeout=0)
+
+    with pytest.raises(TimeoutError):
+        uploader.get_handle(client, 'klucz', ref)
+
+
+def test_valid_handle_is_reused(tmp_path, store, ref):
+    client = FakeClient()
+    first = make_uploader(tmp_path, store).get_handle(client, 'klucz', ref)
+    # Nowa instancja (np. po restarcie aplikacji) czyta uchwyty z uploads.json
+    second = make_uploader(tmp_path, store).get_handle(client, 'klucz', ref)
+
+    assert second == first
+    assert len(client.files.uploads) == 1
+
+
+def test_handles_are_per_api_key(tmp_path, store, ref):
+    client = FakeClient()
+    uploader = make_uploader(tmp_path, store)
+
+    uploader.get_handle(client, 'klucz-a', ref)
+    uploader.get_handle(client, 'klucz-b', ref)
+
+    assert len(client.files.uploads) == 2
+
+
+def test_expiring_handle_is_uploaded_again(tmp_path, store, ref):
+    client = FakeClient()
+    # Plik wygasa przed upływem marginesu EXPIRY_MARGIN - uchwyt nie nadaje się do użycia
+    client.files.lifetime = timedelta(minutes=5)
+    uploader = make_uploader(tmp_path, store)
+
+    first = uploader.get_handle(client, 'klucz', ref)
+    client.files.lifetime = timedelta(hours=48)
+    second = uploader.get_handle(client, 'klucz', ref)
+    third = uploader.get_handle(client, 'klucz', ref)
+
+    assert second['name'] != first['name']
+    assert third == second
+    assert len(client.files.uploads) == 2
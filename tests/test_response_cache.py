@@ -0,0 +1,53 @@
+# tests/test_response_cache.py
+# Pamięć podręczna odpowiedzi: odczyt z dysku i porządkowanie katalogu (wygasłe, limit rozmiaru)
+
+import os
+import time
+
+from response_cache import ResponseCache
+
+
+def disk_keys(cache_dir):
+    return sorted(name[:-5] for _, _, names in os.walk(cache_dir) for name in names if name.endswith('.json'))
+
+
+def disk_size(cache_dir):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(cache_dir) for name in names)
+
+
+def key(number):
+    return f"{number:064x}"
+
+
+def test_disk_entry_survives_restart(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    ResponseCache(cache_dir).put(key(1), 'Odpowiedź')
+
+    assert ResponseCache(cache_dir).get(key(1)) == 'Odpowiedź'
+
+
+def test_expired_entries_are_removed_on_first_put(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    old = ResponseCache(cache_dir)
+    old.put(key(1), 'wygasła', ttl=-1)
+    old.put(key(2), 'ważna')
+
+    # Nowy proces: pierwszy zapis porządkuje wpisy z poprzedniego uruchomienia
+    ResponseCache(cache_dir).put(key(3), 'nowa')
+
+    assert disk_keys(cache_dir) == [key(2), key(3)]
+
+
+def test_disk_is_bounded_and_oldest_go_first(tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    cache = ResponseCache(cache_dir, max_entries=1, max_disk_bytes=4000)
+    for number in range(60):
+        cache.put(key(number), 'x' * 100)
+        time.sleep(0.001)  # Różne czasy wygaśnięcia - kolejność zapisu
+
+    kept = disk_keys(cache_dir)
+    assert disk_size(cache_dir) <= 4000
+    assert key(59) in kept
+    assert kept == [key(number) for number in range(60 - len(kept), 60)]
+    assert cache.get(key(0)) is None
+    assert cache.get(key(58)) == 'x' * 100
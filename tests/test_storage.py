@@ -0,0 +1,208 @@
+# tests/test_storage.py
+# Backendy zapisu i archiwum: odczyt po ponownym otwarciu, odtwarzanie dziennika, migracje i stronicowanie
+
+import json
+import os
+
+from archive import ChatArchive
+from chat_manager import ChatManager
+from storage import JournalStorage, JsonStorage, create_storage
+
+
+def old_chat(chat_id, name, count, year=2020):
+    """Czat w formacie chats.json z wiadomościami sprzed lat"""
+    return {
+        'id': chat_id,
+        'name': name,
+        'created_at': f"{year}-01-01T10:00:00",
+        'messages': [
+            {'role': 'user' if i % 2 == 0 else 'model', 'content': f"{name} {i}", 'timestamp': f"{year}-01-01T10:{i:02d}:00"}
+            for i in range(count)
+        ],
+    }
+
+
+def contents(chat_manager, chat_id, offset=0, limit=None):
+    return [msg['content'] for msg in chat_manager.get_messages(chat_id, offset, limit)]
+
+
+def fill(chat_manager, count=5):
+    chat_id = chat_manager.create_chat('Rozmowa')
+    for i in range(count):
+        chat_manager.add_message(chat_id, 'user' if i % 2 == 0 else 'model', f"Wiadomość {i}", tokens=i + 1)
+    return chat_id
+
+
+def test_journal_round_trip(tmp_path):
+    path = str(tmp_path / 'chats.json')
+    chat_manager = ChatManager(storage=JournalStorage(path))
+    chat_id = fill(chat_manager)
+    other = chat_manager.create_chat('Pusty')
+    chat_manager.pop_message(chat_id)
+    saved = [msg.to_dict() for msg in chat_manager.get_messages(chat_id)]
+    chat_manager.close()
+
+    reloaded = ChatManager(storage=JournalStorage(path))
+
+    assert [msg.to_dict() for msg in reloaded.get_messages(chat_id)] == saved
+    assert len(saved) == 4
+    assert reloaded.chats[other]['name'] == 'Pusty'
+    assert reloaded.get_chat_ids() == [other, chat_id]
+    reloaded.close()
+
+
+def test_journal_replays_after_compaction(tmp_path):
+    path = str(tmp_path / 'chats.json')
+    storage = JournalStorage(path, compact_every=7)
+    chat_manager = ChatManager(storage=storage)
+    chat_id = fill(chat_manager, 19)
+    chat_manager.close()
+
+    # Część historii jest w snapshocie, reszta w dzienniku
+    with open(storage.journal_file, encoding='utf-8') as f:
+        assert len(f.readlines()) == 6
+    reloaded = ChatManager(storage=JournalStorage(path, compact_every=7))
+    assert contents(reloaded, chat_id) == [f"Wiadomość {i}" for i in range(19)]
+    reloaded.close()
+
+
+def test_journal_ops_already_in_snapshot_are_skipped(tmp_path):
+    path = str(tmp_path / 'chats.json')
+    storage = JournalStorage(path)
+    chat_manager = ChatManager(storage=storage)
+    chat_id = fill(chat_manager, 3)
+    with open(storage.journal_file, 'rb') as f:
+        journal = f.read()
+    chat_manager.save_chats()
+    chat_manager.close()
+    # Awaria między podmianą snapshotu a wyczyszczeniem dziennika
+    with open(storage.journal_file, 'wb') as f:
+        f.write(journal)
+
+    reloaded = ChatManager(storage=JournalStorage(path))
+    assert contents(reloaded, chat_id) == ['Wiadomość 0', 'Wiadomość 1', 'Wiadomość 2']
+    reloaded.close()
+
+
+def test_truncated_journal_tail_is_dropped(tmp_path):
+    path = str(tmp_path / 'chats.json')
+    storage = JournalStorage(path)
+    chat_manager = ChatManager(storage=storage)
+    chat_id = fill(chat_manager, 3)
+    chat_manager.close()
+    # Awaria w trakcie dopisywania operacji
+    with open(storage.journal_file, 'a', encoding='utf-8') as f:
+        f.write('{"op": "add_message", "chat_id": "' + chat_id + '", "mess')
+
+    reloaded = ChatManager(storage=JournalStorage(path))
+    assert contents(reloaded, chat_id) == ['Wiadomość 0', 'Wiadomość 1', 'Wiadomość 2']
+    with open(storage.journal_file, 'rb') as f:
+        assert f.read().endswith(b'\n')
+    # Kolejne operacje dopisywane są za obciętym końcem i przeżywają ponowne otwarcie
+    reloaded.add_message(chat_id, 'user', 'Po awarii')
+    reloaded.close()
+
+    again = ChatManager(storage=JournalStorage(path))
+    assert contents(again, chat_id)[-1] == 'Po awarii'
+    again.close()
+
+
+def test_migration_from_json(tmp_path):
+    path = str(tmp_path / 'chats.json')
+    legacy = ChatManager(storage=JsonStorage(path))
+    chat_id = fill(legacy)
+    saved = [msg.to_dict() for msg in legacy.get_messages(chat_id)]
+    legacy.close()
+
+    migrated = ChatManager(storage=JournalStorage(path))
+
+    assert [msg.to_dict() for msg in migrated.get_messages(chat_id)] == saved
+    assert os.path.exists(path + '.bak')
+    assert not os.path.exists(path)
+    migrated.add_message(chat_id, 'user', 'Po migracji')
+    migrated.close()
+    # Drugie otwarcie czyta snapshot i dziennik, nie powtarza migracji
+    reopened = ChatManager(storage=JournalStorage(path))
+    assert reopened.get_message_count(chat_id) == len(saved) + 1
+    reopened.close()
+
+
+def test_sqlite_imports_legacy_json(tmp_path):
+    path = tmp_path / 'chats.json'
+    path.write_text(json.dumps({'a': old_chat('a', 'Stary', 6)}), encoding='utf-8')
+
+    chat_manager = ChatManager(storage=create_storage('sqlite', str(path)))
+
+    assert contents(chat_manager, 'a') == [f"Stary {i}" for i in range(6)]
+    chat_manager.close()
+
+
+def test_sqlite_pages_messages_lazily(tmp_path):
+    path = str(tmp_path / 'chats.json')
+    chat_manager = ChatManager(storage=create_storage('sqlite', path))
+    chat_id = fill(chat_manager, 250)
+    chat_manager.close()
+
+    reloaded = ChatManager(storage=create_storage('sqlite', path))
+    chat = reloaded.chats[chat_id]
+
+    assert 'messages' not in chat
+    assert reloaded.get_message_count(chat_id) == 250
+    assert contents(reloaded, chat_id, 100, 50) == [f"Wiadomość {i}" for i in range(100, 150)]
+    assert next(reloaded.iter_messages_reversed(chat_id))['content'] == 'Wiadomość 249'
+    # Strony nie trafiają do pamięci czatu
+    assert 'messages' not in chat
+    reloaded.add_message(chat_id, 'user', 'Nowa')
+    assert contents(reloaded, chat_id, 250) == ['Nowa']
+    assert 'messages' not in chat
+    reloaded.close()
+
+
+def open_archived(tmp_path, days=30):
+    return ChatManager(
+        storage=JournalStorage(str(tmp_path / 'chats.json')),
+        archive=ChatArchive(str(tmp_path / 'archive')),
+        archive_after_days=days
+    )
+
+
+def test_archive_demote_and_reload(tmp_path):
+    (tmp_path / 'chats.json').write_text(json.dumps({'old': old_chat('old', 'Stary', 40)}), encoding='utf-8')
+    chat_manager = open_archived(tmp_path)
+    recent = fill(chat_manager, 2)
+
+    assert set(chat_manager.archive.entries()) == {'old'}
+    assert 'messages' not in chat_manager.chats['old']
+    assert chat_manager.get_message_count('old') == 40
+    assert chat_manager.get_chat_ids() == [recent, 'old']
+    chat_manager.close()
+
+    reloaded = open_archived(tmp_path)
+    assert set(reloaded.archive.entries()) == {'old'}
+    assert contents(reloaded, 'old') == [f"Stary {i}" for i in range(40)]
+    assert contents(reloaded, 'old', 10, 5) == [f"Stary {i}" for i in range(10, 15)]
+    assert reloaded.get_message_count(recent) == 2
+    reloaded.close()
+
+
+def test_archive_promote_keeps_messages_in_order(tmp_path):
+    (tmp_path / 'chats.json').write_text(
+        json.dumps({'old': old_chat('old', 'Stary', 12), 'other': old_chat('other', 'Inny', 3)}),
+        encoding='utf-8'
+    )
+    chat_manager = open_archived(tmp_path)
+    assert set(chat_manager.archive.entries()) == {'old', 'other'}
+
+    chat_manager.add_message('old', 'user', 'Powrót po latach')
+
+    expected = [f"Stary {i}" for i in range(12)] + ['Powrót po latach']
+    assert set(chat_manager.archive.entries()) == {'other'}
+    assert contents(chat_manager, 'old') == expected
+    assert chat_manager.get_chat_ids()[0] == 'old'
+    chat_manager.close()
+
+    reloaded = open_archived(tmp_path)
+    assert set(reloaded.archive.entries()) == {'other'}
+    assert contents(reloaded, 'old') == expected
+    assert contents(reloaded, 'other') == ['Inny 0', 'Inny 1', 'Inny 2']
+    reloaded.close()
@@ -0,0 +1,52 @@
+# tests/test_streaming.py
+# Strumieniowanie odpowiedzi: fragmenty dopisywane do historii i wycofanie po błędzie
+
+from fake_client import FakeAPIError, FakeClient
+
+
+def test_streamed_chunks_join_to_saved_reply(headless_chat):
+    client = FakeClient(responder=lambda text: f"Odpowiedź na: {text}. " + 'ciąg dalszy ' * 10, chunk_size=7)
+    chat = headless_chat(client, stream_responses=True)
+
+    assert chat.send('Cześć') == 'done'
+
+    messages = chat.app.chat_manager.get_messages(chat.chat_id)
+    assert [msg['role'] for msg in messages] == ['user', 'model']
+    assert len(chat.chunks) > 1
+    assert ''.join(chat.chunks) == messages[-1]['content'] == client.responder('Cześć')
+    assert chat.app.streaming == {}
+    assert chat.app.history_view.text().count(messages[-1]['content']) == 1
+
+
+def test_error_before_first_chunk_pops_user_message(headless_chat):
+    client = FakeClient(error=FakeAPIError(400, 'INVALID_ARGUMENT'), chunk_size=7)
+    chat = headless_chat(client, stream_responses=True)
+
+    assert chat.send('Cześć') == 'error'
+
+    assert chat.chunks == []
+    assert chat.app.chat_manager.get_messages(chat.chat_id) == []
+    assert chat.app.streaming == {}
+    assert len(chat.errors) == 1
+
+
+def test_error_mid_stream_drops_partial_reply(headless_chat):
+    client = FakeClient(
+        responder=lambda text: 'początek odpowiedzi i reszta, która nie dotrze',
+        chunk_size=5,
+        error=FakeAPIError(503, 'UNAVAILABLE'),
+        error_after_chunks=2
+    )
+    chat = headless_chat(client, stream_responses=True)
+
+    assert chat.send('Cześć') == 'error'
+
+    # Częściowa odpowiedź nie jest ponawiana (zdublowałaby tekst) ani zapisywana
+    assert chat.chunks == ['począ', 'tek o']
+    assert client.calls == 1
+    assert chat.app.chat_manager.get_messages(chat.chat_id) == []
+    assert chat.app.streaming == {}
+    assert 'począ' not in chat.app.history_view.text()
+    assert len(chat.errors) == 1
+    # Sesja z częściową wymianą nie jest używana ponownie
+    assert chat.app.sessions.get(chat.chat_id) is None
@@ -0,0 +1,75 @@
+# tokens.py
+# Szacowanie liczby tokenów i limity kontekstu modeli
+
+import os
+
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 258  # Koszt obrazu po stronie Gemini (kafelek 768x768)
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
+
+DEFAULT_INPUT_LIMIT = 1_048_576
+MODEL_INPUT_LIMITS = {
+    'gemini-3-flash-preview': 1_048_576,
+    'gemini-3-pro-preview': 1_048_576,
+    'gemini-3-pro-image-preview': 65_536,
+    'gemini-2.5-flash': 1_048_576,
+    'gemini-2.5-pro': 1_048_576,
+    'gemini-2.0-flash-exp': 1_048_576,
+    'gemini-1.5-pro': 2_097_152,
+    'gemini-1.5-flash': 1_048_576,
+    'gemini-1.5-flash-8b': 1_048_576,
+}
+
+
+class TokenBudgetExceeded(Exception):
+    """Zapytanie nie mieści się w limicie kontekstu modelu"""
+
+
+def estimate_tokens(text):
+    """Przybliżona liczba tokenów tekstu (ok. 4 znaki na token)"""
+    return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+
+
+def estimate_attachment_tokens(attachment, max_text_bytes=None):
+    """Szacunek dla załącznika bez wczytywania go - obraz to stały koszt, tekst wg rozmiaru pliku
+
+    attachment - ścieżka pliku lub referencja z BlobStore.add
+    max_text_bytes - górna granica dla tekstu (większe pliki wysyłane są we fragmentach)
+    """
+    if isinstance(attachment, dict):
+        if attachment['mime_type'].startswith('image/'):
+            return IMAGE_TOKENS
+        size = attachment['size']
+    elif os.path.splitext(attachment)[1].lower() in IMAGE_EXTENSIONS:
+        return IMAGE_TOKENS
+    else:
+        try:
+            size = os.path.getsize(attachment)
+        except OSError:
+            return 0
+    if max_text_bytes:
+        size = min(size, max_text_bytes)
+    return size // CHARS_PER_TOKEN
+
+
+def estimate_message_tokens(content, attachments=None, max_text_bytes=None):
+    """Szacunek dla nowej wiadomości razem z załącznikami"""
+    return estimate_tokens(content) + sum(
+        estimate_attachment_tokens(attachment, max_text_bytes) for attachment in attachments or ()
+    )
+
+
+def message_tokens(msg):
+    """Liczba tokenów zapisanej wiadomości (zapamiętana przy dodaniu lub oszacowana dla starszych wpisów)"""
+    tokens = msg.get('tokens')
+    return tokens if tokens is not None else estimate_tokens(msg['content'])
+
+
+def input_token_limit(model_name):
+    """Limit tokenów wejściowych modelu"""
+    return MODEL_INPUT_LIMITS.get(model_name, DEFAULT_INPUT_LIMIT)
+
+
+def count_tokens(client, model_name, contents):
+    """Dokładna liczba tokenów przez API (models.count_tokens)"""
+    return client.models.count_tokens(model=model_name, contents=contents).total_tokens
@@ -0,0 +1,158 @@
+# workers.py
+# Wykonywanie zapytań do API w tle, poza pętlą zdarzeń GUI
+
+import itertools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Zdarzenia przekazywane do pętli okna przez window.write_event_value
+REQUEST_STARTED = '-REQUEST_STARTED-'
+REQUEST_CHUNK = '-REQUEST_CHUNK-'
+REQUEST_DONE = '-REQUEST_DONE-'
+REQUEST_ERROR = '-REQUEST_ERROR-'
+REQUEST_CANCELLED = '-REQUEST_CANCELLED-'
+
+
+class RequestCancelled(Exception):
+    """Zadanie zostało anulowane w trakcie wykonywania"""
+
+
+class RequestTask:
+    """Pojedyncze zapytanie do modelu w ramach jednego czatu"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, worker, chat_id, fn, args, data=None, prepare=None):
+        self.id = next(self._ids)
+        self.chat_id = chat_id
+        self.fn = fn
+        self.args = args
+        self.data = data or {}
+        self.prepare = prepare
+        self.started = False
+        self._worker = worker
+        self._cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def cancel(self):
+        """Anuluj zadanie - oczekujące nie wystartuje, trwające przerwie się przy najbliższym fragmencie"""
+        self._cancel_event.set()
+
+    def check_cancelled(self):
+        if self.cancelled:
+            raise RequestCancelled()
+
+    def emit(self, text):
+        """Przekaż fragment odpowiedzi do pętli zdarzeń (wywoływane z wątku roboczego)"""
+        self.check_cancelled()
+        self._worker._post(REQUEST_CHUNK, (self, text))
+
+
+class RequestWorker:
+    """Pula wątków wykonująca zapytania do API
+
+    Zapytania różnych czatów wykonują się równolegle, a w obrębie jednego
+    czatu ściśle po kolei - następne startuje dopiero po zakończeniu
+    poprzedniego, więc sesja czatu nigdy nie jest używana z dwóch wątków
+    naraz, a kolejność wiadomości w historii odpowiada kolejności wysyłania.
+    Wyniki trafiają do pętli okna jako zdarzenia REQUEST_* (wartość to zadanie
+    lub krotka (zadanie, wynik)).
+    """
+
+    def __init__(self, post_event, max_workers=4):
+        self.post_event = post_event
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gemini-request')
+        self._lock = threading.Lock()
+        self._queues = {}
+        self._running = {}
+        self._closed = False
+
+    def submit(self, chat_id, fn, *args, data=None, prepare=None):
+        """Dodaj zapytanie do kolejki czatu; fn(task, *args) wykona się w wątku roboczym
+
+        `data` to dowolne dane dla obsługi zdarzeń w wątku GUI (dostępne jako task.data).
+        `prepare(task)` wykonuje się w wątku roboczym przed zdarzeniem REQUEST_STARTED,
+        więc może uzupełnić task.data (np. o referencje załączników).
+        """
+        task = RequestTask(self, chat_id, fn, args, data, prepare)
+        with self._lock:
+            self._queues.setdefault(chat_id, deque()).append(task)
+            if chat_id not in self._running:
+                self._start_next(chat_id)
+        return task
+
+    def _start_next(self, chat_id):
+        """Uruchom następne zadanie czatu (wywoływane pod blokadą)"""
+        queue = self._queues.get(chat_id)
+        while queue:
+            task = queue.popleft()
+            if task.cancelled:
+                self._post(REQUEST_CANCELLED, task)
+                continue
+            self._running[chat_id] = task
+            self._executor.submit(self._run, task)
+            return
+        self._queues.pop(chat_id, None)
+
+    def _run(self, task):
+        try:
+            task.check_cancelled()
+            if task.prepare:
+                task.prepare(task)
+            task.started = True
+            self._post(REQUEST_STARTED, task)
+            result = task.fn(task, *task.args)
+            task.check_cancelled()
+            self._post(REQUEST_DONE, (task, result))
+        except RequestCancelled:
+            self._post(REQUEST_CANCELLED, task)
+        except Exception as e:
+            if task.cancelled:
+                self._post(REQUEST_CANCELLED, task)
+            else:
+                self._post(REQUEST_ERROR, (task, e))
+        finally:
+            with self._lock:
+                self._running.pop(task.chat_id, None)
+                if not self._closed:
+                    self._start_next(task.chat_id)
+
+    def _post(self, event, value):
+        if self._closed:
+            return
+        try:
+            self.post_event(event, value)
+        except Exception as e:
+            print(f"Błąd przekazywania zdarzenia {event}: {e}")
+
+    def cancel_chat(self, chat_id):
+        """Anuluj trwające i oczekujące zapytania czatu"""
+        with self._lock:
+            tasks = list(self._queues.get(chat_id, ()))
+            if chat_id in self._running:
+                tasks.append(self._running[chat_id])
+        for task in tasks:
+            task.cancel()
+        return len(tasks)
+
+    def pending_count(self, chat_id=None):
+        """Liczba trwających i oczekujących zapytań (dla czatu lub łącznie)"""
+        with self._lock:
+            if chat_id is not None:
+                return len(self._queues.get(chat_id, ())) + (chat_id in self._running)
+            return sum(len(q) for q in self._queues.values()) + len(self._running)
+
+    def shutdown(self):
+        """Anuluj wszystkie zapytania i zatrzymaj pulę (bez czekania na odpowiedzi sieciowe)"""
+        with self._lock:
+            self._closed = True
+            tasks = [task for queue in self._queues.values() for task in queue]
+            tasks.extend(self._running.values())
+            self._queues.clear()
+        for task in tasks:
+            task.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)